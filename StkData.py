@@ -1,137 +1,145 @@
-from fake_useragent import UserAgent
-from requests_html import HTMLSession
-import pandas as pd
 import os
 import time
-import logging
-
-# Configure logging
-log_file = '/home/nikunj/NseInsiderTrading/log.txt'
-logging.basicConfig(filename=log_file, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-def log_and_print(message, level="info"):
-    if level.lower() == "error":
-        logging.error(message)
-    elif level.lower() == "warning":
-        logging.warning(message)
-    else:
-        logging.info(message)
-    print(message)
-
-def establish_session(session, symbol):
+import argparse
+from nse_client import NseClient, configure_logging, limit_rate, log_and_print, quote_referer
+from nse_config import BASE_URL, DATA_DIR
+import classification_cache
+import index_constituents
+from crawl_journal import CrawlJournal, crawl, DEFAULT_RETRY_ROUNDS, DEFAULT_BACKOFF
+from ingest import STKDATA_SCHEMA, build_frame
+import storage
+import shard_crawl
+
+LANDING_PAGE = f"{BASE_URL}/market-data/live-equity-market"
+
+def get_stock_data(symbol, client):
+    # Cookies come from the client's single warm-up; only the API call is made per symbol.
+    # Pacing and 429 retries are handled by the client's adaptive limiter.
     try:
-        log_and_print(f"Visiting NSE homepage to establish cookies for symbol: {symbol}")
-        homepage_url = "https://www.nseindia.com"
-        resp = session.get(homepage_url)
-        if resp.status_code != 200:
-            log_and_print(f"Failed to load NSE homepage, status: {resp.status_code}", level="error")
-            return False
-
-        script_url = f"https://www.nseindia.com/get-quotes/equity?symbol={symbol}"
-        log_and_print(f"Visiting equity script page for symbol: {symbol}")
-        resp2 = session.get(script_url)
-        if resp2.status_code != 200:
-            log_and_print(f"Failed to load equity script page, status: {resp2.status_code}", level="error")
-            return False
-
-        return True
-    except Exception as e:
-        log_and_print(f"Exception during session establishment: {e}", level="error")
-        return False
-
-def get_stock_data(symbol, session):
-    try:
-        if not establish_session(session, symbol):
-            log_and_print(f"Session establishment failed for symbol: {symbol}", level="error")
-            return None
-
-        api_url = f"https://www.nseindia.com/api/quote-equity?symbol={symbol}"
+        api_url = f"{BASE_URL}/api/quote-equity?symbol={symbol}"
         log_and_print(f"Fetching API data for symbol: {symbol}")
-        api_response = session.get(api_url)
-
-        # Check content-type header to verify if JSON is returned
-        content_type = api_response.headers.get('Content-Type', '')
-        if 'application/json' not in content_type:
-            log_and_print(f"API response for {symbol} is not JSON. Content-Type: {content_type}", level="error")
-            log_and_print(f"Response content (truncated): {api_response.text[:500]}", level="error")
+        data = client.get_json(api_url, referer=quote_referer(symbol))
+        if data is None:
             return None
 
-        if api_response.status_code == 200:
-            data = api_response.json()
-            industry_info = data.get('industryInfo', {})
-            return (
-                industry_info.get('basicIndustry'),
-                industry_info.get('industry'),
-                industry_info.get('macro'),
-                industry_info.get('sector')
-            )
-        elif api_response.status_code == 429:
-            log_and_print(f"Rate limited by NSE for symbol: {symbol}", level="error")
-            return None
-        else:
-            log_and_print(f"API call failed for symbol: {symbol}, Status: {api_response.status_code}", level="error")
-            return None
+        industry_info = data.get('industryInfo', {})
+        return (
+            industry_info.get('basicIndustry'),
+            industry_info.get('industry'),
+            industry_info.get('macro'),
+            industry_info.get('sector')
+        )
     except Exception as e:
         log_and_print(f"Exception occurred while fetching stock data for symbol: {symbol}: {str(e)}", level="error")
         return None
 
+def to_row(symbol, industry_data):
+    return {
+        'symbol': symbol,
+        'basic_industry': industry_data[0],
+        'industry': industry_data[1],
+        'macro': industry_data[2],
+        'sector': industry_data[3],
+    }
+
+def fetch_row(symbol, client):
+    log_and_print(f"Processing symbol: {symbol}")
+    industry_data = get_stock_data(symbol, client)
+    if industry_data:
+        log_and_print(f"Data retrieved for symbol: {symbol}")
+        return to_row(symbol, industry_data)
+    log_and_print(f"No data found for symbol: {symbol}", level="warning")
+    return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch NSE industry classification for every symbol in Symbols.csv")
+    parser.add_argument('--mode', choices=['concurrent', 'sequential'], default='concurrent',
+                        help="concurrent keeps several requests in flight; sequential fetches one symbol at a time")
+    parser.add_argument('--workers', type=int, default=4, help="quote-equity requests kept in flight")
+    parser.add_argument('--rps', type=float, default=6.0, help="ceiling for the adaptive requests-per-second rate")
+    parser.add_argument('--ttl-days', type=float, default=classification_cache.DEFAULT_TTL_DAYS,
+                        help="refetch cached classifications older than this many days")
+    parser.add_argument('--full-refresh', action='store_true', help="ignore the cache and refetch every symbol")
+    parser.add_argument('--no-index-files', action='store_true',
+                        help="classify every symbol through quote-equity, ignoring the index constituent files")
+    parser.add_argument('--retry-rounds', type=int, default=DEFAULT_RETRY_ROUNDS,
+                        help="extra passes over failed symbols before giving up")
+    parser.add_argument('--retry-backoff', type=float, default=DEFAULT_BACKOFF,
+                        help="seconds before the first retry pass, doubled for each later pass")
+    shard_crawl.add_shard_arguments(parser)
+    return parser.parse_args()
+
 def main():
-    input_file = '/home/nikunj/NseInsiderTrading/Symbols.csv'
-    output_directory = '/home/nikunj/NseInsiderTrading'
+    args = parse_args()
+    configure_logging()
+    shard_crawl.check_shard_arguments(args)
+    input_file = os.path.join(DATA_DIR, 'Symbols.csv')
+    output_directory = DATA_DIR
     output_file = os.path.join(output_directory, "stkdata.csv")
 
     log_and_print(f"Reading symbols from {input_file}")
-    symbols_df = pd.read_csv(input_file)
+    symbols_df = storage.read_dataset('Symbols')
+    symbols = symbols_df.iloc[:, 0].tolist()
 
     log_and_print(f"Creating output directory at {output_directory}")
     os.makedirs(output_directory, exist_ok=True)
 
-    ua = UserAgent()
-
-    with HTMLSession() as session:
-        user_agent = ua.random
-        log_and_print(f"Using User-Agent: {user_agent}")
-
-        # Set headers that do not depend on symbol
-        session.headers.update({
-            'User-Agent': user_agent,
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept': 'application/json, text/plain, */*',
-        })
-
-        columns = ['symbol', 'basic_industry', 'industry', 'macro', 'sector']
-        stkdata_df = pd.DataFrame(columns=columns)
-
-        log_and_print("Starting to process symbols")
-        for index, row in symbols_df.iterrows():
-            symbol = row.iloc[0]
-            
-            # Update Referer header dynamically per symbol
-            session.headers.update({
-                'Referer': f'https://www.nseindia.com/get-quotes/equity?symbol={symbol}',
-            })
-
-            log_and_print(f"Processing symbol: {symbol}")
-            industry_data = get_stock_data(symbol, session)
-            if industry_data:
-                log_and_print(f"Data retrieved for symbol: {symbol}")
-                new_row = pd.DataFrame([{
-                    'symbol': symbol,
-                    'basic_industry': industry_data[0],
-                    'industry': industry_data[1],
-                    'macro': industry_data[2],
-                    'sector': industry_data[3],
-                }])
-                stkdata_df = pd.concat([stkdata_df, new_row], ignore_index=True)
-            else:
-                log_and_print(f"No data found for symbol: {symbol}", level="warning")
-
-            log_and_print(f"Waiting 2 seconds to avoid rate-limiting for symbol: {symbol}")
-            time.sleep(2)
-
-        log_and_print(f"Saving data to {output_file}")
-        stkdata_df.to_csv(output_file, index=False)
-        log_and_print(f"Data saved successfully to {output_file}")
+    cache = {} if args.full_refresh else classification_cache.load_cache()
+
+    # Symbols finished by an interrupted run are taken from its journal
+    # (from every shard's journal when the crawl is sharded)
+    sharded = args.shards > 1
+    journal = shard_crawl.ShardSet('stkdata', args.shards) if sharded else CrawlJournal('stkdata')
+    for symbol, row in journal.rows.items():
+        classification_cache.record_result(cache, symbol, row)
+    # Symbols covered by the local index constituent files are classified without a request
+    if not args.no_index_files:
+        for row in index_constituents.classify(classification_cache.symbols_to_fetch(symbols, cache, args.ttl_days)):
+            classification_cache.record_result(cache, row['symbol'], row, source=row['source'])
+    pending = classification_cache.symbols_to_fetch(symbols, cache, args.ttl_days)
+    log_and_print(f"{len(symbols) - len(pending)} symbols served from cache or index files, {len(pending)} to fetch")
+
+    if sharded and args.shard is not None:
+        # One shard of a crawl spread over machines; --merge-shards writes the output
+        shard_crawl.run_shard('stkdata', 'StkData:fetch_row', pending, args.shard, args.shards, LANDING_PAGE,
+                              args.workers, args.rps, shard_crawl.proxy_for(args.shard, args.proxies),
+                              args.retry_rounds, args.retry_backoff)
+        return
+
+    if pending and sharded:
+        if not args.merge_shards:
+            start_time = time.time()
+            journal.run('StkData:fetch_row', pending, LANDING_PAGE, args.workers, args.rps, args.proxies,
+                        args.retry_rounds, args.retry_backoff)
+            log_and_print(f"Processed {len(pending)} symbols in {args.shards} shards in {time.time() - start_time:.2f} seconds")
+        for symbol in pending:
+            classification_cache.record_result(cache, symbol, journal.rows.get(symbol))
+        classification_cache.save_cache(cache)
+    elif pending:
+        limit_rate(args.rps)
+        with NseClient(landing_page=LANDING_PAGE, pool_size=args.workers) as client:
+            log_and_print(f"Using User-Agent: {client.user_agent}")
+            if not client.warm_up():
+                log_and_print("Session warm-up failed, aborting", level="error")
+                return
+
+            start_time = time.time()
+            workers = 1 if args.mode == 'sequential' else args.workers
+            log_and_print(f"Starting to process symbols with {workers} workers")
+            crawl(pending, lambda symbol: fetch_row(symbol, client), journal, workers,
+                  args.retry_rounds, args.retry_backoff)
+            log_and_print(f"Processed {len(pending)} symbols in {time.time() - start_time:.2f} seconds ({args.mode} mode)")
+
+        for symbol in pending:
+            classification_cache.record_result(cache, symbol, journal.rows.get(symbol))
+        classification_cache.save_cache(cache)
+
+    stkdata_df = build_frame(classification_cache.cached_rows(symbols, cache), STKDATA_SCHEMA)
+
+    log_and_print(f"Saving data to {output_file}")
+    storage.write_dataset(stkdata_df, 'stkdata')
+    log_and_print(f"Data saved successfully to {output_file}")
+    journal.finish(pending)
 
 if __name__ == "__main__":
     main()
@@ -1,93 +1,162 @@
 import csv
 import datetime
+import argparse
 import requests
-from io import StringIO
 import os
-from fake_useragent import UserAgent
-
-def fetch_data():
-    # Initialize UserAgent generator
-    ua = UserAgent()
-
-    # Initialize a session to handle requests
-    session = requests.Session()
-
-    # Define headers to be used in the request with dynamic User-Agent
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from nse_client import NseClient
+from nse_config import ARCHIVES_URL, BASE_URL, DATA_DIR
+import storage
+import bulk_mktcap
+
+def save_symbols(symbols, output_file):
+    # Save the symbols to a CSV file
+    with open(output_file, "w", newline="") as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(["SYMBOL"])  # Write header
+        csv_writer.writerows([[symbol] for symbol in symbols])
+
+    # Mirror into any configured Parquet/Feather copies
+    binary_formats = storage.binary_formats()
+    if binary_formats:
+        storage.write_dataset(pd.DataFrame({"SYMBOL": symbols}), "Symbols", formats=binary_formats)
+
+# Bhavcopy series kept in Symbols.csv; G-secs, bonds, ETFs etc. only waste
+# quote-equity requests in the per-symbol crawlers. Override with NSE_SERIES.
+DEFAULT_SERIES = "EQ,BE,BZ,SM,ST"
+
+# How many days back to look for the latest bhavcopy
+LOOKBACK_DAYS = 10
+
+# Optional list of NSE trading holidays (one DD-MM-YYYY or YYYY-MM-DD date per line).
+# Not a .txt file: auto_run.py deletes *.txt in the data directory at the start of every run.
+HOLIDAYS_FILE = os.path.join(DATA_DIR, "nse_holidays.csv")
+
+def configured_series():
+    return {s.strip().upper() for s in os.environ.get('NSE_SERIES', DEFAULT_SERIES).split(',') if s.strip()}
+
+def load_holidays(holidays_file=HOLIDAYS_FILE):
+    holidays = set()
+    if not os.path.exists(holidays_file):
+        return holidays
+    with open(holidays_file) as f:
+        for line in f:
+            line = line.strip()
+            for fmt in ('%d-%m-%Y', '%Y-%m-%d', '%d-%b-%Y'):
+                try:
+                    holidays.add(datetime.datetime.strptime(line, fmt).date())
+                    break
+                except ValueError:
+                    continue
+    return holidays
+
+def candidate_dates(today=None, lookback_days=LOOKBACK_DAYS):
+    """Today and the previous lookback_days days, newest first, minus weekends and holidays."""
+    today = today or datetime.date.today()
+    holidays = load_holidays()
+    dates = [today - datetime.timedelta(days=i) for i in range(lookback_days + 1)]
+    return [d for d in dates if d.weekday() < 5 and d not in holidays]
+
+def bhavcopy_url(date):
+    return f"{ARCHIVES_URL}/products/content/sec_bhavdata_full_{date:%d%m%Y}.csv"
+
+def probe(session, date, headers):
+    # Streamed and conditional, so probing a date only costs the headers until
+    # its body is needed, and a bhavcopy seen last run comes back as a 304
+    response = None
+    try:
+        response = session.get_cached(bhavcopy_url(date), headers=dict(headers))
+        response.raise_for_status()
+        return response
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching data for {date:%d%m%Y}: {str(e)}")
+        if response is not None:
+            response.discard()
+        return None
+
+def parse_bhavcopy(lines, series):
+    """Stream bhavcopy rows and return (symbol, prev_close, close) for the unique symbols in the given series."""
+    reader = csv.reader(lines)
+    header = [column.strip().upper() for column in next(reader, [])]
+    if "SYMBOL" not in header:
+        return []
+    symbol_index = header.index("SYMBOL")
+    series_index = header.index("SERIES") if "SERIES" in header else None
+    prev_close_index = header.index("PREV_CLOSE") if "PREV_CLOSE" in header else None
+    close_index = header.index("CLOSE_PRICE") if "CLOSE_PRICE" in header else None
+
+    def price(row, index):
+        return row[index].strip() if index is not None and len(row) > index else None
+
+    rows = {}
+    for row in reader:
+        if len(row) <= symbol_index:
+            continue
+        if series_index is not None and row[series_index].strip().upper() not in series:
+            continue
+        symbol = row[symbol_index].strip()
+        rows.setdefault(symbol, (symbol, price(row, prev_close_index), price(row, close_index)))
+    return list(rows.values())
+
+def fetch_data(lookback_days=LOOKBACK_DAYS):
+    # Shared session: warmed once (cookies are required to avoid 401) and reused by later scripts
+    session = NseClient()
+
+    # Define headers to be used in the request
     headers = {
-        "User-Agent": ua.chrome,  # Random Chrome User-Agent
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "en-US,en;q=0.5",
-        "Referer": "https://www.nseindia.com/",
+        "Referer": f"{BASE_URL}/",
     }
 
-    # Get the current date in DDMMYYYY format
-    current_date = datetime.datetime.now().strftime('%d%m%Y')
-
-    # Construct the Bhavcopy URL for the current date
-    url = f"https://nsearchives.nseindia.com/products/content/sec_bhavdata_full_{current_date}.csv"
-
     # Define the output directory
-    output_directory = "/home/nikunj/NseInsiderTrading"
+    output_directory = DATA_DIR
     os.makedirs(output_directory, exist_ok=True)  # Ensure the directory exists
     output_file = os.path.join(output_directory, "Symbols.csv")  # Full path for the output file
 
-    try:
-        # Step 0: Warm-up request to set cookies (required to avoid 401)
-        session.get("https://www.nseindia.com", headers=headers)
-
-        # Step 1: Fetch CSV data for the current date using session
-        response = session.get(url, headers=headers)
-        response.raise_for_status()
-
-        # Parse CSV data
-        csv_data_array = list(csv.reader(StringIO(response.text)))
-
-        # Check if CSV has content beyond headers
-        if len(csv_data_array) > 1:
-            symbols = [row[0] for row in csv_data_array[1:]]  # Assuming "SYMBOL" is in the first column
+    series = configured_series()
+    dates = candidate_dates(lookback_days=lookback_days)
 
-            # Save the symbols to a CSV file
-            with open(output_file, "w", newline="") as csvfile:
-                csv_writer = csv.writer(csvfile)
-                csv_writer.writerow(["SYMBOL"])  # Write header
-                csv_writer.writerows([[symbol] for symbol in symbols])
+    # Probe every candidate trading day at once instead of one after another
+    with ThreadPoolExecutor(max_workers=max(1, len(dates))) as executor:
+        responses = list(executor.map(lambda d: probe(session, d, headers), dates))
 
-            print(f"Symbols saved to {output_file} for {current_date}")
-            return
-
-    except requests.exceptions.HTTPError as e:
-        print(f"Error fetching data for {current_date}: {str(e)}")
-
-    # Retry for the past 10 days if current day's data is unavailable
-    for i in range(1, 11):
-        past_date = (datetime.datetime.now() - datetime.timedelta(days=i)).strftime('%d%m%Y')
-        past_url = f"https://nsearchives.nseindia.com/products/content/sec_bhavdata_full_{past_date}.csv"
-
-        try:
-            # Warm-up before each past request (optional)
-            session.get("https://www.nseindia.com", headers=headers)
-
-            past_response = session.get(past_url, headers=headers)
-            past_response.raise_for_status()
-
-            # Parse CSV data for the past date
-            past_csv_data_array = list(csv.reader(StringIO(past_response.text)))
-
-            # Check if CSV has content beyond headers
-            if len(past_csv_data_array) > 1:
-                symbols = [row[0] for row in past_csv_data_array[1:]]  # Assuming "SYMBOL" is in the first column
-
-                # Save the symbols to a CSV file
-                with open(output_file, "w", newline="") as csvfile:
-                    csv_writer = csv.writer(csvfile)
-                    csv_writer.writerow(["SYMBOL"])  # Write header
-                    csv_writer.writerows([[symbol] for symbol in symbols])
-
-                print(f"Symbols saved to {output_file} for {past_date}")
-                break  # Exit the loop if data is found for any past date
-
-        except requests.exceptions.HTTPError as past_error:
-            print(f"Error fetching data for {past_date}: {str(past_error)}")
-
-# Call the function
-fetch_data()
+    try:
+        # Newest available bhavcopy wins
+        for date, response in zip(dates, responses):
+            if response is None:
+                continue
+            # Same bhavcopy as last run: Symbols.csv and the closes are already current
+            if response.not_modified and os.path.exists(output_file) and os.path.exists(bulk_mktcap.CLOSES_FILE):
+                print(f"Bhavcopy for {date:%d%m%Y} unchanged since the last run, {output_file} kept")
+                return
+            rows = parse_bhavcopy(response.iter_lines(decode_unicode=True), series)
+            if rows:
+                symbols = [row[0] for row in rows]
+                save_symbols(symbols, output_file)
+                # Close prices for the bulk market-cap computation
+                bulk_mktcap.save_closes(rows)
+                response.commit()
+                print(f"Symbols saved to {output_file} for {date:%d%m%Y} ({len(symbols)} symbols in series {', '.join(sorted(series))})")
+                return
+            print(f"No {', '.join(sorted(series))} symbols in bhavcopy for {date:%d%m%Y}")
+        print(f"No bhavcopy found for the last {lookback_days} days")
+    finally:
+        for response in responses:
+            if response is not None:
+                response.discard()
+        session.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write Symbols.csv from the newest NSE bhavcopy")
+    parser.add_argument('--lookback-days', type=int, default=LOOKBACK_DAYS,
+                        help="how many days back to look for a published bhavcopy")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    fetch_data(args.lookback_days)
+
+if __name__ == "__main__":
+    main()
@@ -1,45 +1,22 @@
 import os
-import time
 import logging
-import pandas as pd
-import requests
-from fake_useragent import UserAgent
-
-# Configure logging
-logging.basicConfig(
-    filename='/home/nikunj/NseInsiderTrading/log.txt',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-
-ua = UserAgent()
-
-def get_headers(user_agent, symbol=None):
-    referer_url = f"https://www.nseindia.com/get-quotes/equity?symbol={symbol}" if symbol else "https://www.nseindia.com/"
-    return {
-        "User-Agent": user_agent,
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept": "*/*",
-        "Referer": referer_url
-    }
-
-def warm_up_session(session, user_agent, symbol):
-    try:
-        homepage = "https://www.nseindia.com"
-        session.get(homepage, headers=get_headers(user_agent), timeout=10)
-        time.sleep(1)
+import argparse
 
-        quote_url = f"https://www.nseindia.com/get-quotes/equity?symbol={symbol}"
-        session.get(quote_url, headers=get_headers(user_agent, symbol), timeout=10)
-        time.sleep(1)
-    except Exception as e:
-        logging.error(f"Error warming up session for {symbol}: {str(e)}")
-        print(f"Error warming up session for {symbol}: {str(e)}")
+from nse_client import NseClient, configure_logging, limit_rate, quote_referer
+from nse_config import BASE_URL, DATA_DIR
+from ingest import MKTCAP_SCHEMA, build_frame
+import storage
+from crawl_journal import CrawlJournal, crawl, DEFAULT_RETRY_ROUNDS, DEFAULT_BACKOFF
+import bulk_mktcap
+import shard_crawl
+from rate_limiter import DEFAULT_MAX_RPS
 
-def get_market_cap(symbol, session, user_agent):
+LANDING_PAGE = f"{BASE_URL}/market-data/live-equity-market"
+
+def get_market_cap(symbol, client):
     try:
-        url = f"https://www.nseindia.com/api/quote-equity?symbol={symbol}&section=trade_info"
-        response = session.get(url, headers=get_headers(user_agent, symbol), timeout=10)
+        url = f"{BASE_URL}/api/quote-equity?symbol={symbol}&section=trade_info"
+        response = client.get(url, referer=quote_referer(symbol), timeout=10)
 
         if response.status_code == 200:
             try:
@@ -63,47 +40,114 @@ def get_market_cap(symbol, session, user_agent):
         print(error_msg)
         return None
 
-# File paths
-symbols_file = '/home/nikunj/NseInsiderTrading/Symbols.csv'
-output_file = '/home/nikunj/NseInsiderTrading/mktcap.csv'
-
-if not os.path.exists(symbols_file):
-    raise FileNotFoundError(f"{symbols_file} not found!")
-
-symbols_df = pd.read_csv(symbols_file)
-if symbols_df.empty or symbols_df.shape[1] < 1:
-    raise ValueError(f"{symbols_file} is empty or improperly formatted!")
-
-mktcap_df = pd.DataFrame(columns=['symbol', 'market_cap'])
-
-user_agent = ua.random
-session = requests.Session()
-
-for i, row in symbols_df.iterrows():
-    symbol = row.iloc[0]
-
-    # Rotate user agent every 2 symbols
-    if i % 2 == 0:
-        user_agent = ua.random
-        session.close()
-        session = requests.Session()
-        logging.info(f"Rotated user agent at index {i}")
-        print(f"Rotated user agent at index {i}")
-
-    warm_up_session(session, user_agent, symbol)
-
-    market_cap = get_market_cap(symbol, session, user_agent)
-
+def fetch_row(symbol, client):
+    market_cap = get_market_cap(symbol, client)
     if market_cap:
         print(f"{symbol}: ₹{market_cap}")
-        mktcap_df = mktcap_df._append({'symbol': symbol, 'market_cap': market_cap}, ignore_index=True)
+        return {'symbol': symbol, 'market_cap': market_cap}
+    print(f"Failed to fetch market cap for {symbol}")
+    return None
+
+def fetch_issued_shares(symbol, client):
+    data = client.get_json(f"{BASE_URL}/api/quote-equity?symbol={symbol}", referer=quote_referer(symbol))
+    issued = (data or {}).get('securityInfo', {}).get('issuedSize')
+    if not issued:
+        print(f"Failed to fetch issued shares for {symbol}")
+    return issued or None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write mktcap.csv for every symbol in Symbols.csv")
+    parser.add_argument('--mode', choices=['bulk', 'crawl'], default='bulk',
+                        help="bulk multiplies bhavcopy closes by cached issued shares; crawl calls trade_info per symbol")
+    parser.add_argument('--shares-ttl-days', type=float, default=bulk_mktcap.DEFAULT_TTL_DAYS,
+                        help="refetch cached issued-share counts older than this many days")
+    parser.add_argument('--workers', type=int, default=1, help="requests kept in flight (per shard when sharded)")
+    parser.add_argument('--rps', type=float, default=DEFAULT_MAX_RPS, help="ceiling for the adaptive requests-per-second rate")
+    parser.add_argument('--retry-rounds', type=int, default=DEFAULT_RETRY_ROUNDS,
+                        help="extra passes over failed symbols before giving up")
+    parser.add_argument('--retry-backoff', type=float, default=DEFAULT_BACKOFF,
+                        help="seconds before the first retry pass, doubled for each later pass")
+    shard_crawl.add_shard_arguments(parser)
+    return parser.parse_args()
+
+def crawl_symbols(name, fetch, symbols, args):
+    """Crawl symbols with fetch(symbol, client); returns the journal holding the rows, or None for a lone shard."""
+    # Shard workers look the fetch function up by name
+    fetch_ref = f"Updated_Mktcap:{fetch.__name__}"
+    if args.shards == 1:
+        limit_rate(args.rps)
+        # One warmed session for the whole run; the shared client re-warms only on 401/403 or cookie expiry
+        journal = CrawlJournal(name)
+        with NseClient(landing_page=LANDING_PAGE, pool_size=args.workers) as client:
+            crawl(symbols, lambda symbol: fetch(symbol, client), journal, args.workers,
+                  args.retry_rounds, args.retry_backoff)
+        return journal
+
+    if args.shard is not None:
+        # One shard of a crawl spread over machines; --merge-shards writes the output
+        shard_crawl.run_shard(name, fetch_ref, symbols, args.shard, args.shards, LANDING_PAGE, args.workers,
+                              args.rps, shard_crawl.proxy_for(args.shard, args.proxies),
+                              args.retry_rounds, args.retry_backoff)
+        return None
+    journal = shard_crawl.ShardSet(name, args.shards)
+    if not args.merge_shards:
+        journal.run(fetch_ref, symbols, LANDING_PAGE, args.workers, args.rps, args.proxies,
+                    args.retry_rounds, args.retry_backoff)
+    return journal
+
+def main():
+    args = parse_args()
+    configure_logging()
+    shard_crawl.check_shard_arguments(args)
+
+    # File paths
+    symbols_file = os.path.join(DATA_DIR, 'Symbols.csv')
+    output_file = os.path.join(DATA_DIR, 'mktcap.csv')
+
+    if not os.path.exists(symbols_file):
+        raise FileNotFoundError(f"{symbols_file} not found!")
+
+    symbols_df = storage.read_dataset('Symbols')
+    if symbols_df.empty or symbols_df.shape[1] < 1:
+        raise ValueError(f"{symbols_file} is empty or improperly formatted!")
+
+    symbols = symbols_df.iloc[:, 0].tolist()
+
+    if args.mode == 'bulk' and not os.path.exists(bulk_mktcap.CLOSES_FILE):
+        print(f"{bulk_mktcap.CLOSES_FILE} not found, falling back to per-symbol market cap")
+        args.mode = 'crawl'
+
+    if args.mode == 'bulk':
+        # Only new, expired or corporate-action-affected share counts are fetched;
+        # every market cap is then computed locally in one pass
+        closes = bulk_mktcap.load_closes()
+        shares = bulk_mktcap.load_shares()
+        refresh = bulk_mktcap.symbols_to_refresh(symbols, closes, shares, args.shares_ttl_days)
+        print(f"Refreshing issued shares for {len(refresh)} of {len(symbols)} symbols")
+
+        journal = crawl_symbols('issued_shares', fetch_issued_shares, refresh, args)
+        if journal is None:
+            return
+
+        shares = bulk_mktcap.update_shares(shares, {symbol: journal.rows.get(symbol) for symbol in refresh})
+        mktcap, shares = bulk_mktcap.compute_market_caps(symbols, closes, shares)
+        bulk_mktcap.save_shares(shares)
+        mktcap_df = build_frame(mktcap.to_dict('records'), MKTCAP_SCHEMA)
+        journal_symbols = refresh
     else:
-        print(f"Failed to fetch market cap for {symbol}")
-
-    time.sleep(1)
-
-session.close()
-
-os.makedirs(os.path.dirname(output_file), exist_ok=True)
-mktcap_df.to_csv(output_file, index=False)
-print(f"Saved market cap data to {output_file}")
+        # Every finished symbol is journaled, so a killed run resumes where it stopped
+        # and failed symbols are retried with backoff before the file is written
+        journal = crawl_symbols('mktcap', fetch_row, symbols, args)
+        if journal is None:
+            return
+
+        mktcap_df = build_frame([journal.rows[s] for s in symbols if s in journal.rows], MKTCAP_SCHEMA)
+        journal_symbols = symbols
+
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    storage.write_dataset(mktcap_df, 'mktcap')
+    print(f"Saved market cap data to {output_file}")
+    journal.finish(journal_symbols)
+
+if __name__ == "__main__":
+    main()
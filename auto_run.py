@@ -1,29 +1,53 @@
 import subprocess
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import glob
 import time
 import sys
+import json
+import argparse
+import selectors
+import statistics
+import multiprocessing
+import runpy
+from concurrent.futures import ProcessPoolExecutor
 
-# Directory containing the scripts
-scripts_dir = "/home/nikunj/NseInsiderTrading"
+from nse_config import DATA_DIR
 
-# List of Python scripts to run
-scripts = [
-    "Symbols.py",
-    "Updated_Mktcap.py",
-    "insider_trading_data.py",
-    "promoter_pledge.py",
-    "StkData.py",
-    "commit_files.py"
-]
+# Directory containing the scripts (this file's unless NSE_SCRIPTS_DIR says
+# otherwise), and the one they write their data and logs to (the collectors'
+# DATA_DIR)
+scripts_dir = os.environ.get("NSE_SCRIPTS_DIR", os.path.dirname(os.path.abspath(__file__)))
+data_dir = DATA_DIR
 
-# Log file
-log_file = os.path.join(scripts_dir, "log.txt")
+# Steps of the nightly run and the steps each one must wait for.
+# quote_data.py writes both mktcap.csv and stkdata.csv in one pass, replacing
+# the separate Updated_Mktcap.py and StkData.py crawls; only it needs
+# Symbols.csv, so the insider and pledge collectors start right away.
+# NSE_SHARDS=N in the environment spreads its crawl over N processes
+# (shard_crawl.py).
+# "nse" marks steps that call NSE and share the global request budget;
+# "outputs" are the files whose row counts go into the run history. A step
+# whose dependency failed (or was skipped) is skipped, unless it is marked
+# "after_failure", so commit_files.py still commits what the other steps wrote.
+steps = {
+    "Symbols.py": {"deps": [], "nse": True, "outputs": ["Symbols.csv"]},
+    "quote_data.py": {"deps": ["Symbols.py"], "nse": True, "outputs": ["stkdata.csv", "mktcap.csv"]},
+    "insider_trading_data.py": {"deps": [], "nse": True, "outputs": ["insider.csv"]},
+    "promoter_pledge.py": {"deps": [], "nse": True, "outputs": ["pledge.csv"]},
+    "xbrl_enrich.py": {"deps": ["insider_trading_data.py"], "nse": True, "outputs": ["insider_xbrl.csv"]},
+    "commit_files.py": {"deps": ["Symbols.py", "quote_data.py", "insider_trading_data.py", "promoter_pledge.py",
+                                 "xbrl_enrich.py"],
+                        "nse": False, "outputs": [], "after_failure": True},
+}
+
+# Log file (recreated every run) and the append-only history of step timings, kept across runs
+log_file = os.path.join(data_dir, "log.txt")
+history_file = os.path.join(data_dir, "run_history.jsonl")
 
 # Function to delete .log and .txt files
 def delete_log_and_text_files():
-    files_to_delete = glob.glob(os.path.join(scripts_dir, "*.log")) + glob.glob(os.path.join(scripts_dir, "*.txt"))
+    files_to_delete = glob.glob(os.path.join(data_dir, "*.log")) + glob.glob(os.path.join(data_dir, "*.txt"))
     for file_path in files_to_delete:
         try:
             os.remove(file_path)
@@ -40,73 +64,312 @@ def log_message(log, message):
     log.write(message + "\n")
     log.flush()
     print(message)
+    sys.stdout.flush()
+
+def count_rows(file_name):
+    # Data rows in a CSV output (lines minus the header), without parsing it
+    path = os.path.join(data_dir, file_name)
+    try:
+        with open(path, "rb") as f:
+            lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        return max(0, lines - 1)
+    except FileNotFoundError:
+        return None
+
+def append_history(record):
+    with open(history_file, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+def check_dag(steps):
+    """Raise ValueError for unknown dependencies or cycles."""
+    for name, step in steps.items():
+        for dep in step["deps"]:
+            if dep not in steps:
+                raise ValueError(f"{name} depends on unknown step {dep}")
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle through {name}")
+        visiting.add(name)
+        for dep in steps[name]["deps"]:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in steps:
+        visit(name)
+
+class SubprocessStep:
+    """A step running under sys.executable in its own process, with both pipes watched by the shared selector."""
+
+    def __init__(self, script, env, selector, log):
+        self.script = script
+        self.log = log
+        self.selector = selector
+        self.partial = {}
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(scripts_dir, script)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=env,
+        )
+        for pipe, stream in ((self.process.stdout, "output"), (self.process.stderr, "error")):
+            os.set_blocking(pipe.fileno(), False)
+            self.partial[stream] = b""
+            selector.register(pipe, selectors.EVENT_READ, (self, stream))
+
+    def on_readable(self, pipe, stream):
+        data = os.read(pipe.fileno(), 65536)
+        if not data:
+            # EOF: flush any unterminated last line and stop watching this pipe
+            if self.partial[stream]:
+                self.emit(stream, self.partial[stream])
+            del self.partial[stream]
+            self.selector.unregister(pipe)
+            pipe.close()
+            return
+        lines = (self.partial[stream] + data).split(b"\n")
+        self.partial[stream] = lines.pop()
+        for line in lines:
+            self.emit(stream, line)
+
+    def emit(self, stream, line):
+        text = line.decode(errors="replace").strip()
+        log_message(self.log, f"[{current_timestamp()}] {self.script} {stream}: {text}")
 
-# Function to run each script and show output in real-time
-def run_scripts():
+    def poll(self):
+        """Exit code once both pipes are drained and the process has exited, else None."""
+        if self.partial:
+            return None
+        return self.process.poll()
+
+class StepOutput:
+    """stdout/stderr replacement for in-process steps: timestamps each line into log.txt and the console."""
+
+    def __init__(self, script, stream, console):
+        self.script = script
+        self.stream = stream
+        self.console = console
+        self.buffer = ""
+
+    def write(self, text):
+        self.buffer += text
+        while "\n" in self.buffer:
+            line, self.buffer = self.buffer.split("\n", 1)
+            message = f"[{current_timestamp()}] {self.script} {self.stream}: {line.strip()}\n"
+            with open(log_file, "a") as log:
+                log.write(message)
+            self.console.write(message)
+            self.console.flush()
+        return len(text)
+
+    def flush(self):
+        pass
+
+def run_in_process_step(script):
+    # Runs inside a forked pool worker that already imported the heavy modules
+    console = sys.__stdout__
+    sys.stdout = StepOutput(script, "output", console)
+    sys.stderr = StepOutput(script, "error", console)
+    sys.argv = [script]
+    import nse_metrics
+    nse_metrics.reset()
+    try:
+        runpy.run_path(os.path.join(scripts_dir, script), run_name="__main__")
+        return 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        sys.stderr.write(f"{type(e).__name__}: {e}\n")
+        return 1
+    finally:
+        # Pool workers do not run atexit handlers, so each step's metrics are written here
+        nse_metrics.flush(script)
+        sys.stdout.flush()
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+
+class PoolStep:
+    """A step running through runpy in the forked worker pool."""
+
+    def __init__(self, script, executor):
+        self.script = script
+        self.future = executor.submit(run_in_process_step, script)
+
+    def poll(self):
+        if not self.future.done():
+            return None
+        try:
+            return self.future.result()
+        except Exception:
+            return 1
+
+def summarize_metrics(since):
+    sys.path.insert(0, scripts_dir)
+    try:
+        import nse_metrics
+    except ImportError:
+        return None
+    return nse_metrics.summarize(since)
+
+def preload_modules():
+    # Imported once in the parent so forked workers skip the per-script import cost
+    for module in ("pandas", "requests", "nse_client", "ingest", "storage"):
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the nightly NSE collectors as a dependency graph")
+    parser.add_argument('--workers', type=int, default=3, help="steps allowed to run at the same time")
+    parser.add_argument('--nse-rps', type=float, default=4.0, help="global NSE requests-per-second budget")
+    parser.add_argument('--in-process', action='store_true',
+                        help="run steps in a forked worker pool instead of a new interpreter per step")
+    parser.add_argument('--history', action='store_true',
+                        help="compare each step's median duration this week against the week before, then exit")
+    return parser.parse_args()
+
+def load_history():
+    records = []
+    try:
+        with open(history_file) as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return records
+
+def report_history(days=7):
+    """Print each step's median duration over the last `days` against the window before it."""
+    now = datetime.now()
+    current, previous = {}, {}
+    for record in load_history():
+        started = datetime.fromisoformat(record["start"])
+        if started >= now - timedelta(days=days):
+            current.setdefault(record["step"], []).append(record["duration"])
+        elif started >= now - timedelta(days=2 * days):
+            previous.setdefault(record["step"], []).append(record["duration"])
+
+    print(f"{'step':<28}{'this week':>12}{'last week':>12}{'change':>10}")
+    for step in sorted(set(current) | set(previous)):
+        this_week = statistics.median(current[step]) if step in current else None
+        last_week = statistics.median(previous[step]) if step in previous else None
+        change = f"{(this_week / last_week - 1) * 100:+.0f}%" if this_week and last_week else "-"
+        print(f"{step:<28}{this_week or 0:>11.1f}s{last_week or 0:>11.1f}s{change:>10}")
+
+# Function to run the steps, starting each one as soon as its dependencies finish
+def run_scripts(workers=3, nse_rps=4.0, in_process=False):
+    check_dag(steps)
     delete_log_and_text_files()
-    with open(log_file, "a") as log:  # Open in append mode to preserve logs if needed
-        for script in scripts:
-            try:
-                # Start message
-                start_message = f"[{current_timestamp()}] Starting {script}..."
-                log_message(log, start_message)
 
-                # Measure time to start the script
-                start_time = time.time()
+    # Subprocess steps cannot share a limiter, so each NSE step gets an equal
+    # share of the budget for the most NSE steps that can overlap
+    nse_steps = [name for name, step in steps.items() if step["nse"]]
+    nse_share = nse_rps / max(1, min(workers, len(nse_steps)))
 
-                # Run the script with real-time output
-                script_path = os.path.join(scripts_dir, script)
+    executor = None
+    if in_process:
+        sys.path.insert(0, scripts_dir)
+        import nse_client
+        import rate_limiter
+        preload_modules()
+        context = multiprocessing.get_context("fork")
+        shared_limiter = rate_limiter.AdaptiveRateLimiter(max_rps=nse_rps, lock=context.Lock(),
+                                                          state=context.Array('d', 3, lock=False))
+        nse_client.set_global_limiter(shared_limiter)
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    selector = selectors.DefaultSelector()
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+
+    with open(log_file, "a") as log:  # Open in append mode to preserve logs if needed
+        finished = set()
+        failed = set()
+        running = []
+        start_times = {}
+        pending = dict(steps)
+        run_start = time.time()
+
+        while pending or running:
+            ready = [name for name, step in pending.items() if all(dep in finished for dep in step["deps"])]
+            for script in ready:
+                failed_deps = [dep for dep in steps[script]["deps"] if dep in failed]
+                if failed_deps and not steps[script].get("after_failure"):
+                    del pending[script]
+                    log_message(log, f"[{current_timestamp()}] Skipping {script}: {', '.join(failed_deps)} failed")
+                    finished.add(script)
+                    failed.add(script)
+            ready = [name for name in ready if name in pending]
+            for script in ready[:max(0, workers - len(running))]:
+                del pending[script]
+                log_message(log, f"[{current_timestamp()}] Starting {script}...")
+                start_times[script] = datetime.now()
                 try:
-                    process = subprocess.Popen(
-                        ['python3', script_path],
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                        bufsize=1,  # Line buffered
-                        universal_newlines=True
-                    )
+                    if in_process:
+                        running.append(PoolStep(script, executor))
+                    else:
+                        env = dict(os.environ)
+                        if steps[script]["nse"]:
+                            env["NSE_MAX_RPS"] = str(nse_share)
+                        running.append(SubprocessStep(script, env, selector, log))
                 except (FileNotFoundError, PermissionError) as e:
-                    error_message = f"[{current_timestamp()}] Failed to start {script}: {e}"
-                    log_message(log, error_message)
+                    log_message(log, f"[{current_timestamp()}] Failed to start {script}: {e}")
+                    finished.add(script)
+                    failed.add(script)
+
+            # Multiplex stdout and stderr of every running subprocess so no pipe can fill up and stall
+            if selector.get_map():
+                for key, _ in selector.select(timeout=0.5):
+                    step, stream = key.data
+                    step.on_readable(key.fileobj, stream)
+            else:
+                time.sleep(0.2)
+
+            for step in list(running):
+                returncode = step.poll()
+                if returncode is None:
                     continue
+                running.remove(step)
+                script = step.script
+                end_time = datetime.now()
+                elapsed_time = (end_time - start_times[script]).total_seconds()
+                log_message(log, f"[{current_timestamp()}] {script} completed in {elapsed_time:.2f} seconds.")
+                if returncode != 0:
+                    log_message(log, f"[{current_timestamp()}] Error occurred while running {script}: exit code {returncode}")
+                    failed.add(script)
+
+                append_history({
+                    "run_id": run_id,
+                    "step": script,
+                    "start": start_times[script].isoformat(timespec="seconds"),
+                    "end": end_time.isoformat(timespec="seconds"),
+                    "duration": round(elapsed_time, 2),
+                    "exit_code": returncode,
+                    "mode": "in-process" if in_process else "subprocess",
+                    "rows": {name: count_rows(name) for name in steps[script]["outputs"]},
+                })
+                finished.add(script)
+
+        if executor:
+            executor.shutdown()
+        selector.close()
+        log_message(log, f"[{current_timestamp()}] All steps completed in {time.time() - run_start:.2f} seconds.")
+
+        report = summarize_metrics(datetime.fromtimestamp(run_start))
+        if report:
+            log_message(log, f"[{current_timestamp()}] NSE network time {report['network_seconds']:.1f}s, "
+                             f"sleep time {report['sleep_seconds']:.1f}s; report written to nse_metrics_report.json")
 
-                # Print stdout in real-time
-                while True:
-                    output = process.stdout.readline()
-                    if output == '' and process.poll() is not None:
-                        break
-                    if output:
-                        timestamped_output = f"[{current_timestamp()}] {script} output: {output.strip()}"
-                        log_message(log, timestamped_output)
-                        sys.stdout.flush()
-
-                # Capture any remaining stderr
-                _, stderr = process.communicate()
-
-                # Explicitly close stdout and stderr
-                process.stdout.close()
-                process.stderr.close()
-
-                # Measure completion time
-                end_time = time.time()
-                elapsed_time = end_time - start_time
-                timing_message = f"[{current_timestamp()}] {script} completed in {elapsed_time:.2f} seconds."
-                log_message(log, timing_message)
-
-                # Log and print any stderr
-                if stderr:
-                    stderr_message = f"[{current_timestamp()}] Errors in {script}:\n{stderr}"
-                    log_message(log, stderr_message)
-
-                # Handle non-zero exit code
-                if process.returncode != 0:
-                    raise subprocess.CalledProcessError(process.returncode, script, stderr=stderr)
-
-            except subprocess.CalledProcessError as e:
-                # Log and print error
-                error_message = f"[{current_timestamp()}] Error occurred while running {script}:\n{e.stderr}"
-                log_message(log, error_message)
-                continue  # Move to the next script even if an error occurs
+def main():
+    args = parse_args()
+    if args.history:
+        report_history()
+    else:
+        run_scripts(workers=args.workers, nse_rps=args.nse_rps, in_process=args.in_process)
 
 if __name__ == "__main__":
-    run_scripts()
+    main()
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+from datetime import datetime
+
+import fake_nse_server
+import nse_cli
+
+# End-to-end benchmark of the collectors against fake_nse_server.py.
+#
+# Each collector (and auto_run.py) is run as its own process with
+# NSE_BASE_URL/NSE_ARCHIVES_URL pointing at an in-process stand-in and
+# NSE_DATA_DIR at a scratch directory, so nothing touches nseindia.com or
+# the real data. For every run we record wall time, requests per second as
+# seen by the server, 429s, peak RSS of the process tree and rows written.
+# Results are appended to benchmark_results.jsonl under a label, and
+# --compare prints the change against an earlier label, e.g.
+#   python3 benchmark.py --label baseline
+#   ... change something ...
+#   python3 benchmark.py --label adaptive-limiter --compare baseline
+# --startup instead times the cold start of every nse_cli.py command
+# (`nse_cli.py <command> --help` in a fresh interpreter, i.e. the imports),
+# and --max-startup fails the run when a command's median exceeds it.
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FILE = "benchmark_results.jsonl"
+
+# Collectors and the outputs whose rows are counted; Symbols.py runs first
+# in a seed directory because the per-symbol crawlers read Symbols.csv
+COLLECTORS = {
+    "Symbols.py": ["Symbols.csv"],
+    "StkData.py": ["stkdata.csv"],
+    "Updated_Mktcap.py": ["mktcap.csv"],
+    "quote_data.py": ["stkdata.csv", "mktcap.csv"],
+    "insider_trading_data.py": ["insider.csv"],
+    "promoter_pledge.py": ["pledge.csv"],
+    "xbrl_enrich.py": ["insider_xbrl.csv"],
+    "auto_run.py": ["Symbols.csv", "stkdata.csv", "mktcap.csv", "insider.csv", "pledge.csv"],
+}
+
+def count_rows(path):
+    try:
+        with open(path, "rb") as f:
+            lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        return max(0, lines - 1)
+    except FileNotFoundError:
+        return None
+
+def server_stats(base_url):
+    with urllib.request.urlopen(f"{base_url}/__stats") as response:
+        return json.load(response)
+
+def reset_server(base_url):
+    urllib.request.urlopen(f"{base_url}/__reset").close()
+
+def total_requests(stats):
+    return sum(count for codes in stats.values() for count in codes.values())
+
+def throttled_requests(stats):
+    return sum(codes.get("429", 0) for codes in stats.values())
+
+def run_collector(script, args, env, data_dir, base_url, timeout):
+    """Run one collector to completion and return its measurements."""
+    reset_server(base_url)
+    log_path = os.path.join(data_dir, f"benchmark-{script}.out")
+    start = time.monotonic()
+    with open(log_path, "wb") as out:
+        process = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_DIR, script)] + args,
+                                   stdout=out, stderr=subprocess.STDOUT, env=env, cwd=data_dir)
+        deadline = start + timeout
+        # wait4 reports the peak RSS of the process and every descendant it waited for
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            if time.monotonic() > deadline:
+                process.kill()
+                pid, status, usage = os.wait4(process.pid, 0)
+                break
+            time.sleep(0.05)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.monotonic() - start
+
+    stats = server_stats(base_url)
+    requests = total_requests(stats)
+    return {
+        "script": script,
+        "exit_code": process.returncode,
+        "wall_seconds": round(wall, 3),
+        "requests": requests,
+        "requests_per_second": round(requests / wall, 2) if wall else None,
+        "rate_limited": throttled_requests(stats),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "rows": {name: count_rows(os.path.join(data_dir, name)) for name in COLLECTORS[script]},
+        "endpoints": stats,
+    }
+
+def collector_env(base_url, data_dir):
+    env = dict(os.environ)
+    env.update({
+        "NSE_BASE_URL": base_url,
+        "NSE_ARCHIVES_URL": base_url,
+        "NSE_DATA_DIR": data_dir,
+        "NSE_SCRIPTS_DIR": SCRIPTS_DIR,
+        "PYTHONUNBUFFERED": "1",
+    })
+    return env
+
+def load_results(results_file, label):
+    runs = {}
+    try:
+        with open(results_file) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record["label"] == label:
+                        runs.setdefault(record["script"], []).append(record)
+    except FileNotFoundError:
+        pass
+    return runs
+
+def median_of(runs, key):
+    values = [run[key] for run in runs if run.get(key) is not None]
+    return statistics.median(values) if values else None
+
+def print_report(results, baseline=None):
+    header = f"{'collector':<26}{'wall s':>9}{'req/s':>9}{'429s':>7}{'RSS MB':>9}{'rows':>9}"
+    if baseline is not None:
+        header += f"{'vs base':>10}"
+    print(header)
+    for script, runs in results.items():
+        wall = median_of(runs, "wall_seconds")
+        rows = sum(v or 0 for v in runs[-1]["rows"].values())
+        line = (f"{script:<26}{wall:>9.2f}{median_of(runs, 'requests_per_second') or 0:>9.1f}"
+                f"{median_of(runs, 'rate_limited') or 0:>7.0f}{median_of(runs, 'peak_rss_mb') or 0:>9.1f}{rows:>9}")
+        if baseline is not None:
+            base_wall = median_of(baseline.get(script, []), "wall_seconds")
+            line += f"{(wall / base_wall - 1) * 100:>+9.0f}%" if base_wall else f"{'-':>10}"
+        print(line)
+
+def measure_startup(command, data_dir, repeat):
+    """Median wall time of `nse_cli.py <command> --help` in a fresh interpreter."""
+    env = dict(os.environ, NSE_DATA_DIR=data_dir, NSE_SCRIPTS_DIR=SCRIPTS_DIR)
+    args = [sys.executable, os.path.join(SCRIPTS_DIR, "nse_cli.py"), command, "--help"]
+    times = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        completed = subprocess.run(args, env=env, cwd=data_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        times.append(time.monotonic() - start)
+        if completed.returncode != 0:
+            raise SystemExit(f"nse_cli.py {command} --help failed: {completed.stderr.decode()[-500:]}")
+    return statistics.median(times)
+
+def run_startup(args):
+    data_dir = tempfile.mkdtemp(prefix="nse-startup-")
+    baseline = load_results(args.results, args.compare) if args.compare else {}
+    too_slow = []
+    try:
+        print(f"{'command':<26}{'cold start s':>14}" + (f"{'vs base':>10}" if args.compare else ""))
+        for command in nse_cli.COMMANDS:
+            seconds = measure_startup(command, data_dir, max(args.repeat, 3))
+            result = {"script": f"startup:{command}", "wall_seconds": round(seconds, 3), "label": args.label,
+                      "recorded": datetime.now().isoformat(timespec="seconds")}
+            with open(args.results, "a") as f:
+                f.write(json.dumps(result) + "\n")
+            line = f"{command:<26}{seconds:>14.3f}"
+            base = median_of(baseline.get(result["script"], []), "wall_seconds")
+            if args.compare:
+                line += f"{(seconds / base - 1) * 100:>+9.0f}%" if base else f"{'-':>10}"
+            print(line)
+            if args.max_startup is not None and seconds > args.max_startup:
+                too_slow.append(command)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    if too_slow:
+        raise SystemExit(f"Cold start above {args.max_startup}s for: {', '.join(too_slow)}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the collectors against a local NSE stand-in")
+    parser.add_argument('collectors', nargs='*', default=list(COLLECTORS),
+                        help="collectors to run (default: all, including auto_run.py)")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per collector; the median is reported")
+    parser.add_argument('--label', default=datetime.now().strftime("%Y%m%dT%H%M%S"),
+                        help="name stored with the results, e.g. baseline")
+    parser.add_argument('--compare', help="label of earlier results to compare wall time against")
+    parser.add_argument('--results', default=RESULTS_FILE, help="JSONL file the results are appended to")
+    parser.add_argument('--warm', action='store_true',
+                        help="reuse one data directory so caches and high-water marks carry over between runs")
+    parser.add_argument('--keep', action='store_true', help="keep the scratch data directories")
+    parser.add_argument('--timeout', type=float, default=1800, help="seconds before a collector run is killed")
+    parser.add_argument('--startup', action='store_true', help="time the cold start of every nse_cli.py command instead")
+    parser.add_argument('--max-startup', type=float, help="with --startup, fail when a command's median cold start exceeds this many seconds")
+    parser.add_argument('--auto-run-args', default="", help="extra arguments for auto_run.py, e.g. '--in-process'")
+    fake_nse_server.add_server_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.startup:
+        return run_startup(args)
+    unknown = set(args.collectors) - set(COLLECTORS)
+    if unknown:
+        raise SystemExit(f"Unknown collector(s): {', '.join(sorted(unknown))}")
+
+    fixtures, behaviour = fake_nse_server.from_arguments(args)
+    server, base_url = fake_nse_server.start_in_thread(fixtures=fixtures, behaviour=behaviour)
+    scratch = tempfile.mkdtemp(prefix="nse-benchmark-")
+    print(f"Fake NSE at {base_url}, scratch data in {scratch}")
+
+    try:
+        # Seed directory holding the Symbols.csv the per-symbol crawlers start from
+        seed_dir = os.path.join(scratch, "seed")
+        os.makedirs(seed_dir)
+        seed = run_collector("Symbols.py", [], collector_env(base_url, seed_dir), seed_dir, base_url, args.timeout)
+        if seed["exit_code"] != 0 or not seed["rows"]["Symbols.csv"]:
+            raise SystemExit(f"Symbols.py failed against the stand-in, see {seed_dir}")
+
+        results = {}
+        for script in args.collectors:
+            for run in range(args.repeat):
+                data_dir = os.path.join(scratch, script if args.warm else f"{script}-{run}")
+                if not os.path.isdir(data_dir):
+                    os.makedirs(data_dir)
+                    shutil.copy(os.path.join(seed_dir, "Symbols.csv"), data_dir)
+                extra = args.auto_run_args.split() if script == "auto_run.py" else []
+                result = run_collector(script, extra, collector_env(base_url, data_dir), data_dir,
+                                       base_url, args.timeout)
+                result.update({"label": args.label, "run": run, "recorded": datetime.now().isoformat(timespec="seconds")})
+                results.setdefault(script, []).append(result)
+                with open(args.results, "a") as f:
+                    f.write(json.dumps(result) + "\n")
+                status = "" if result["exit_code"] == 0 else f" (exit code {result['exit_code']})"
+                print(f"{script} run {run + 1}/{args.repeat}: {result['wall_seconds']:.2f}s, "
+                      f"{result['requests']} requests{status}")
+
+        print()
+        print_report(results, load_results(args.results, args.compare) if args.compare else None)
+    finally:
+        server.shutdown()
+        server.server_close()
+        if args.keep:
+            print(f"Scratch data kept in {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
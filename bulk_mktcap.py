@@ -0,0 +1,103 @@
+import os
+import pandas as pd
+from datetime import datetime, timedelta
+from nse_config import DATA_DIR
+
+# Market cap for every symbol from the bhavcopy close price and a cached
+# issued-share count, instead of one quote-equity trade_info call per symbol.
+#
+# Symbols.py saves each symbol's PREV_CLOSE and CLOSE_PRICE from the
+# bhavcopy it already downloads (bhavcopy_close.csv). Issued shares change
+# rarely, so they are kept in issued_shares.csv and only refetched (from
+# quote-equity securityInfo.issuedSize) for symbols that are new, older than
+# the TTL, failed last time, or show a corporate-action signal: NSE adjusts
+# PREV_CLOSE for splits and bonuses, so a PREV_CLOSE that no longer matches
+# the close we stored last run means the share count has probably changed.
+# market_cap is in Rs crore, like totalMarketCap.
+
+SHARES_FILE = os.path.join(DATA_DIR, "issued_shares.csv")
+CLOSES_FILE = os.path.join(DATA_DIR, "bhavcopy_close.csv")
+DEFAULT_TTL_DAYS = 7
+
+# Relative PREV_CLOSE vs stored close difference treated as a corporate action
+ADJUSTMENT_TOLERANCE = 0.005
+
+CLOSES_COLUMNS = ['symbol', 'prev_close', 'close']
+SHARES_COLUMNS = ['symbol', 'issued_shares', 'last_close', 'fetched_at', 'status']
+RUPEES_PER_CRORE = 1e7
+
+def load_closes(closes_file=CLOSES_FILE):
+    closes = pd.read_csv(closes_file, dtype={'symbol': str})
+    for column in ('prev_close', 'close'):
+        closes[column] = pd.to_numeric(closes[column], errors='coerce')
+    return closes
+
+def save_closes(rows, closes_file=CLOSES_FILE):
+    """rows: (symbol, prev_close, close) tuples from the bhavcopy."""
+    closes = pd.DataFrame(rows, columns=CLOSES_COLUMNS)
+    tmp_file = closes_file + ".tmp"
+    closes.to_csv(tmp_file, index=False)
+    os.replace(tmp_file, closes_file)
+
+def load_shares(shares_file=SHARES_FILE):
+    if not os.path.exists(shares_file):
+        return pd.DataFrame(columns=SHARES_COLUMNS).astype({'symbol': str})
+    shares = pd.read_csv(shares_file, dtype={'symbol': str, 'status': str, 'fetched_at': str})
+    for column in ('issued_shares', 'last_close'):
+        shares[column] = pd.to_numeric(shares[column], errors='coerce')
+    return shares
+
+def save_shares(shares, shares_file=SHARES_FILE):
+    tmp_file = shares_file + ".tmp"
+    shares[SHARES_COLUMNS].to_csv(tmp_file, index=False)
+    os.replace(tmp_file, shares_file)
+
+def symbols_to_refresh(symbols, closes, shares, ttl_days=DEFAULT_TTL_DAYS, now=None):
+    """Symbols whose issued-share count must be (re)fetched, in input order."""
+    cutoff = (now or datetime.now()) - timedelta(days=ttl_days)
+    frame = pd.DataFrame({'symbol': symbols}).merge(closes, on='symbol', how='left').merge(shares, on='symbol', how='left')
+    fetched_at = pd.to_datetime(frame['fetched_at'], errors='coerce')
+    adjusted = (frame['prev_close'] / frame['last_close'] - 1).abs() > ADJUSTMENT_TOLERANCE
+    stale = (
+        frame['issued_shares'].isna()
+        | (frame['status'] != 'ok')
+        | fetched_at.isna()
+        | (fetched_at < cutoff)
+        | adjusted.fillna(False)
+    )
+    return frame.loc[stale, 'symbol'].tolist()
+
+def update_shares(shares, fetched, now=None):
+    """Merge {symbol: issued_shares or None} into the cache.
+
+    A failed refresh keeps a previously known count (marked failed, so it
+    is retried next run) rather than dropping the symbol's market cap.
+    """
+    now = (now or datetime.now()).isoformat(timespec='seconds')
+    shares = shares.set_index('symbol')
+    for symbol, issued in fetched.items():
+        if issued:
+            shares.loc[symbol, ['issued_shares', 'fetched_at', 'status']] = [float(issued), now, 'ok']
+        elif symbol in shares.index and pd.notna(shares.at[symbol, 'issued_shares']):
+            shares.loc[symbol, 'status'] = 'failed'
+        else:
+            shares.loc[symbol, ['issued_shares', 'fetched_at', 'status']] = [float('nan'), now, 'failed']
+    shares = shares.reset_index()
+    shares['issued_shares'] = pd.to_numeric(shares['issued_shares'], errors='coerce')
+    return shares
+
+def compute_market_caps(symbols, closes, shares):
+    """One vectorised pass: market cap (Rs crore) for every symbol with a close and a share count.
+
+    Also returns the shares cache with last_close set to today's close, so
+    the next run can spot adjusted PREV_CLOSE values.
+    """
+    frame = pd.DataFrame({'symbol': symbols}).merge(closes, on='symbol', how='inner').merge(
+        shares[['symbol', 'issued_shares']], on='symbol', how='inner')
+    frame['market_cap'] = (frame['close'] * frame['issued_shares'] / RUPEES_PER_CRORE).round(2)
+    mktcap = frame.loc[frame['market_cap'].notna(), ['symbol', 'market_cap']].reset_index(drop=True)
+
+    last_close = closes.set_index('symbol')['close']
+    shares = shares.copy()
+    shares['last_close'] = shares['symbol'].map(last_close).fillna(shares['last_close'])
+    return mktcap, shares
@@ -0,0 +1,77 @@
+import os
+import pandas as pd
+from datetime import datetime, timedelta
+from nse_config import DATA_DIR
+
+# Persistent per-symbol cache of NSE industry classification.
+#
+# basicIndustry/industry/macro/sector almost never change, so each entry keeps
+# the time it was fetched and a status. A run only needs to fetch symbols that
+# are new, older than the TTL, or failed last time; stkdata.csv is then
+# rebuilt from the cache. `source` records what filled the entry:
+# "quote-equity" or an index constituent file (see index_constituents.py).
+
+CACHE_FILE = os.path.join(DATA_DIR, "stkdata_cache.csv")
+DEFAULT_TTL_DAYS = 30
+
+INDUSTRY_COLUMNS = ['symbol', 'basic_industry', 'industry', 'macro', 'sector']
+CACHE_COLUMNS = INDUSTRY_COLUMNS + ['fetched_at', 'status', 'source']
+API_SOURCE = 'quote-equity'
+
+def load_cache(cache_file=CACHE_FILE):
+    if not os.path.exists(cache_file):
+        return {}
+    cache_df = pd.read_csv(cache_file, dtype=str)
+    cache_df = cache_df.astype(object).where(cache_df.notna(), None)
+    return {entry['symbol']: entry for entry in cache_df.to_dict('records')}
+
+def save_cache(cache, cache_file=CACHE_FILE):
+    cache_df = pd.DataFrame(list(cache.values()), columns=CACHE_COLUMNS)
+    tmp_file = cache_file + ".tmp"
+    cache_df.to_csv(tmp_file, index=False)
+    os.replace(tmp_file, cache_file)
+
+def symbols_to_fetch(symbols, cache, ttl_days=DEFAULT_TTL_DAYS, now=None):
+    """Symbols that are new, expired or previously failed, in input order."""
+    cutoff = (now or datetime.now()) - timedelta(days=ttl_days)
+    stale = []
+    for symbol in symbols:
+        entry = cache.get(symbol)
+        if entry is None or entry['status'] != 'ok' or datetime.fromisoformat(entry['fetched_at']) < cutoff:
+            stale.append(symbol)
+    return stale
+
+def filled_levels(entry):
+    return sum(1 for column in INDUSTRY_COLUMNS[1:] if entry.get(column))
+
+def record_result(cache, symbol, row, now=None, source=API_SOURCE):
+    """Store a fetched row, or mark the symbol failed when row is None.
+
+    A failed refresh of a symbol that already has data keeps the old data,
+    and so does a row that fills fewer classification levels than the
+    cached entry; its fetched_at is left untouched so it is retried on the
+    next run.
+    """
+    now = (now or datetime.now()).isoformat(timespec='seconds')
+    cached = cache.get(symbol)
+    has_data = cached is not None and cached['status'] == 'ok'
+    if row is not None and has_data and filled_levels(row) < filled_levels(cached):
+        return
+    if row is not None:
+        entry = {column: row.get(column) for column in INDUSTRY_COLUMNS}
+        cache[symbol] = dict(entry, symbol=symbol, fetched_at=now, status='ok', source=source)
+    elif symbol not in cache or cache[symbol]['status'] != 'ok':
+        cache[symbol] = dict.fromkeys(INDUSTRY_COLUMNS, None)
+        cache[symbol].update(symbol=symbol, fetched_at=now, status='failed', source=source)
+
+def cached_rows(symbols, cache):
+    """Successfully classified rows for the given symbols, in input order."""
+    rows = []
+    for symbol in symbols:
+        entry = cache.get(symbol)
+        if entry is not None and entry['status'] == 'ok':
+            row = {column: entry[column] for column in INDUSTRY_COLUMNS}
+            # Entries written before sources were recorded all came from quote-equity
+            row['source'] = entry.get('source') or API_SOURCE
+            rows.append(row)
+    return rows
@@ -0,0 +1,95 @@
+import os
+import pandas as pd
+from datetime import datetime
+
+import storage
+import index_constituents
+from nse_config import DATA_DIR
+
+# Persistent company-name -> symbol index.
+#
+# pledge.csv only carries the company name ("20 Microns Limited") while the
+# other datasets are keyed by symbol. company_symbols.csv maps a normalised
+# name key (lower case, punctuation and a trailing "limited"/"ltd" removed)
+# to a symbol. The first run that needs it builds it from the whole insider
+# dataset and the index constituent files; after that every run feeds it the
+# company/symbol pairs of the new insider batch and re-reads the constituent
+# files (refresh()). rebuild() starts over on request.
+
+INDEX_FILE = os.path.join(DATA_DIR, "company_symbols.csv")
+INDEX_COLUMNS = ['name_key', 'company_name', 'symbol', 'source', 'updated_at']
+
+def normalize_names(names):
+    """Vectorised name key: 'Tata Motors Ltd.' and 'TATA MOTORS LIMITED' both become 'tata motors'."""
+    keys = pd.Series(names, dtype=object).fillna('').astype(str).str.lower()
+    keys = keys.str.replace('&', ' and ', regex=False)
+    keys = keys.str.replace(r'[^a-z0-9 ]', ' ', regex=True)
+    keys = keys.str.replace(r'\s+', ' ', regex=True).str.strip()
+    return keys.str.replace(r'\s+(limited|ltd)$', '', regex=True)
+
+def load_index(index_file=INDEX_FILE):
+    if not os.path.exists(index_file):
+        return pd.DataFrame(columns=INDEX_COLUMNS)
+    return pd.read_csv(index_file, dtype=str)
+
+def save_index(index, index_file=INDEX_FILE):
+    # Per-process temp name: the insider and pledge steps of auto_run.py both update it
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    index[INDEX_COLUMNS].to_csv(tmp_file, index=False)
+    os.replace(tmp_file, index_file)
+
+def update(pairs, source, index_file=INDEX_FILE):
+    """Merge (company_name, symbol) pairs into the index; returns how many keys were added or changed."""
+    pairs = pd.DataFrame({'company_name': pairs['company_name'], 'symbol': pairs['symbol']}).dropna()
+    pairs = pairs.astype(str)
+    pairs['name_key'] = normalize_names(pairs['company_name']).values
+    pairs = pairs[pairs['name_key'] != ''].drop_duplicates('name_key', keep='last')
+    if pairs.empty:
+        return 0
+
+    index = load_index(index_file)
+    known = pairs.merge(index[['name_key', 'symbol']], on='name_key', how='left', suffixes=('', '_known'))
+    changed = known[known['symbol'] != known['symbol_known']].drop(columns='symbol_known')
+    if changed.empty:
+        return 0
+    changed = changed.assign(source=source, updated_at=datetime.now().isoformat(timespec='seconds'))
+    index = pd.concat([index[~index['name_key'].isin(changed['name_key'])], changed[INDEX_COLUMNS]],
+                      ignore_index=True)
+    save_index(index, index_file)
+    return len(changed)
+
+def update_from_insider(insider_df, index_file=INDEX_FILE):
+    return update(insider_df[['company', 'symbol']].rename(columns={'company': 'company_name'}), 'insider', index_file)
+
+def update_from_constituents(index_file=INDEX_FILE):
+    return update(index_constituents.company_pairs(), 'index-constituents', index_file)
+
+def rebuild(index_file=INDEX_FILE):
+    if os.path.exists(index_file):
+        os.remove(index_file)
+    added = 0
+    if storage.dataset_exists('insider'):
+        added += update_from_insider(storage.read_dataset('insider', columns=['company', 'symbol']), index_file)
+    # Constituent files are curated, so they win over names seen in filings
+    added += update_from_constituents(index_file)
+    return added
+
+def refresh(insider_df=None, index_file=INDEX_FILE):
+    """Keep the index current on a collector run; returns how many keys were added or changed.
+
+    Builds the index from the whole insider dataset when it does not exist
+    yet; otherwise merges the pairs of insider_df (the newly fetched
+    filings), then the constituent files, which win.
+    """
+    if not os.path.exists(index_file):
+        return rebuild(index_file)
+    added = 0
+    if insider_df is not None:
+        added += update_from_insider(insider_df, index_file)
+    return added + update_from_constituents(index_file)
+
+def lookup(names, index_file=INDEX_FILE):
+    """Symbols for a sequence of company names (None where the index has no match)."""
+    index = load_index(index_file)
+    symbols = normalize_names(names).map(index.set_index('name_key')['symbol'])
+    return symbols.astype(object).where(symbols.notna(), None)
@@ -0,0 +1,169 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import nse_metrics
+from nse_client import log_and_print
+from nse_config import DATA_DIR
+
+# Write-through checkpoint journal and retry queue for the per-symbol crawlers.
+#
+# Every finished symbol is appended to <name>_journal.jsonl as soon as it
+# completes, so a crawl that is killed half way resumes from the journal
+# instead of starting over. Symbols that fail are retried in further rounds
+# with exponential backoff before the crawl is declared complete; whatever
+# still fails is written to <name>_retry.json and fetched first on the next
+# run. The journal is removed once the crawler has saved its output.
+
+# A journal older than this belongs to an earlier day's run and is not resumed
+JOURNAL_MAX_AGE = timedelta(hours=20)
+
+DEFAULT_RETRY_ROUNDS = 3
+DEFAULT_BACKOFF = 30.0
+
+class CrawlJournal:
+    def __init__(self, name, data_dir=DATA_DIR, max_age=JOURNAL_MAX_AGE):
+        self.journal_file = os.path.join(data_dir, f"{name}_journal.jsonl")
+        self.retry_file = os.path.join(data_dir, f"{name}_retry.json")
+        self.lock = threading.Lock()
+        self.rows = {}
+        self.attempts = {}
+        self.errors = {}
+        self.started = datetime.now()
+        self.load(max_age)
+        self.queue = self.load_retry_queue()
+        resumed = os.path.exists(self.journal_file)
+        self.handle = open(self.journal_file, "a")
+        if not resumed:
+            self.write({'started': self.started.isoformat(timespec='seconds')})
+
+    def load(self, max_age):
+        try:
+            with open(self.journal_file) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return
+        except ValueError:
+            # A torn last line from a kill mid-write: keep every complete entry before it
+            lines = []
+            with open(self.journal_file) as f:
+                for line in f:
+                    try:
+                        lines.append(json.loads(line))
+                    except ValueError:
+                        break
+
+        if not lines or 'started' not in lines[0]:
+            os.remove(self.journal_file)
+            return
+        started = datetime.fromisoformat(lines[0]['started'])
+        if datetime.now() - started > max_age:
+            log_and_print(f"Discarding journal from {started:%Y-%m-%d %H:%M}: too old to resume")
+            os.remove(self.journal_file)
+            return
+
+        self.started = started
+        for entry in lines[1:]:
+            symbol = entry['symbol']
+            self.attempts[symbol] = entry['attempts']
+            if entry['status'] == 'ok':
+                self.rows[symbol] = entry['row']
+            else:
+                self.errors[symbol] = entry.get('error')
+        if self.rows:
+            log_and_print(f"Resuming from {self.journal_file}: {len(self.rows)} symbols already done")
+
+    def load_retry_queue(self):
+        try:
+            with open(self.retry_file) as f:
+                queue = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        for symbol, entry in queue.items():
+            self.attempts.setdefault(symbol, entry['attempts'])
+        return queue
+
+    def write(self, entry):
+        self.handle.write(json.dumps(entry, default=str) + "\n")
+        self.handle.flush()
+
+    def record(self, symbol, row, error=None):
+        """Journal one attempt at a symbol; row is None when it failed."""
+        with self.lock:
+            attempts = self.attempts.get(symbol, 0) + 1
+            self.attempts[symbol] = attempts
+            if row is not None:
+                self.rows[symbol] = row
+                self.errors.pop(symbol, None)
+            else:
+                self.errors[symbol] = error
+            self.write({
+                'symbol': symbol,
+                'status': 'ok' if row is not None else 'failed',
+                'attempts': attempts,
+                'row': row,
+                'error': error,
+                'at': datetime.now().isoformat(timespec='seconds'),
+            })
+
+    def pending(self, symbols):
+        """Symbols not yet done in this run; last run's failures go first."""
+        todo = [symbol for symbol in symbols if symbol not in self.rows]
+        queued = [symbol for symbol in todo if symbol in self.queue]
+        return queued + [symbol for symbol in todo if symbol not in self.queue]
+
+    def failed(self, symbols):
+        return [symbol for symbol in symbols if symbol not in self.rows]
+
+    def finish(self, symbols):
+        """Save the retry queue for symbols that never succeeded and remove the journal."""
+        self.handle.close()
+        queue = {
+            symbol: {'attempts': self.attempts.get(symbol, 0), 'error': self.errors.get(symbol)}
+            for symbol in self.failed(symbols)
+        }
+        if queue:
+            tmp_file = self.retry_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump(queue, f, indent=1)
+            os.replace(tmp_file, self.retry_file)
+            log_and_print(f"{len(queue)} symbols still failing, queued in {self.retry_file}", level="warning")
+        elif os.path.exists(self.retry_file):
+            os.remove(self.retry_file)
+        os.remove(self.journal_file)
+
+def crawl(symbols, fetch, journal, workers=1, retry_rounds=DEFAULT_RETRY_ROUNDS, backoff=DEFAULT_BACKOFF):
+    """Fetch every symbol not already in the journal.
+
+    fetch(symbol) returns a JSON-serialisable row, or None on failure.
+    Failures are retried for up to retry_rounds more rounds, waiting
+    backoff, 2*backoff, ... seconds before each. Returns the symbols
+    that still failed.
+    """
+    def run(symbol):
+        try:
+            return fetch(symbol), None
+        except Exception as e:
+            return None, f"{type(e).__name__}: {e}"
+
+    pending = journal.pending(symbols)
+    for attempt in range(retry_rounds + 1):
+        if not pending:
+            break
+        if attempt:
+            delay = backoff * 2 ** (attempt - 1)
+            log_and_print(f"Retrying {len(pending)} failed symbols in {delay:.0f} seconds (round {attempt}/{retry_rounds})")
+            nse_metrics.sleep(delay, "retry-backoff")
+
+        if workers <= 1:
+            for symbol in pending:
+                journal.record(symbol, *run(symbol))
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(run, symbol): symbol for symbol in pending}
+                for future in as_completed(futures):
+                    journal.record(futures[future], *future.result())
+        pending = journal.failed(pending)
+    return pending
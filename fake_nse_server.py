@@ -0,0 +1,404 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Local stand-in for www.nseindia.com and nsearchives, used by benchmark.py.
+#
+# Serves the homepage and landing pages (which set the session cookies),
+# /api/quote-equity (with and without section=trade_info),
+# /api/corporates-pit, /api/corporate-pledgedata and
+# /products/content/sec_bhavdata_full_DDMMYYYY.csv and the
+# /corporate/xbrl/IT_<pid>.xml filings from synthetic fixtures
+# generated from a seed. Files in --fixtures override the generated
+# responses:
+#   quote-equity/<SYMBOL>.json, trade-info/<SYMBOL>.json,
+#   corporates-pit.json, corporate-pledgedata.json, bhavcopy.csv,
+#   xbrl/IT_<pid>.xml
+# Latency, the share of API calls answered with 429 and whether API calls
+# need the homepage cookies are configurable. Bhavcopies and XBRL filings
+# carry an ETag and answer If-None-Match with 304, and bodies over 1 KB are
+# gzipped when the client accepts it. GET /__stats returns the
+# request counts per endpoint; GET /__reset clears them.
+#
+# Point the collectors at it with
+#   NSE_BASE_URL=http://127.0.0.1:8765 NSE_ARCHIVES_URL=http://127.0.0.1:8765
+
+COOKIE_NAMES = ("nsit", "nseappid")
+NSE_DATE_FORMAT = '%d-%b-%Y'
+
+INDUSTRIES = [
+    ("Private Sector Bank", "Banks", "Financial Services", "Financial Services"),
+    ("Computers - Software & Consulting", "IT - Software", "Information Technology", "Information Technology"),
+    ("Pharmaceuticals", "Pharmaceuticals & Biotechnology", "Healthcare", "Healthcare"),
+    ("Passenger Cars & Utility Vehicles", "Automobiles", "Consumer Discretionary", "Automobile and Auto Components"),
+    ("Iron & Steel", "Ferrous Metals", "Commodities", "Metals & Mining"),
+    ("Power Generation", "Power", "Utilities", "Power"),
+]
+
+# Bhavcopy series mix: mostly equities, plus the bond/G-sec rows Symbols.py filters out
+SERIES = ["EQ"] * 16 + ["BE", "SM", "GS", "N1"]
+
+PERSON_CATEGORIES = ["Promoters", "Promoter Group", "Director", "Designated Employees", "Employees"]
+ACQ_MODES = ["Market Purchase", "Market Sale", "Pledge Creation", "Revokation of Pledge", "ESOP"]
+TRANSACTION_TYPES = ["Buy"] * 5 + ["Sell"] * 3 + ["Pledge", "Pledge Revoke"]
+# Rows per disclosure; insider.csv averages about two
+ROWS_PER_DISCLOSURE = [1] * 5 + [2] * 2 + [3, 4, 6]
+
+class Fixtures:
+    """Deterministic synthetic NSE data, optionally overridden by files in fixtures_dir."""
+
+    def __init__(self, symbols=500, filings_per_day=40, days=400, seed=42, fixtures_dir=None):
+        self.fixtures_dir = fixtures_dir
+        rng = random.Random(seed)
+        self.symbols = []
+        for i in range(symbols):
+            series = rng.choice(SERIES)
+            symbol = f"{i:04d}GS2030" if series in ("GS", "N1") else f"SYM{i:04d}"
+            self.symbols.append({
+                'symbol': symbol,
+                'series': series,
+                'company': f"{symbol.title()} Limited",
+                'industry': rng.choice(INDUSTRIES),
+                'close': round(rng.uniform(10, 5000), 2),
+                'issued_shares': rng.randrange(1_000_000, 5_000_000_000, 1000),
+            })
+        equities = [s for s in self.symbols if s['series'] not in ("GS", "N1")]
+        self.by_symbol = {s['symbol']: s for s in self.symbols}
+
+        # Insider filings for every weekday in the last `days` days. Like the real
+        # endpoint, a disclosure (pid) often reports several transactions, one row
+        # each, and buyValue/sellValue/buyQuantity/sellquantity are always 0: the
+        # figures are in secAcq/secVal and the direction in tdpTransactionType.
+        self.filings = []
+        pid = 1000000
+        today = datetime.now().date()
+        for offset in range(days, -1, -1):
+            day = today - timedelta(days=offset)
+            if day.weekday() >= 5:
+                continue
+            for _ in range(filings_per_day):
+                pid += 1
+                stock = rng.choice(equities)
+                person = f"Person {rng.randrange(1, 5000)}"
+                filed_at = f"{day:%d-%b-%Y} 18:{rng.randrange(60):02d}"
+                category = rng.choice(PERSON_CATEGORIES)
+                for _ in range(rng.choice(ROWS_PER_DISCLOSURE)):
+                    quantity = rng.randrange(100, 100000)
+                    value = round(quantity * stock['close'], 2)
+                    acquired = day - timedelta(days=rng.randrange(0, 5))
+                    self.filings.append({
+                        'symbol': stock['symbol'], 'company': stock['company'], 'anex': '7(2)',
+                        'acqName': person, 'date': filed_at,
+                        'pid': pid, 'buyValue': 0, 'sellValue': 0, 'buyQuantity': 0, 'sellquantity': 0,
+                        'secType': 'Equity Shares', 'secAcq': quantity,
+                        'tdpTransactionType': rng.choice(TRANSACTION_TYPES),
+                        'xbrl': f"/corporate/xbrl/IT_{pid}.xml",
+                        'personCategory': category,
+                        'befAcqSharesNo': quantity * 10, 'befAcqSharesPer': round(rng.uniform(0, 10), 2),
+                        'secVal': value, 'securitiesTypePost': 'Equity Shares',
+                        'afterAcqSharesNo': quantity * 11, 'afterAcqSharesPer': round(rng.uniform(0, 10), 2),
+                        'acqfromDt': acquired.strftime(NSE_DATE_FORMAT), 'acqtoDt': acquired.strftime(NSE_DATE_FORMAT),
+                        'intimDt': day.strftime(NSE_DATE_FORMAT),
+                        'acqMode': rng.choice(ACQ_MODES), 'derivativeType': '-', 'exchange': 'NSE', 'remarks': '-',
+                        '_day': day,
+                    })
+        # The XBRL document of a disclosure describes its first transaction
+        self.filings_by_pid = {}
+        for f in self.filings:
+            self.filings_by_pid.setdefault(f['pid'], f)
+
+        self.pledges = []
+        for stock in equities:
+            if rng.random() < 0.3:
+                self.pledges.append({
+                    'comName': stock['company'],
+                    'percPromoterHolding': round(rng.uniform(20, 75), 2),
+                    'totPromoterShares': rng.randrange(0, stock['issued_shares'] // 4),
+                    'percPromoterShares': round(rng.uniform(0, 60), 2),
+                })
+
+    def override(self, *parts):
+        """Contents of a fixture file, or None when there is no such override."""
+        if not self.fixtures_dir:
+            return None
+        path = os.path.join(self.fixtures_dir, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def quote_equity(self, symbol):
+        body = self.override("quote-equity", f"{symbol}.json")
+        if body is not None:
+            return body
+        stock = self.by_symbol.get(symbol)
+        if stock is None:
+            return json.dumps({}).encode()
+        basic_industry, industry, macro, sector = stock['industry']
+        return json.dumps({
+            'info': {'symbol': symbol, 'companyName': stock['company']},
+            'metadata': {'series': stock['series'], 'pdSectorInd': sector},
+            'securityInfo': {'issuedSize': stock['issued_shares']},
+            'priceInfo': {'lastPrice': stock['close'], 'previousClose': stock['close']},
+            'industryInfo': {'macro': macro, 'sector': sector, 'industry': industry, 'basicIndustry': basic_industry},
+        }).encode()
+
+    def trade_info(self, symbol):
+        body = self.override("trade-info", f"{symbol}.json")
+        if body is not None:
+            return body
+        stock = self.by_symbol.get(symbol)
+        if stock is None:
+            return json.dumps({}).encode()
+        market_cap = round(stock['close'] * stock['issued_shares'] / 1e7, 2)
+        return json.dumps({
+            'marketDeptOrderBook': {'tradeInfo': {'totalMarketCap': market_cap, 'ffmc': round(market_cap * 0.4, 2)}},
+        }).encode()
+
+    def corporates_pit(self, from_date, to_date):
+        body = self.override("corporates-pit.json")
+        if body is not None:
+            return body
+        rows = [{k: v for k, v in f.items() if k != '_day'}
+                for f in self.filings if from_date <= f['_day'] <= to_date]
+        return json.dumps({'data': rows, 'acqNameList': []}).encode()
+
+    def pledge_data(self):
+        body = self.override("corporate-pledgedata.json")
+        if body is not None:
+            return body
+        return json.dumps({'data': self.pledges}).encode()
+
+    def xbrl(self, name):
+        body = self.override("xbrl", name)
+        if body is not None:
+            return body
+        try:
+            pid = int(name.split("_", 1)[1].split(".")[0])
+        except (IndexError, ValueError):
+            return None
+        filing = self.filings_by_pid.get(pid)
+        if filing is None:
+            return None
+        facts = {
+            'NameOfTheCompany': filing['company'],
+            'NameOfThePerson': filing['acqName'],
+            'CategoryOfPerson': filing['personCategory'],
+            'TypeOfSecurity': filing['secType'],
+            'NumberOfSecuritiesAcquiredOrDisposed': filing['secAcq'],
+            'ValueOfSecuritiesAcquiredOrDisposed': filing['secVal'],
+            'TransactionType': filing['tdpTransactionType'],
+            'ModeOfAcquisitionOrDisposal': filing['acqMode'],
+            'ExchangeOnWhichTheTradeWasExecuted': filing['exchange'],
+        }
+        elements = "".join(f'<in-pit:{name} contextRef="D">{value}</in-pit:{name}>' for name, value in facts.items())
+        return ('<?xml version="1.0" encoding="UTF-8"?><xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance" '
+                f'xmlns:in-pit="http://example.com/in-pit">{elements}</xbrli:xbrl>').encode()
+
+    def bhavcopy(self, date):
+        body = self.override("bhavcopy.csv")
+        if body is not None:
+            return body
+        lines = ["SYMBOL, SERIES, DATE1, PREV_CLOSE, OPEN_PRICE, HIGH_PRICE, LOW_PRICE, LAST_PRICE, CLOSE_PRICE, "
+                 "AVG_PRICE, TTL_TRD_QNTY, TURNOVER_LACS, NO_OF_TRADES, DELIV_QTY, DELIV_PER"]
+        for stock in self.symbols:
+            close = stock['close']
+            lines.append(f"{stock['symbol']}, {stock['series']}, {date:%d-%b-%Y}, {close}, {close}, {close}, "
+                         f"{close}, {close}, {close}, {close}, 1000, {close * 1000 / 1e5:.2f}, 10, 500, 50.00")
+        return ("\n".join(lines) + "\n").encode()
+
+class Behaviour:
+    """Runtime knobs of the stand-in, shared by all handler threads."""
+
+    def __init__(self, latency=0.05, jitter=0.02, rate_429=0.0, retry_after=1, require_cookies=True,
+                 bhavcopy_lag_days=0, seed=42):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.require_cookies = require_cookies
+        self.bhavcopy_lag_days = bhavcopy_lag_days
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def count(self, endpoint, status):
+        with self.lock:
+            entry = self.stats.setdefault(endpoint, {})
+            entry[str(status)] = entry.get(str(status), 0) + 1
+
+    def delay(self):
+        with self.lock:
+            delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttled(self):
+        with self.lock:
+            return self.rng.random() < self.rate_429
+
+class FakeNseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeNSE/1.0"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output readable; /__stats has the counts
+        pass
+
+    def send_body(self, endpoint, status, body, content_type="application/json", headers=None, validators=False):
+        headers = dict(headers or {})
+        if status == 200 and validators:
+            # Archive files carry an ETag like nsearchives does, so conditional requests get 304s
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                status, body = 304, b""
+        if status == 200 and len(body) > 1024 and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        self.server.behaviour.count(endpoint, status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def has_cookies(self):
+        cookie_header = self.headers.get("Cookie", "")
+        present = {part.split("=", 1)[0].strip() for part in cookie_header.split(";") if "=" in part}
+        return all(name in present for name in COOKIE_NAMES)
+
+    def do_GET(self):
+        behaviour = self.server.behaviour
+        fixtures = self.server.fixtures
+        parsed = urlparse(self.path)
+        path = parsed.path
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+
+        if path == "/__stats":
+            with behaviour.lock:
+                body = json.dumps(behaviour.stats).encode()
+            return self.send_body("__stats", 200, body)
+        if path == "/__reset":
+            with behaviour.lock:
+                behaviour.stats.clear()
+            return self.send_body("__reset", 200, b"{}")
+
+        behaviour.delay()
+
+        if path.startswith("/products/content/sec_bhavdata_full_"):
+            try:
+                date = datetime.strptime(path.rsplit("_", 1)[1].split(".")[0], "%d%m%Y").date()
+            except ValueError:
+                return self.send_body("bhavcopy", 404, b"Not Found", "text/plain")
+            newest = datetime.now().date() - timedelta(days=behaviour.bhavcopy_lag_days)
+            if date.weekday() >= 5 or date > newest:
+                return self.send_body("bhavcopy", 404, b"Not Found", "text/plain")
+            return self.send_body("bhavcopy", 200, fixtures.bhavcopy(date), "text/csv", validators=True)
+
+        if path.startswith("/corporate/xbrl/"):
+            body = fixtures.xbrl(path.rsplit("/", 1)[1])
+            if body is None:
+                return self.send_body("xbrl", 404, b"Not Found", "text/plain")
+            return self.send_body("xbrl", 200, body, "application/xml", validators=True)
+
+        if not path.startswith("/api/"):
+            # Homepage, landing and get-quotes pages hand out the session cookies
+            behaviour.count("page", 200)
+            body = b"<html><body>NSE stand-in</body></html>"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            for name in COOKIE_NAMES:
+                self.send_header("Set-Cookie", f"{name}=fake-{int(time.time())}; Path=/")
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        endpoint = path[len("/api/"):]
+        if endpoint == "quote-equity" and query.get("section") == "trade_info":
+            endpoint = "quote-equity-trade_info"
+        if behaviour.require_cookies and not self.has_cookies():
+            return self.send_body(endpoint, 401, b'{"message": "unauthorized"}')
+        if behaviour.throttled():
+            return self.send_body(endpoint, 429, b'{"message": "too many requests"}',
+                                  headers={"Retry-After": str(behaviour.retry_after)})
+
+        if endpoint == "quote-equity":
+            return self.send_body(endpoint, 200, fixtures.quote_equity(query.get("symbol", "")))
+        if endpoint == "quote-equity-trade_info":
+            return self.send_body(endpoint, 200, fixtures.trade_info(query.get("symbol", "")))
+        if endpoint == "corporates-pit":
+            try:
+                from_date = datetime.strptime(query["from_date"], "%d-%m-%Y").date()
+                to_date = datetime.strptime(query["to_date"], "%d-%m-%Y").date()
+            except (KeyError, ValueError):
+                return self.send_body(endpoint, 400, b'{"message": "bad date range"}')
+            return self.send_body(endpoint, 200, fixtures.corporates_pit(from_date, to_date))
+        if endpoint == "corporate-pledgedata":
+            return self.send_body(endpoint, 200, fixtures.pledge_data())
+        return self.send_body(endpoint, 404, b'{"message": "not found"}')
+
+def make_server(port=8765, fixtures=None, behaviour=None, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), FakeNseHandler)
+    server.daemon_threads = True
+    server.fixtures = fixtures or Fixtures()
+    server.behaviour = behaviour or Behaviour()
+    return server
+
+def start_in_thread(port=0, fixtures=None, behaviour=None):
+    """Start a server on a background thread; returns (server, base_url)."""
+    server = make_server(port, fixtures, behaviour)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def add_server_arguments(parser):
+    parser.add_argument('--symbols', type=int, default=500, help="symbols in the generated bhavcopy")
+    parser.add_argument('--filings-per-day', type=int, default=40, help="generated insider disclosures (pids) per weekday, each one to six rows")
+    parser.add_argument('--fixtures', help="directory of fixture files overriding the generated responses")
+    parser.add_argument('--latency', type=float, default=0.05, help="mean response latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.02, help="uniform +/- jitter on the latency")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="share of API calls answered with 429")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with 429s")
+    parser.add_argument('--no-cookies', action='store_true', help="serve API calls without the homepage cookies")
+    parser.add_argument('--bhavcopy-lag-days', type=int, default=0,
+                        help="newest bhavcopy is this many days old (exercises the lookback)")
+    parser.add_argument('--seed', type=int, default=42, help="seed for the fixtures and the 429/latency draws")
+
+def from_arguments(args):
+    fixtures = Fixtures(symbols=args.symbols, filings_per_day=args.filings_per_day, seed=args.seed,
+                        fixtures_dir=args.fixtures)
+    behaviour = Behaviour(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+                          retry_after=args.retry_after, require_cookies=not args.no_cookies,
+                          bhavcopy_lag_days=args.bhavcopy_lag_days, seed=args.seed)
+    return fixtures, behaviour
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the NSE endpoints the collectors use")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on")
+    add_server_arguments(parser)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    fixtures, behaviour = from_arguments(args)
+    server = make_server(args.port, fixtures, behaviour)
+    print(f"Fake NSE listening on http://127.0.0.1:{args.port} ({len(fixtures.symbols)} symbols, "
+          f"latency {args.latency}s, 429 rate {args.rate_429})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,172 @@
+import os
+import json
+import gzip
+import hashlib
+import time
+import threading
+from datetime import datetime
+from nse_config import DATA_DIR
+
+# On-disk conditional-request cache for large NSE downloads.
+#
+# NseClient.get_cached() sends If-None-Match / If-Modified-Since from the
+# validators stored with the previous response and asks for a compressed
+# transfer. Bodies are stored gzipped under http_cache/<key>.gz next to a
+# <key>.json entry holding the URL, validators and body SHA-256. A 304 means
+# the input is unchanged, so callers can skip parsing and their downstream
+# work entirely; for endpoints without validators (the JSON APIs) the body
+# hash tells them the same thing once the body has been read.
+#
+# Entries are only written by commit(), after the caller has stored what it
+# derived from the body, so a run that dies half-way does not leave a cache
+# entry claiming the input was already processed.
+
+CACHE_DIR = os.path.join(DATA_DIR, "http_cache")
+READ_SIZE = 64 * 1024
+# Entries not refreshed for this long are dropped by prune(); date-ranged
+# URLs (corporates-pit windows, old bhavcopies) are never requested again
+MAX_AGE_DAYS = 30
+
+try:
+    import brotli  # noqa: F401  (lets urllib3 decode Content-Encoding: br)
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+def cache_key(url):
+    return hashlib.sha1(url.encode()).hexdigest()
+
+def entry_paths(url, cache_dir=CACHE_DIR):
+    key = cache_key(url)
+    return os.path.join(cache_dir, key + ".json"), os.path.join(cache_dir, key + ".gz")
+
+def load_entry(url, cache_dir=CACHE_DIR):
+    meta_path, body_path = entry_paths(url, cache_dir)
+    try:
+        with open(meta_path) as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return entry if os.path.exists(body_path) else None
+
+def prune(max_age_days=MAX_AGE_DAYS, cache_dir=CACHE_DIR):
+    """Remove entries older than max_age_days; returns how many were removed."""
+    if not os.path.isdir(cache_dir):
+        return 0
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.endswith(".json") and os.path.getmtime(path) < cutoff:
+            os.remove(path)
+            body_path = path[:-len(".json")] + ".gz"
+            if os.path.exists(body_path):
+                os.remove(body_path)
+            removed += 1
+        elif name.endswith(".tmp") and os.path.getmtime(path) < cutoff:
+            # Teed bodies of runs that died before commit() or discard()
+            os.remove(path)
+    return removed
+
+def conditional_headers(entry):
+    headers = {'Accept-Encoding': ACCEPT_ENCODING}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+class CachedResponse:
+    """A streamed response (or the cached body after a 304) that records what it read.
+
+    not_modified is True for a 304. unchanged is True for a 304, or once the
+    whole body has been read and hashes the same as the cached one.
+    """
+
+    def __init__(self, url, response, entry, cache_dir=CACHE_DIR):
+        self.url = url
+        self.response = response
+        self.entry = entry
+        self.cache_dir = cache_dir
+        self.not_modified = response.status_code == 304 and entry is not None
+        self.status_code = 200 if self.not_modified else response.status_code
+        self.headers = response.headers
+        self.encoding = response.encoding or "utf-8"
+        self.sha256 = entry['sha256'] if self.not_modified else None
+        self.tmp_path = None
+
+    @property
+    def unchanged(self):
+        return self.not_modified or (self.sha256 is not None and self.entry is not None
+                                     and self.sha256 == self.entry.get('sha256'))
+
+    def raise_for_status(self):
+        if not self.not_modified:
+            self.response.raise_for_status()
+
+    def iter_content(self, chunk_size=READ_SIZE):
+        if self.not_modified:
+            with gzip.open(entry_paths(self.url, self.cache_dir)[1], "rb") as f:
+                yield from iter(lambda: f.read(chunk_size), b"")
+            return
+        # Tee the body into a compressed temporary copy while the caller parses it
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.tmp_path = f"{entry_paths(self.url, self.cache_dir)[1]}.{threading.get_ident()}.tmp"
+        digest = hashlib.sha256()
+        with gzip.open(self.tmp_path, "wb", compresslevel=6) as f:
+            for chunk in self.response.iter_content(chunk_size):
+                digest.update(chunk)
+                f.write(chunk)
+                yield chunk
+        self.sha256 = digest.hexdigest()
+
+    def iter_lines(self, decode_unicode=False):
+        pending = b""
+        for chunk in self.iter_content():
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                line = line.rstrip(b"\r")
+                yield line.decode(self.encoding) if decode_unicode else line
+        if pending:
+            yield pending.decode(self.encoding) if decode_unicode else pending
+
+    @property
+    def content(self):
+        return b"".join(self.iter_content())
+
+    def json(self):
+        return json.loads(self.content)
+
+    def commit(self):
+        """Store the validators and body once the caller has processed them."""
+        meta_path, body_path = entry_paths(self.url, self.cache_dir)
+        if self.not_modified:
+            # Still in use, so keep it out of prune()
+            os.utime(meta_path)
+            return
+        if self.sha256 is None or self.tmp_path is None:
+            return
+        entry = {
+            'url': self.url,
+            'etag': self.headers.get('ETag'),
+            'last_modified': self.headers.get('Last-Modified'),
+            'sha256': self.sha256,
+            'fetched_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        os.replace(self.tmp_path, body_path)
+        self.tmp_path = None
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def close(self):
+        """Release the connection; the teed body is kept until commit() or discard()."""
+        self.response.close()
+
+    def discard(self):
+        self.close()
+        if self.tmp_path and os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+        self.tmp_path = None
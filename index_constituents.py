@@ -0,0 +1,87 @@
+import os
+import glob
+import pandas as pd
+from nse_config import DATA_DIR
+
+# Bulk industry classification from locally supplied NSE index constituent
+# files (ind_nifty500list.csv, ind_niftymicrocap250_list.csv, ...).
+#
+# Drop the CSVs into <data dir>/index_constituents/. The standard NSE layout
+# is "Company Name, Industry, Symbol, Series, ISIN Code"; its Industry column
+# is NSE's sector-level classification, so it fills `sector`. Files that also
+# carry "Basic Industry", "Macro" or "Sector" columns fill those too. Symbols
+# whose row fills all four levels are classified in one merge; the rest
+# (every symbol of a sector-only file) still need a quote-equity call, so a
+# partial row never stands in for a full classification. Each row's source
+# is "index:<file name>".
+
+CONSTITUENTS_DIR = os.path.join(DATA_DIR, "index_constituents")
+
+CLASSIFICATION_COLUMNS = ['basic_industry', 'industry', 'macro', 'sector']
+
+# Constituent file header -> stkdata column; the plain "Industry" column is sector level
+COLUMN_MAP = {
+    'symbol': 'symbol',
+    'basic industry': 'basic_industry',
+    'basic_industry': 'basic_industry',
+    'macro': 'macro',
+    'macro-economic sector': 'macro',
+    'sector': 'sector',
+    'industry': 'sector',
+}
+
+def read_constituent_file(path):
+    df = pd.read_csv(path, dtype=str)
+    df.columns = [column.strip().lower() for column in df.columns]
+    # A file with an explicit Sector column uses Industry for the industry level
+    column_map = dict(COLUMN_MAP, industry='industry') if 'sector' in df.columns else COLUMN_MAP
+    df = df[[c for c in df.columns if c in column_map]].rename(columns=column_map)
+    if 'symbol' not in df.columns:
+        return None
+    for column in CLASSIFICATION_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    df = df[['symbol'] + CLASSIFICATION_COLUMNS]
+    df = df.apply(lambda series: series.str.strip())
+    df['source'] = "index:" + os.path.splitext(os.path.basename(path))[0]
+    return df[df['symbol'].notna() & df[CLASSIFICATION_COLUMNS].notna().any(axis=1)]
+
+def load_constituents(constituents_dir=CONSTITUENTS_DIR):
+    """All constituent rows, one per symbol; files with more filled levels win over sector-only ones."""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(constituents_dir, "*.csv"))):
+        df = read_constituent_file(path)
+        if df is not None and not df.empty:
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=['symbol'] + CLASSIFICATION_COLUMNS + ['source'])
+    constituents = pd.concat(frames, ignore_index=True)
+    constituents['filled'] = constituents[CLASSIFICATION_COLUMNS].notna().sum(axis=1)
+    constituents = constituents.sort_values('filled', ascending=False, kind='stable')
+    return constituents.drop_duplicates('symbol').drop(columns='filled')
+
+def classify(symbols, constituents_dir=CONSTITUENTS_DIR):
+    """Full classification rows (all four levels) for the symbols the constituent files cover, in input order."""
+    if len(symbols) == 0:
+        return []
+    constituents = load_constituents(constituents_dir)
+    constituents = constituents[constituents[CLASSIFICATION_COLUMNS].notna().all(axis=1)]
+    if constituents.empty:
+        return []
+    # object dtype on both sides: an empty list would otherwise give a float64 key
+    symbol_df = pd.DataFrame({'symbol': pd.Series(list(symbols), dtype=object)})
+    matched = symbol_df.merge(constituents.astype({'symbol': object}), on='symbol', how='inner')
+    matched = matched.astype(object).where(matched.notna(), None)
+    return matched.to_dict('records')
+
+def company_pairs(constituents_dir=CONSTITUENTS_DIR):
+    """(company_name, symbol) pairs from the "Company Name" column of the constituent files."""
+    frames = []
+    for path in sorted(glob.glob(os.path.join(constituents_dir, "*.csv"))):
+        df = pd.read_csv(path, dtype=str)
+        df.columns = [column.strip().lower() for column in df.columns]
+        if 'company name' in df.columns and 'symbol' in df.columns:
+            frames.append(df[['company name', 'symbol']].rename(columns={'company name': 'company_name'}))
+    if not frames:
+        return pd.DataFrame(columns=['company_name', 'symbol'])
+    return pd.concat(frames, ignore_index=True).dropna()
@@ -0,0 +1,202 @@
+import pandas as pd
+
+# Columnar ingestion of NSE JSON records into typed DataFrames.
+#
+# Collectors hand over a list of records (or a stream of them, batched by
+# build_frames); each column is pulled out in a single pass and then coerced
+# according to the dataset's schema (integer, numeric, date, categorical or
+# text), instead of appending rows one at a time into an all-object DataFrame.
+# The schemas are also what storage.py pins the Parquet/Feather copies to.
+
+# Date format used by corporates-pit for acqfromDt/acqtoDt/intimDt; also used
+# when writing CSV so the files keep their existing layout
+NSE_DATE_FORMAT = '%d-%b-%Y'
+
+INSIDER_SCHEMA = {
+    'columns': [
+        'symbol', 'company', 'anex', 'acqName', 'date', 'pid', 'buyValue',
+        'sellValue', 'buyQuantity', 'sellquantity', 'secType', 'secAcq',
+        'tdpTransactionType', 'xbrl', 'personCategory', 'befAcqSharesNo',
+        'befAcqSharesPer', 'secVal', 'securitiesTypePost', 'afterAcqSharesNo',
+        'afterAcqSharesPer', 'acqfromDt', 'acqtoDt', 'intimDt', 'acqMode',
+        'derivativeType', 'exchange', 'remarks'
+    ],
+    'source': {},
+    'integer': ['pid'],
+    'numeric': [
+        'buyValue', 'sellValue', 'buyQuantity', 'sellquantity', 'secAcq',
+        'befAcqSharesNo', 'befAcqSharesPer', 'secVal', 'afterAcqSharesNo',
+        'afterAcqSharesPer',
+    ],
+    'dates': ['acqfromDt', 'acqtoDt', 'intimDt'],
+    'categorical': [
+        'anex', 'secType', 'tdpTransactionType', 'personCategory',
+        'securitiesTypePost', 'acqMode', 'derivativeType', 'exchange',
+    ],
+    'text': ['symbol', 'company', 'acqName', 'date', 'xbrl', 'remarks'],
+}
+
+PLEDGE_SCHEMA = {
+    'columns': ['company_name', 'total_promoter_holding_pct', 'promoter_shares_encumbered', 'promoter_shares_encumbered_pct'],
+    'source': {
+        'company_name': 'comName',
+        'total_promoter_holding_pct': 'percPromoterHolding',
+        'promoter_shares_encumbered': 'totPromoterShares',
+        'promoter_shares_encumbered_pct': 'percPromoterShares',
+    },
+    'integer': [],
+    'numeric': ['total_promoter_holding_pct', 'promoter_shares_encumbered', 'promoter_shares_encumbered_pct'],
+    'dates': [],
+    'categorical': [],
+    'text': ['company_name'],
+}
+
+# The stored pledge history: each row is tagged with its snapshot date (YYYY-MM-DD),
+# which is empty for rows carried over from before snapshots were dated
+PLEDGE_HISTORY_SCHEMA = dict(
+    PLEDGE_SCHEMA,
+    columns=PLEDGE_SCHEMA['columns'] + ['snapshot_date'],
+    text=PLEDGE_SCHEMA['text'] + ['snapshot_date'],
+)
+
+_PLEDGE_FIGURES = PLEDGE_SCHEMA['numeric']
+
+PLEDGE_CHANGES_SCHEMA = {
+    'columns': (['snapshot_date', 'change', 'company_name', 'symbol'] + _PLEDGE_FIGURES
+                + [f"previous_{c}" for c in _PLEDGE_FIGURES] + ['encumbered_pct_change']),
+    'source': {},
+    'integer': [],
+    'numeric': _PLEDGE_FIGURES + [f"previous_{c}" for c in _PLEDGE_FIGURES] + ['encumbered_pct_change'],
+    'dates': [],
+    'categorical': [],
+    'text': ['snapshot_date', 'change', 'company_name', 'symbol'],
+}
+
+STKDATA_SCHEMA = {
+    'columns': ['symbol', 'basic_industry', 'industry', 'macro', 'sector', 'source'],
+    'source': {},
+    'integer': [],
+    'numeric': [],
+    'dates': [],
+    'categorical': ['basic_industry', 'industry', 'macro', 'sector', 'source'],
+    'text': ['symbol'],
+}
+
+MKTCAP_SCHEMA = {
+    'columns': ['symbol', 'market_cap'],
+    'source': {},
+    'integer': [],
+    'numeric': ['market_cap'],
+    'dates': [],
+    'categorical': [],
+    'text': ['symbol'],
+}
+
+# Fields extracted from insider XBRL filings (xbrl_enrich.py); source is the
+# XBRL element local name. Values are kept as the filing's text.
+INSIDER_XBRL_SCHEMA = {
+    'columns': [
+        'pid', 'xbrl_company_name', 'xbrl_isin', 'xbrl_person_name', 'xbrl_person_pan',
+        'xbrl_person_category', 'xbrl_security_type', 'xbrl_securities', 'xbrl_value',
+        'xbrl_transaction_type', 'xbrl_acq_mode', 'xbrl_acq_from', 'xbrl_acq_to',
+        'xbrl_intimation_to_company', 'xbrl_exchange', 'xbrl_contract_type',
+    ],
+    'source': {
+        'xbrl_company_name': 'NameOfTheCompany',
+        'xbrl_isin': 'ISIN',
+        'xbrl_person_name': 'NameOfThePerson',
+        'xbrl_person_pan': 'PANOfThePerson',
+        'xbrl_person_category': 'CategoryOfPerson',
+        'xbrl_security_type': 'TypeOfSecurity',
+        'xbrl_securities': 'NumberOfSecuritiesAcquiredOrDisposed',
+        'xbrl_value': 'ValueOfSecuritiesAcquiredOrDisposed',
+        'xbrl_transaction_type': 'TransactionType',
+        'xbrl_acq_mode': 'ModeOfAcquisitionOrDisposal',
+        'xbrl_acq_from': 'DateOfAllotmentAdviceOrAcquisitionOfSharesOrSaleOfSharesFrom',
+        'xbrl_acq_to': 'DateOfAllotmentAdviceOrAcquisitionOfSharesOrSaleOfSharesTo',
+        'xbrl_intimation_to_company': 'DateOfIntimationToCompany',
+        'xbrl_exchange': 'ExchangeOnWhichTheTradeWasExecuted',
+        'xbrl_contract_type': 'TypeOfContract',
+    },
+    'integer': ['pid'],
+    'numeric': [],
+    'dates': [],
+    'categorical': [],
+    'text': [
+        'xbrl_company_name', 'xbrl_isin', 'xbrl_person_name', 'xbrl_person_pan',
+        'xbrl_person_category', 'xbrl_security_type', 'xbrl_securities', 'xbrl_value',
+        'xbrl_transaction_type', 'xbrl_acq_mode', 'xbrl_acq_from', 'xbrl_acq_to',
+        'xbrl_intimation_to_company', 'xbrl_exchange', 'xbrl_contract_type',
+    ],
+}
+
+def apply_schema(df, schema, date_format=NSE_DATE_FORMAT):
+    """Coerce the columns of df in place to the dtypes declared by schema.
+
+    Columns missing from df (e.g. after a projected read) are skipped.
+    """
+    present = set(df.columns)
+    for column in schema['integer']:
+        if column in present:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('Int64')
+    for column in schema['numeric']:
+        if column in present:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    for column in schema['dates']:
+        if column in present:
+            df[column] = pd.to_datetime(df[column], format=date_format, errors='coerce')
+    for column in schema['categorical']:
+        if column in present:
+            df[column] = df[column].astype('category')
+    for column in schema['text']:
+        if column in present:
+            # Object dtype with None for missing values, so an all-empty column
+            # stays a text column instead of becoming float64
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+    return df
+
+def build_frame(records, schema):
+    """Build a typed DataFrame from a list of JSON records in one columnar pass."""
+    source = schema['source']
+    data = {
+        column: [record.get(source.get(column, column)) for record in records]
+        for column in schema['columns']
+    }
+    return apply_schema(pd.DataFrame(data, columns=schema['columns']), schema)
+
+def build_frames(records, schema, batch_size):
+    """Yield typed DataFrames of at most batch_size rows from an iterable of records.
+
+    Only one batch of records is held at a time, so a streamed response is
+    never materialised as a whole list of dicts.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield build_frame(batch, schema)
+            batch = []
+    if batch:
+        yield build_frame(batch, schema)
+
+def concat_frames(frames, schema):
+    """Concatenate typed frames; categoricals are rebuilt since batches differ in categories."""
+    frames = list(frames)
+    if not frames:
+        return build_frame([], schema)
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    for column in schema['categorical']:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+def read_csv(path, schema, **kwargs):
+    """Read a CSV written by write_csv back with the schema's dtypes."""
+    df = pd.read_csv(path, dtype={column: str for column in schema['dates'] + schema['text']}, **kwargs)
+    for column in schema['columns']:
+        if column not in df.columns:
+            df[column] = None
+    return apply_schema(df, schema)
+
+def write_csv(df, path, **kwargs):
+    df.to_csv(path, index=False, date_format=NSE_DATE_FORMAT, **kwargs)
@@ -0,0 +1,233 @@
+import argparse
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+
+import nse_db
+import storage
+
+# Insider-activity aggregates kept in the SQLite store (nse.db).
+#
+# Each transaction row of a filing is reduced to one fact row, keyed by
+# (pid, seq), seq being the row's position within its filing: buy/sell value
+# and quantity, a person group (promoter / director / other, from
+# personCategory) and pledge creation/revocation/invocation flags (from
+# acqMode), dated by acqtoDt. Facts are summed into insider_daily per
+# (symbol, day, group), with filings counting distinct pids. New or revised
+# pids replace all of their facts and only recompute the daily rows they touch, so the
+# aggregates are maintained incrementally as insider_trading_data.py brings
+# in filings. Window queries (7/30/90 days, top net buyers, ...) are indexed
+# range scans over insider_daily rather than a groupby over insider.csv.
+
+FACT_COLUMNS = [
+    'pid', 'seq', 'symbol', 'day', 'person_group', 'buy_value', 'sell_value',
+    'buy_quantity', 'sell_quantity', 'pledge_created', 'pledge_revoked', 'pledge_invoked',
+]
+MEASURES = FACT_COLUMNS[5:]
+WINDOWS = (7, 30, 90)
+PERSON_GROUPS = ('promoter', 'director', 'other')
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS insider_facts (
+        pid INTEGER, seq INTEGER, symbol TEXT, day TEXT, person_group TEXT,
+        buy_value REAL, sell_value REAL, buy_quantity REAL, sell_quantity REAL,
+        pledge_created INTEGER, pledge_revoked INTEGER, pledge_invoked INTEGER,
+        PRIMARY KEY (pid, seq)
+    );
+    CREATE TABLE IF NOT EXISTS insider_daily (
+        symbol TEXT, day TEXT, person_group TEXT, filings INTEGER,
+        buy_value REAL, sell_value REAL, buy_quantity REAL, sell_quantity REAL,
+        pledge_created INTEGER, pledge_revoked INTEGER, pledge_invoked INTEGER,
+        PRIMARY KEY (symbol, day, person_group)
+    );
+    CREATE INDEX IF NOT EXISTS idx_insider_daily_day ON insider_daily (day, person_group);
+    CREATE INDEX IF NOT EXISTS idx_insider_facts_key ON insider_facts (symbol, day, person_group);
+"""
+
+def person_groups(categories):
+    category = categories.astype(str).str.lower()
+    return np.select(
+        [category.str.contains('promoter'), category.str.contains('director')],
+        ['promoter', 'director'],
+        default='other',
+    )
+
+def side_figure(reported, fallback, on_side):
+    """reported where it is set, else fallback on rows of the transaction side, else 0."""
+    reported = reported.where(reported != 0)
+    return reported.fillna(fallback.where(on_side)).fillna(0.0)
+
+def to_facts(insider_df):
+    """Vectorised reduction of typed insider rows (see ingest.INSIDER_SCHEMA) to one fact per transaction row."""
+    df = insider_df[insider_df['pid'].notna()]
+    side = df['tdpTransactionType'].astype(str).str.lower()
+    mode = df['acqMode'].astype(str).str.lower()
+    is_buy = side.str.contains('buy')
+    is_sell = side.str.contains('sell')
+
+    # NSE sends buyValue/sellValue/buyQuantity/sellquantity as 0 (or blank); the
+    # figures are in secVal/secAcq, on the side given by tdpTransactionType
+    facts = pd.DataFrame({
+        'pid': df['pid'].astype('int64'),
+        'seq': df.groupby('pid').cumcount(),
+        'symbol': df['symbol'].astype(str),
+        'day': df['acqtoDt'].fillna(df['intimDt']).dt.strftime('%Y-%m-%d'),
+        'person_group': person_groups(df['personCategory']),
+        'buy_value': side_figure(df['buyValue'], df['secVal'], is_buy),
+        'sell_value': side_figure(df['sellValue'], df['secVal'], is_sell),
+        'buy_quantity': side_figure(df['buyQuantity'], df['secAcq'], is_buy),
+        'sell_quantity': side_figure(df['sellquantity'], df['secAcq'], is_sell),
+        'pledge_created': mode.str.contains('pledge creation').astype(int),
+        'pledge_revoked': mode.str.contains('revo').astype(int),
+        'pledge_invoked': mode.str.contains('invocation').astype(int),
+    })
+    return facts[facts['day'].notna()]
+
+def connect(db_file=nse_db.DB_FILE):
+    conn = nse_db.connect(db_file)
+    conn.executescript(SCHEMA)
+    return conn
+
+def facts_outdated(db_file=nse_db.DB_FILE):
+    """True when insider_facts still has the one-fact-per-pid layout."""
+    conn = nse_db.connect(db_file)
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(insider_facts)")]
+    finally:
+        conn.close()
+    return bool(columns) and 'seq' not in columns
+
+def update(insider_df, db_file=nse_db.DB_FILE):
+    """Replace the facts of the given filings and recompute only the daily rows they affect."""
+    if facts_outdated(db_file):
+        # Those facts kept one transaction per filing, so everything is recomputed once
+        return rebuild(db_file=db_file)
+    facts = to_facts(insider_df)
+    if facts.empty:
+        return 0
+    conn = connect(db_file)
+    try:
+        with conn:
+            conn.execute("CREATE TEMP TABLE batch (pid INTEGER PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO batch VALUES (?)", ((int(p),) for p in facts['pid']))
+            # Keys the batch touches: the new ones plus the old ones of revised pids
+            conn.execute("""
+                CREATE TEMP TABLE affected AS
+                SELECT DISTINCT symbol, day, person_group FROM insider_facts WHERE pid IN (SELECT pid FROM batch)
+            """)
+            # A revised filing may have fewer rows than before, so its old facts go first
+            conn.execute("DELETE FROM insider_facts WHERE pid IN (SELECT pid FROM batch)")
+            conn.executemany(f"INSERT INTO insider_facts VALUES ({', '.join('?' * len(FACT_COLUMNS))})",
+                             facts[FACT_COLUMNS].itertuples(index=False, name=None))
+            conn.execute("""
+                INSERT INTO affected
+                SELECT DISTINCT symbol, day, person_group FROM insider_facts WHERE pid IN (SELECT pid FROM batch)
+            """)
+            conn.execute("""
+                DELETE FROM insider_daily
+                WHERE (symbol, day, person_group) IN (SELECT symbol, day, person_group FROM affected)
+            """)
+            sums = ", ".join(f"SUM({m})" for m in MEASURES)
+            conn.execute(f"""
+                INSERT INTO insider_daily
+                SELECT f.symbol, f.day, f.person_group, COUNT(DISTINCT f.pid), {sums}
+                FROM insider_facts f
+                WHERE (f.symbol, f.day, f.person_group) IN (SELECT symbol, day, person_group FROM affected)
+                GROUP BY f.symbol, f.day, f.person_group
+            """)
+            conn.execute("DROP TABLE batch")
+            conn.execute("DROP TABLE affected")
+    finally:
+        conn.close()
+    return len(facts)
+
+def rebuild(insider_df=None, db_file=nse_db.DB_FILE):
+    """Drop the aggregates and rebuild them from the full insider dataset."""
+    if insider_df is None:
+        insider_df = storage.read_dataset('insider')
+    conn = nse_db.connect(db_file)
+    try:
+        with conn:
+            # Dropped rather than emptied, so a table with an older layout is recreated
+            conn.execute("DROP TABLE IF EXISTS insider_facts")
+            conn.execute("DROP TABLE IF EXISTS insider_daily")
+    finally:
+        conn.close()
+    return update(insider_df, db_file)
+
+def window_start(days, as_of=None):
+    return ((as_of or date.today()) - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+def query(sql, params, db_file=nse_db.DB_FILE):
+    conn = connect(db_file)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+def window_summary(days=30, person_group=None, symbol=None, as_of=None, db_file=nse_db.DB_FILE):
+    """Per-symbol totals over the last `days` days of acqtoDt, largest net buy value first."""
+    sql = """
+        SELECT symbol, SUM(filings) AS filings,
+               SUM(buy_value) AS buy_value, SUM(sell_value) AS sell_value,
+               SUM(buy_value) - SUM(sell_value) AS net_value,
+               SUM(buy_quantity) - SUM(sell_quantity) AS net_quantity,
+               SUM(pledge_created) AS pledge_created, SUM(pledge_revoked) AS pledge_revoked,
+               SUM(pledge_invoked) AS pledge_invoked
+        FROM insider_daily
+        WHERE day BETWEEN ? AND ?
+    """
+    params = [window_start(days, as_of), (as_of or date.today()).strftime('%Y-%m-%d')]
+    if person_group:
+        sql += " AND person_group = ?"
+        params.append(person_group)
+    if symbol:
+        sql += " AND symbol = ?"
+        params.append(symbol)
+    sql += " GROUP BY symbol ORDER BY net_value DESC"
+    return query(sql, params, db_file)
+
+def top_net_buyers(days=30, person_group='promoter', limit=20, as_of=None, db_file=nse_db.DB_FILE):
+    """e.g. top net promoter buyers over the last 30 days."""
+    summary = window_summary(days, person_group, as_of=as_of, db_file=db_file)
+    return summary[summary['net_value'] > 0].head(limit).reset_index(drop=True)
+
+def top_net_sellers(days=30, person_group='promoter', limit=20, as_of=None, db_file=nse_db.DB_FILE):
+    summary = window_summary(days, person_group, as_of=as_of, db_file=db_file)
+    return summary[summary['net_value'] < 0].sort_values('net_value').head(limit).reset_index(drop=True)
+
+def rolling_windows(symbol=None, as_of=None, db_file=nse_db.DB_FILE):
+    """Net value per symbol and person group over each of WINDOWS in one scan."""
+    as_of = as_of or date.today()
+    columns = ", ".join(
+        f"SUM(CASE WHEN day >= '{window_start(days, as_of)}' THEN buy_value - sell_value ELSE 0 END) AS net_value_{days}d"
+        for days in WINDOWS
+    )
+    sql = f"""
+        SELECT symbol, person_group, {columns},
+               SUM(pledge_created) AS pledge_created_{max(WINDOWS)}d
+        FROM insider_daily
+        WHERE day BETWEEN ? AND ?
+    """
+    params = [window_start(max(WINDOWS), as_of), as_of.strftime('%Y-%m-%d')]
+    if symbol:
+        sql += " AND symbol = ?"
+        params.append(symbol)
+    sql += " GROUP BY symbol, person_group ORDER BY symbol, person_group"
+    return query(sql, params, db_file)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Maintain and query the insider-activity aggregates")
+    parser.add_argument('--rebuild', action='store_true', help="recompute the aggregates from the whole insider dataset")
+    parser.add_argument('--days', type=int, default=30, help="window length for --top")
+    parser.add_argument('--group', choices=PERSON_GROUPS, default='promoter', help="person group for --top")
+    parser.add_argument('--top', type=int, default=20, help="rows to show")
+    parser.add_argument('--sellers', action='store_true', help="show top net sellers instead of buyers")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.rebuild:
+        print(f"Aggregated {rebuild()} insider transactions")
+    ranking = top_net_sellers if args.sellers else top_net_buyers
+    print(ranking(args.days, args.group, args.top).to_string(index=False))
@@ -1,93 +1,224 @@
 import os
-import time
+import json
 import logging
-import requests
+import argparse
 import pandas as pd
 from datetime import datetime, timedelta
-from fake_useragent import UserAgent
+from concurrent.futures import ThreadPoolExecutor
 
-# Output directory setup
-output_directory = "/home/nikunj/NseInsiderTrading"
-os.makedirs(output_directory, exist_ok=True)
+from nse_client import NseClient, configure_logging, limit_rate
+from nse_config import BASE_URL, DATA_DIR
+from ingest import INSIDER_SCHEMA, build_frame, build_frames, concat_frames
+import json_stream
+import http_cache
+import storage
+import insider_analytics
+import company_index
 
-# Logging setup
-log_file_path = os.path.join(output_directory, "log.txt")
-logging.basicConfig(filename=log_file_path, format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger()
 
-# UserAgent setup
-ua = UserAgent()
+INSIDER_PAGE = f"{BASE_URL}/companies-listing/corporate-filings-insider-trading"
 
-def get_headers(user_agent, referer_url):
-    return {
-        "User-Agent": user_agent,
-        "Accept": "application/json, text/plain, */*",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Referer": referer_url,
-    }
+# File paths
+state_file_path = os.path.join(DATA_DIR, "insider_state.json")
 
-def warm_up_session(session, user_agent):
-    try:
-        session.get("https://www.nseindia.com", headers=get_headers(user_agent, "https://www.nseindia.com"), timeout=10)
-        time.sleep(1)
-        session.get("https://www.nseindia.com/companies-listing/corporate-filings-insider-trading",
-                    headers=get_headers(user_agent, "https://www.nseindia.com"), timeout=10)
-        time.sleep(1)
-    except Exception as e:
-        logger.warning(f"Session warm-up failed: {str(e)}")
-        print(f"Session warm-up failed: {str(e)}")
+# Window used when there is no high-water mark yet (first run or --full)
+DEFAULT_WINDOW_DAYS = 120
+# Filings can be revised or broadcast late, so incremental runs re-read a little history
+OVERLAP_DAYS = 2
 
-def get_data(session, user_agent):
-    start_date = (datetime.now().date() - timedelta(days=120)).strftime("%d-%m-%Y")
-    end_date = datetime.now().date().strftime("%d-%m-%Y")
+def get_data(client, start_date, end_date, batch_size=None, cached=False):
+    """Filings for one date range as (typed DataFrame, cached response), or None when the request failed.
 
-    url = f"https://www.nseindia.com/api/corporates-pit?index=equities&from_date={start_date}&to_date={end_date}"
-    headers = get_headers(user_agent, "https://www.nseindia.com/companies-listing/corporate-filings-insider-trading")
+    With batch_size the `data` array is decoded from the streamed response
+    and built into frames of batch_size rows, so the whole payload never
+    exists as Python dicts. With cached the request goes through http_cache,
+    and a range whose response is unchanged since it was last stored comes
+    back as an empty frame.
+    """
+    url = (f"{BASE_URL}/api/corporates-pit?index=equities"
+           f"&from_date={start_date:%d-%m-%Y}&to_date={end_date:%d-%m-%Y}")
+    # The nightly window ends today, so to_date changes every run. It starts at the
+    # high-water mark, though, so keyed on its start the entry is compared against
+    # until new filings move the mark.
+    cache_url = f"{BASE_URL}/api/corporates-pit?index=equities&from_date={start_date:%d-%m-%Y}"
 
     try:
-        response = session.get(url, headers=headers, timeout=15)
+        if cached:
+            response = client.get_cached(url, referer=INSIDER_PAGE, timeout=15, cache_url=cache_url)
+        else:
+            response = client.get(url, referer=INSIDER_PAGE, timeout=15, stream=batch_size is not None)
         response.raise_for_status()
-        logger.info("Data fetched successfully from NSE Insider API")
-        return response.json()
+        if cached and response.not_modified:
+            response.close()
+            frame = build_frame([], INSIDER_SCHEMA)
+        elif batch_size is not None:
+            frame = concat_frames(build_frames(json_stream.iter_records(response), INSIDER_SCHEMA, batch_size),
+                                  INSIDER_SCHEMA)
+            if cached and response.unchanged:
+                frame = frame.iloc[0:0]
+        else:
+            data = response.json()
+            if not isinstance(data, dict):
+                raise ValueError("unexpected JSON structure")
+            frame = build_frame(data.get("data", []), INSIDER_SCHEMA)
+        logger.info(f"Data fetched successfully from NSE Insider API for {start_date} to {end_date}")
+        return frame, response if cached else None
     except Exception as e:
-        logger.error(f"API request failed: {str(e)}")
-        print(f"API request failed: {str(e)}")
+        logger.error(f"API request failed for {start_date} to {end_date}: {str(e)}")
+        print(f"API request failed for {start_date} to {end_date}: {str(e)}")
         return None
 
-# File path
-insider_file_path = os.path.join(output_directory, "insider.csv")
-
-# Initialize session
-session = requests.Session()
-user_agent = ua.random
-warm_up_session(session, user_agent)
-
-# Fetch new data
-data = get_data(session, user_agent)
-
-# Define columns
-columns = [
-    'symbol', 'company', 'anex', 'acqName', 'date', 'pid', 'buyValue',
-    'sellValue', 'buyQuantity', 'sellquantity', 'secType', 'secAcq',
-    'tdpTransactionType', 'xbrl', 'personCategory', 'befAcqSharesNo',
-    'befAcqSharesPer', 'secVal', 'securitiesTypePost', 'afterAcqSharesNo',
-    'afterAcqSharesPer', 'acqfromDt', 'acqtoDt', 'intimDt', 'acqMode',
-    'derivativeType', 'exchange', 'remarks'
-]
-
-if data and isinstance(data, dict):
-    day_df = pd.DataFrame(columns=columns)
-    for trade in data.get("data", []):
-        row = [trade.get(col) for col in columns]
-        if len(row) == len(columns):
-            day_df.loc[len(day_df)] = row
-        else:
-            logger.warning(f"Skipped row due to mismatched length: {row}")
-
-    # Write fresh data (overwrite the old file completely)
-    day_df.to_csv(insider_file_path, index=False)
-    print(f"✅ insider.csv created/replaced successfully with {len(day_df)} rows.")
-    logger.info(f"insider.csv replaced successfully with {len(day_df)} rows.")
-else:
-    print("❌ No new data fetched or API failed.")
-    logger.error("No data fetched or JSON structure invalid.")
+def split_range(start_date, end_date, chunk_days):
+    """Split [start_date, end_date] into consecutive inclusive chunks of at most chunk_days."""
+    chunks = []
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + timedelta(days=1)
+    return chunks
+
+def fetch_range(client, start_date, end_date, chunk_days, workers, batch_size=None, cached=False):
+    """Fetch a date range as concurrent chunks.
+
+    Returns (typed frame, all_chunks_succeeded, cached responses to commit
+    once the frame is stored).
+    """
+    chunks = split_range(start_date, end_date, chunk_days)
+
+    def fetch_chunk(chunk):
+        return get_data(client, *chunk, batch_size=batch_size, cached=cached)
+
+    print(f"Fetching {start_date} to {end_date} in {len(chunks)} chunk(s)")
+    logger.info(f"Fetching {start_date} to {end_date} in {len(chunks)} chunk(s)")
+    frames = []
+    responses = []
+    complete = True
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(fetch_chunk, chunks):
+            if result is None:
+                complete = False
+                continue
+            chunk_df, response = result
+            frames.append(chunk_df)
+            if response is not None:
+                responses.append(response)
+    return concat_frames(frames, INSIDER_SCHEMA), complete, responses
+
+def load_state():
+    try:
+        with open(state_file_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_state(insider_df):
+    if pd.isna(insider_df['intimDt'].max()):
+        return
+    state = {
+        'last_pid': int(insider_df['pid'].max()),
+        'last_intim_date': insider_df['intimDt'].max().strftime('%Y-%m-%d'),
+        'updated_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    with open(state_file_path, "w") as f:
+        json.dump(state, f)
+
+def merge_by_pid(existing_df, new_df):
+    """Upsert new filings into the store; a re-fetched pid replaces all of its stored rows.
+
+    One disclosure (pid) can report several transactions, one row each, so
+    rows are replaced per pid rather than deduplicated on it.
+    """
+    kept_df = existing_df[~existing_df['pid'].isin(new_df['pid'].dropna())]
+    # Categories differ between the stored and fetched frames, so the categoricals are rebuilt
+    combined_df = concat_frames([kept_df, new_df], INSIDER_SCHEMA)
+    return combined_df.sort_values('pid', ascending=False, kind='stable', ignore_index=True)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Incrementally fetch NSE insider trading disclosures into insider.csv")
+    parser.add_argument('--full', action='store_true',
+                        help=f"ignore the high-water mark and refetch the last {DEFAULT_WINDOW_DAYS} days")
+    parser.add_argument('--from-date', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help="backfill start date (YYYY-MM-DD)")
+    parser.add_argument('--to-date', type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+                        help="backfill end date (YYYY-MM-DD), defaults to today")
+    parser.add_argument('--chunk-days', type=int, default=30, help="days per corporates-pit request")
+    parser.add_argument('--workers', type=int, default=3, help="chunks fetched concurrently")
+    parser.add_argument('--rps', type=float, default=1.0, help="ceiling for the adaptive requests-per-second rate")
+    parser.add_argument('--batch-size', type=int, default=5000, help="records decoded per frame batch when streaming")
+    parser.add_argument('--no-stream', action='store_true', help="decode each response with response.json() instead")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    configure_logging()
+    today = datetime.now().date()
+    end_date = args.to_date or today
+
+    state = {} if args.full else load_state()
+    if args.from_date:
+        start_date = args.from_date
+    elif state.get('last_intim_date') and storage.dataset_exists('insider'):
+        last_date = datetime.strptime(state['last_intim_date'], '%Y-%m-%d').date()
+        start_date = last_date - timedelta(days=OVERLAP_DAYS)
+        print(f"Resuming after pid {state['last_pid']} (intimated {last_date})")
+    else:
+        start_date = today - timedelta(days=DEFAULT_WINDOW_DAYS)
+
+    # Initialize session (reuses the warmed cookie jar from earlier scripts when still valid)
+    limit_rate(args.rps)
+    client = NseClient(landing_page=INSIDER_PAGE, pool_size=args.workers)
+    # Conditional requests only pay off when the stored dataset already holds the unchanged ranges
+    cached = not args.full and not args.no_stream and storage.dataset_exists('insider')
+    new_df, complete, responses = fetch_range(client, start_date, end_date, args.chunk_days, args.workers,
+                                              batch_size=None if args.no_stream else args.batch_size,
+                                              cached=cached)
+    client.close()
+
+    if new_df.empty and not complete:
+        for response in responses:
+            response.discard()
+        print("❌ No new data fetched or API failed.")
+        logger.error("No data fetched or JSON structure invalid.")
+        return
+
+    if cached and new_df.empty:
+        for response in responses:
+            response.commit()
+        http_cache.prune()
+        print("✅ insider.csv unchanged: no new filings since the last run.")
+        logger.info("insider.csv unchanged: no new filings since the last run.")
+        return
+
+    if storage.dataset_exists('insider') and not args.full:
+        existing_df = storage.read_dataset('insider')
+        insider_df = merge_by_pid(existing_df, new_df)
+        added = len(insider_df) - len(existing_df)
+    else:
+        insider_df = merge_by_pid(new_df.iloc[0:0], new_df)
+        added = len(insider_df)
+
+    storage.write_dataset(insider_df, 'insider')
+    print(f"✅ insider.csv updated: {len(new_df)} filings fetched, {added} new, {len(insider_df)} total rows.")
+    logger.info(f"insider.csv updated: {len(new_df)} filings fetched, {added} new, {len(insider_df)} total rows.")
+
+    # Keep the per-symbol activity aggregates in step; only the fetched pids are reprocessed
+    if args.full:
+        insider_analytics.rebuild(insider_df)
+    else:
+        insider_analytics.update(new_df)
+    company_index.refresh(new_df)
+    for response in responses:
+        response.commit()
+    http_cache.prune()
+
+    # Only advance the high-water mark when every chunk came back, so a failed range is retried
+    if complete and not insider_df.empty:
+        save_state(insider_df)
+    elif not complete:
+        logger.warning("Some date chunks failed; high-water mark not advanced.")
+        print("Some date chunks failed; high-water mark not advanced.")
+
+if __name__ == "__main__":
+    main()
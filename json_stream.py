@@ -0,0 +1,132 @@
+import json
+import codecs
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Incremental decoding of the record arrays in large NSE JSON responses.
+#
+# corporates-pit and corporate-pledgedata return {"...": ..., "data": [...]}.
+# Instead of response.json() materialising the whole payload, iter_records()
+# reads the streamed body and yields the records of one top-level array one
+# at a time, so callers can build typed frames in fixed-size batches while
+# the rest of the body is still on the wire. ijson is used when installed;
+# otherwise a small raw_decode based reader walks the top-level object.
+
+READ_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+
+class _Reader:
+    """Text buffer over an iterator of byte chunks, refilled on demand."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.buffer = self.buffer[self.pos:] + self.decoder.decode(b'', final=True)
+        else:
+            self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character without consuming it ('' at end of input)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError(f"expected one of {chars!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self, decoder=json.JSONDecoder()):
+        """Decode the next complete JSON value, reading more input until it is whole."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                # A number that runs to the end of the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+class _ChunkFile:
+    """Minimal file object over byte chunks for ijson."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+
+    def read(self, size=-1):
+        # ijson probes the source with read(0) to tell bytes from text; that must not consume a chunk
+        if size == 0:
+            return b''
+        # An empty read means end of input to ijson, so empty chunks are skipped
+        for chunk in self.chunks:
+            if chunk:
+                return chunk
+        return b''
+
+def _iter_array(reader):
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.expect(',]') == ']':
+            return
+
+def iter_array_items(chunks, key='data'):
+    """Yield the items of the top-level array `key` from an iterator of byte chunks.
+
+    Other top-level values are decoded and discarded; a missing key yields nothing.
+    """
+    if ijson is not None:
+        yield from ijson.items(_ChunkFile(chunks), f'{key}.item', use_float=True)
+        return
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        name = reader.value()
+        reader.expect(':')
+        if name == key and reader.peek() == '[':
+            yield from _iter_array(reader)
+            return
+        reader.value()
+        if reader.expect(',}') == '}':
+            return
+
+def iter_records(response, key='data', read_size=READ_SIZE):
+    """Yield the records of a streamed requests response (requested with stream=True)."""
+    chunks = response.iter_content(read_size)
+    try:
+        yield from iter_array_items(chunks, key)
+        # Read the rest of the body too, so a caching response sees all of it
+        for _ in chunks:
+            pass
+    finally:
+        response.close()
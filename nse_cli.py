@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+
+# Single entry point for the collectors:
+#   python3 nse_cli.py [--data-dir DIR] <command> [command options]
+# e.g. `nse_cli.py insider --from-date 2024-01-01` or `nse_cli.py run-all --in-process`.
+#
+# Only the standard library is imported here; a command's module (and with it
+# pandas, requests, ...) is imported when that command runs, so `--help` and
+# the lighter commands start quickly. --data-dir sets NSE_DATA_DIR before the
+# import, since the modules read their paths from the environment when loaded.
+# Every script still runs on its own as before.
+
+# command -> (module, description)
+COMMANDS = {
+    "symbols": ("Symbols", "write Symbols.csv from the newest bhavcopy"),
+    "quote": ("quote_data", "classification and market cap in one quote-equity pass"),
+    "stkdata": ("StkData", "industry classification for every symbol"),
+    "mktcap": ("Updated_Mktcap", "market cap for every symbol"),
+    "insider": ("insider_trading_data", "incremental insider trading disclosures"),
+    "pledge": ("promoter_pledge", "today's promoter pledge snapshot"),
+    "xbrl": ("xbrl_enrich", "download and parse the XBRL of insider filings"),
+    "run-all": ("auto_run", "the nightly run of every collector"),
+}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="nse_cli.py", description="NSE insider trading collectors",
+        epilog="Run `nse_cli.py <command> --help` for the options of a command.")
+    parser.add_argument('--data-dir', help="output directory (sets NSE_DATA_DIR)")
+    parser.add_argument('--timing', action='store_true', help="print how long the command took to import and run")
+    parser.add_argument('command', choices=list(COMMANDS), metavar='command',
+                        help="; ".join(f"{name}: {description}" for name, (_, description) in COMMANDS.items()))
+    parser.add_argument('args', nargs=argparse.REMAINDER, help="options passed to the command")
+    return parser.parse_args(argv)
+
+def run(command, args, timing=False):
+    module_name = COMMANDS[command][0]
+    # The command's own parse_args() reads sys.argv
+    sys.argv = [f"nse_cli.py {command}"] + list(args)
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    imported = time.perf_counter()
+    try:
+        module.main()
+    finally:
+        if timing:
+            print(f"[{command}] import {imported - start:.3f}s, run {time.perf_counter() - imported:.3f}s",
+                  file=sys.stderr)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.data_dir:
+        os.environ["NSE_DATA_DIR"] = os.path.abspath(args.data_dir)
+        os.makedirs(os.environ["NSE_DATA_DIR"], exist_ok=True)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    run(args.command, args.args, args.timing)
+
+if __name__ == "__main__":
+    main()
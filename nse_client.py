@@ -0,0 +1,282 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from nse_config import DATA_DIR, BASE_URL
+import nse_metrics
+import http_cache
+import rate_limiter
+
+# Shared NSE HTTP client used by every collector.
+#
+# One pooled keep-alive session is warmed once (homepage + a landing page) and
+# its cookies are written to disk together with their expiry, so later scripts
+# in the same auto_run.py run start from the warmed jar. The session is only
+# re-warmed when the cookies expire or a call comes back 401/403. Requests are
+# paced by the adaptive limiter, and throttled ones are retried after it backs
+# off.
+
+COOKIE_FILE = os.path.join(DATA_DIR, "nse_cookies.json")
+
+# NSE cookies without an explicit expiry are treated as valid for this long
+COOKIE_MAX_AGE = 30 * 60
+
+def configure_logging(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO):
+    """Log to DATA_DIR/log.txt; scripts call this from main() so importing them touches no files."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    logging.basicConfig(filename=os.path.join(DATA_DIR, 'log.txt'), format=format, level=level)
+
+def log_and_print(message, level="info"):
+    if level.lower() == "error":
+        logging.error(message)
+    elif level.lower() == "warning":
+        logging.warning(message)
+    else:
+        logging.info(message)
+    print(message)
+
+# Process-wide adaptive limiter applied to every NseClient request. auto_run.py
+# caps it through NSE_MAX_RPS for subprocess steps, or installs one shared
+# across its in-process worker pool; scripts can lower the ceiling further.
+_global_limiter = None
+
+def set_global_limiter(limiter):
+    global _global_limiter
+    _global_limiter = limiter
+
+def global_limiter():
+    global _global_limiter
+    if _global_limiter is None:
+        _global_limiter = rate_limiter.AdaptiveRateLimiter(
+            max_rps=float(os.environ.get('NSE_MAX_RPS', rate_limiter.DEFAULT_MAX_RPS)))
+    return _global_limiter
+
+def limit_rate(max_rps):
+    """Cap the request rate of this process at max_rps."""
+    global_limiter().cap(max_rps)
+
+# Recent desktop browser User-Agents; one is picked per cookie jar instead of
+# loading fake_useragent's database at startup. NSE_USER_AGENT pins one.
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36 Edg/130.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:131.0) Gecko/20100101 Firefox/131.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.0 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14.7; rv:131.0) Gecko/20100101 Firefox/131.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
+]
+
+def pick_user_agent():
+    return os.environ.get("NSE_USER_AGENT") or random.choice(USER_AGENTS)
+
+# Throttled requests are retried this many times after backing off
+MAX_RETRIES = 4
+
+class NseClient:
+    """Pooled, cookie-persisting session for www.nseindia.com and nsearchives."""
+
+    def __init__(self, landing_page=None, cookie_file=COOKIE_FILE, pool_size=16, user_agent=None, proxy=None):
+        self.landing_page = landing_page
+        self.cookie_file = cookie_file
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Optional egress through a proxy (e.g. one per shard in shard_crawl.py)
+        if proxy:
+            self.session.proxies.update({"http": proxy, "https": proxy})
+        self.lock = threading.Lock()
+        self.expires_at = 0.0
+        self.generation = 0
+
+        if not self.load_cookies():
+            self.user_agent = user_agent or pick_user_agent()
+
+        self.session.headers.update({
+            'User-Agent': self.user_agent,
+            'Accept': 'application/json, text/plain, */*',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Connection': 'keep-alive',
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def load_cookies(self):
+        # Cookies are tied to the User-Agent that earned them, so both are restored together
+        try:
+            with open(self.cookie_file) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+
+        if state.get('expires_at', 0) <= time.time():
+            return False
+
+        for cookie in state.get('cookies', []):
+            self.session.cookies.set(
+                cookie['name'], cookie['value'],
+                domain=cookie.get('domain', ''), path=cookie.get('path', '/'),
+                expires=cookie.get('expires'), secure=cookie.get('secure', False),
+            )
+        self.user_agent = state['user_agent']
+        self.expires_at = state['expires_at']
+        logging.info(f"Reusing NSE cookies from {self.cookie_file}")
+        return True
+
+    def save_cookies(self):
+        now = time.time()
+        cookies = []
+        expires_at = now + COOKIE_MAX_AGE
+        for cookie in self.session.cookies:
+            cookies.append({
+                'name': cookie.name,
+                'value': cookie.value,
+                'domain': cookie.domain,
+                'path': cookie.path,
+                'expires': cookie.expires,
+                'secure': cookie.secure,
+            })
+            if cookie.expires:
+                expires_at = min(expires_at, cookie.expires)
+
+        self.expires_at = expires_at
+        os.makedirs(os.path.dirname(self.cookie_file), exist_ok=True)
+        # Per-process temp name: parallel auto_run.py steps save the same jar
+        tmp_file = f"{self.cookie_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({'user_agent': self.user_agent, 'expires_at': expires_at, 'cookies': cookies}, f)
+        os.replace(tmp_file, self.cookie_file)
+
+    def warm_up(self, force=False, seen_generation=None):
+        """Visit the homepage and landing page once; no-op while the cookie jar is still valid."""
+        with self.lock:
+            # Another thread already re-warmed since the caller's request was sent
+            if seen_generation is not None and seen_generation != self.generation:
+                return True
+            if not force and self.expires_at > time.time():
+                return True
+
+            try:
+                log_and_print("Visiting NSE homepage to establish cookies")
+                resp = self.send(BASE_URL, {}, 10)
+                if resp.status_code != 200:
+                    log_and_print(f"Failed to load NSE homepage, status: {resp.status_code}", level="error")
+                    return False
+
+                if self.landing_page:
+                    resp = self.send(self.landing_page, {'Referer': BASE_URL}, 10)
+                    if resp.status_code != 200:
+                        log_and_print(f"Failed to load {self.landing_page}, status: {resp.status_code}", level="error")
+                        return False
+
+                self.save_cookies()
+                self.generation += 1
+                return True
+            except Exception as e:
+                log_and_print(f"Exception during session warm-up: {e}", level="error")
+                return False
+
+    def get(self, url, referer=None, timeout=10, **kwargs):
+        """GET through the warmed session.
+
+        A 401/403 first triggers one re-warm. 429s, and 403s that persist
+        after the re-warm, slow the limiter down and are retried after its
+        backoff (honouring Retry-After). Only 2xx/304 responses let the
+        limiter speed up.
+        """
+        self.warm_up()
+        headers = kwargs.pop('headers', {})
+        if referer:
+            headers['Referer'] = referer
+
+        limiter = global_limiter()
+        rewarmed = False
+        attempt = 0
+        while True:
+            generation = self.generation
+            response = self.send(url, headers, timeout, retry=attempt > 0, **kwargs)
+            status = response.status_code
+
+            if status in (401, 403) and not rewarmed:
+                log_and_print(f"NSE returned {status} for {url}, re-warming session", level="warning")
+                rewarmed = True
+                if self.warm_up(force=True, seen_generation=generation):
+                    attempt += 1
+                    continue
+
+            if status in (429, 403):
+                limiter.on_throttle(rate_limiter.parse_retry_after(response.headers.get('Retry-After')))
+                if attempt < MAX_RETRIES:
+                    attempt += 1
+                    log_and_print(f"Throttled by NSE ({status}) for {url}, retry {attempt} at "
+                                  f"{limiter.rate:.2f} requests/second", level="warning")
+                    continue
+            elif 200 <= status < 300 or status == 304:
+                limiter.on_success()
+            return response
+
+    def send(self, url, headers, timeout, retry=False, **kwargs):
+        """Single instrumented request under the process-wide budget."""
+        global_limiter().wait()
+        start = time.monotonic()
+        try:
+            response = self.session.get(url, headers=headers, timeout=timeout, **kwargs)
+        except Exception:
+            nse_metrics.record_request(url, time.monotonic() - start, retry=retry)
+            raise
+        # Streamed bodies are not read here, so fall back to the declared length
+        if kwargs.get('stream'):
+            size = int(response.headers.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        nse_metrics.record_request(url, time.monotonic() - start, response.status_code, size, retry=retry)
+        return response
+
+    def get_cached(self, url, referer=None, timeout=10, cache_url=None, **kwargs):
+        """Conditional, streamed GET through the on-disk http_cache.
+
+        Returns an http_cache.CachedResponse; after a 304 its not_modified is
+        set and the body is served from the cache. Call commit() once the body
+        has been processed so the next run can send the validators. The entry
+        is stored under cache_url when given, for URLs with a part that
+        changes every run without changing the answer.
+        """
+        cache_url = cache_url or url
+        entry = http_cache.load_entry(cache_url)
+        headers = dict(kwargs.pop('headers', {}))
+        headers.update(http_cache.conditional_headers(entry))
+        response = self.get(url, referer=referer, timeout=timeout, headers=headers, stream=True, **kwargs)
+        return http_cache.CachedResponse(cache_url, response, entry)
+
+    def get_json(self, url, referer=None, timeout=10, **kwargs):
+        """Return the decoded JSON body, or None for non-200 / non-JSON responses."""
+        response = self.get(url, referer=referer, timeout=timeout, **kwargs)
+        if response.status_code == 429:
+            log_and_print(f"Rate limited by NSE for {url}", level="error")
+            return None
+        if response.status_code != 200:
+            log_and_print(f"API call failed for {url}, Status: {response.status_code}", level="error")
+            return None
+        content_type = response.headers.get('Content-Type', '')
+        if 'application/json' not in content_type:
+            log_and_print(f"API response for {url} is not JSON. Content-Type: {content_type}", level="error")
+            log_and_print(f"Response content (truncated): {response.text[:500]}", level="error")
+            return None
+        return response.json()
+
+def quote_referer(symbol):
+    return f"{BASE_URL}/get-quotes/equity?symbol={symbol}"
@@ -0,0 +1,13 @@
+import os
+
+# Locations shared by every module, read from the environment once at import.
+#
+# NSE_DATA_DIR is the output directory of every collector (default
+# ~/NseInsiderTrading). NSE_BASE_URL / NSE_ARCHIVES_URL point the collectors
+# at another server, e.g. fake_nse_server.py in benchmarks. Nothing else is
+# imported here, so any module can import it without an import cycle, and
+# nothing is created on disk.
+
+DATA_DIR = os.environ.get("NSE_DATA_DIR", os.path.join(os.path.expanduser("~"), "NseInsiderTrading"))
+BASE_URL = os.environ.get("NSE_BASE_URL", "https://www.nseindia.com")
+ARCHIVES_URL = os.environ.get("NSE_ARCHIVES_URL", "https://nsearchives.nseindia.com")
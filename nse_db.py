@@ -0,0 +1,232 @@
+import os
+import sqlite3
+import pandas as pd
+from nse_config import DATA_DIR
+
+# Local SQLite store joining symbols, industry, market cap, insider and pledge
+# data.
+#
+# Collectors write into it through storage.py (the "sqlite" format); each
+# table gets indexes on the keys the common joins and lookups use, so the
+# query helpers below are indexed point/range queries instead of full scans
+# of the CSV files.
+
+DB_FILE = os.path.join(DATA_DIR, "nse.db")
+
+TABLES = {
+    'Symbols': 'symbols',
+    'stkdata': 'stkdata',
+    'mktcap': 'mktcap',
+    'insider': 'insider',
+    'pledge': 'pledge',
+    'pledge_changes': 'pledge_changes',
+    'insider_xbrl': 'insider_xbrl',
+}
+
+INDEXES = {
+    'symbols': [('SYMBOL',)],
+    'stkdata': [('symbol',), ('sector',)],
+    'mktcap': [('symbol',), ('market_cap',)],
+    'insider': [('symbol', 'intimDt'), ('pid',), ('intimDt',), ('company COLLATE NOCASE',)],
+    'pledge': [('company_name COLLATE NOCASE', 'snapshot_date')],
+    'pledge_changes': [('snapshot_date',), ('symbol', 'snapshot_date')],
+    'insider_xbrl': [('pid',)],
+}
+
+def connect(db_file=DB_FILE):
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def table_name(dataset):
+    return TABLES.get(dataset, dataset.lower())
+
+def table_exists(conn, table):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    return row is not None
+
+def create_indexes(conn, table):
+    for columns in INDEXES.get(table, []):
+        index_name = "idx_{}_{}".format(table, "_".join(c.split()[0] for c in columns))
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})")
+
+def to_sql_frame(df):
+    # SQLite has no categorical/datetime types: store categories as text and dates as ISO text
+    out = df.copy()
+    for column in out.columns:
+        if isinstance(out[column].dtype, pd.CategoricalDtype):
+            out[column] = out[column].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(out[column]):
+            out[column] = out[column].dt.strftime('%Y-%m-%d')
+    return out
+
+def write_table(df, dataset, db_file=DB_FILE):
+    """Replace the table for dataset with df and (re)create its indexes."""
+    table = table_name(dataset)
+    with connect(db_file) as conn:
+        to_sql_frame(df).to_sql(table, conn, if_exists='replace', index=False)
+        create_indexes(conn, table)
+    conn.close()
+
+def append_table(df, dataset, db_file=DB_FILE):
+    table = table_name(dataset)
+    with connect(db_file) as conn:
+        to_sql_frame(df).to_sql(table, conn, if_exists='append', index=False)
+        create_indexes(conn, table)
+    conn.close()
+
+def has_table(dataset, db_file=DB_FILE):
+    if not os.path.exists(db_file):
+        return False
+    conn = connect(db_file)
+    try:
+        return table_exists(conn, table_name(dataset))
+    finally:
+        conn.close()
+
+SQL_OPERATORS = {'=': '=', '==': '=', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+def read_table(dataset, columns=None, filters=None, db_file=DB_FILE):
+    """SELECT a dataset with column projection and (column, op, value) filters as a WHERE clause."""
+    select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+    clauses = []
+    params = []
+    for column, op, value in filters or []:
+        if op in ('in', 'not in'):
+            values = list(value)
+            placeholders = ", ".join("?" for _ in values)
+            clauses.append(f'"{column}" {op.upper()} ({placeholders})')
+            params.extend(values)
+        elif op in SQL_OPERATORS:
+            clauses.append(f'"{column}" {SQL_OPERATORS[op]} ?')
+            params.append(value.strftime('%Y-%m-%d') if hasattr(value, 'strftime') else value)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+
+    query = f"SELECT {select} FROM {table_name(dataset)}"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    conn = connect(db_file)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+# Query API for the common joins
+
+def insider_trades(symbol=None, start_date=None, end_date=None, person_category=None,
+                   sector=None, min_market_cap=None, max_market_cap=None, db_file=DB_FILE):
+    """Insider filings joined with industry (stkdata) and market cap on symbol.
+
+    Dates are 'YYYY-MM-DD' strings compared against intimDt.
+    """
+    query = """
+        SELECT i.*, s.basic_industry, s.industry, s.macro, s.sector, m.market_cap
+        FROM insider i
+        LEFT JOIN stkdata s ON s.symbol = i.symbol
+        LEFT JOIN mktcap m ON m.symbol = i.symbol
+        WHERE 1 = 1
+    """
+    params = []
+    for clause, value in (
+        ("i.symbol = ?", symbol),
+        ("i.intimDt >= ?", start_date),
+        ("i.intimDt <= ?", end_date),
+        ("i.personCategory = ?", person_category),
+        ("s.sector = ?", sector),
+        ("m.market_cap >= ?", min_market_cap),
+        ("m.market_cap <= ?", max_market_cap),
+    ):
+        if value is not None:
+            query += f" AND {clause}"
+            params.append(value)
+    query += " ORDER BY i.intimDt DESC, i.pid DESC"
+
+    conn = connect(db_file)
+    try:
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+
+def pledge_history(company_name, db_file=DB_FILE):
+    """Every stored pledge snapshot row for a company, oldest first."""
+    conn = connect(db_file)
+    try:
+        return pd.read_sql_query(
+            "SELECT * FROM pledge WHERE company_name = ? COLLATE NOCASE ORDER BY snapshot_date",
+            conn, params=[company_name])
+    finally:
+        conn.close()
+
+def latest_pledges(conn, index_file=None):
+    """Latest and previous promoter_shares_encumbered_pct per symbol from the pledge table.
+
+    Companies are keyed like pledge_diff.py: by company_index's normalised
+    name, so "Foo Ltd." and "FOO LIMITED" are one company, and mapped to a
+    symbol through company_symbols.csv.
+    """
+    # Imported here: company_index imports storage, which imports this module
+    import company_index
+    pledge = pd.read_sql_query(
+        "SELECT company_name, promoter_shares_encumbered_pct, snapshot_date FROM pledge ORDER BY rowid", conn)
+    pledge['name_key'] = company_index.normalize_names(pledge['company_name']).values
+    pledge = pledge[pledge['name_key'] != ''].sort_values('snapshot_date', kind='stable', na_position='first')
+    latest = pledge.groupby('name_key').nth(-1).set_index('name_key')
+    previous = pledge.groupby('name_key').nth(-2).set_index('name_key')
+    latest = pd.DataFrame({
+        'symbol': company_index.lookup(latest['company_name'], index_file or company_index.INDEX_FILE).values,
+        'pledge_pct': latest['promoter_shares_encumbered_pct'],
+        'previous_pledge_pct': previous['promoter_shares_encumbered_pct'].reindex(latest.index),
+        'pledge_date': latest['snapshot_date'],
+    })
+    # Names that map to the same symbol (e.g. before and after a rename): the newest snapshot wins
+    latest = latest[latest['symbol'].notna()].sort_values('pledge_date', kind='stable', na_position='first')
+    return latest.drop_duplicates('symbol', keep='last').reset_index(drop=True)
+
+def insider_trades_with_pledge(start_date=None, person_category=None, sector=None,
+                               min_market_cap=None, max_market_cap=None, rising_pledge_only=False,
+                               db_file=DB_FILE, index_file=None):
+    """Insider filings joined with industry, market cap and the company's latest pledge figures.
+
+    Pledge figures are matched on symbol (see latest_pledges). With
+    rising_pledge_only, keep companies whose latest
+    promoter_shares_encumbered_pct is higher than in the previous stored
+    snapshot.
+    """
+    query = """
+        SELECT i.*, s.sector, s.industry, m.market_cap,
+               pl.pledge_pct, pl.previous_pledge_pct, pl.pledge_date
+        FROM insider i
+        LEFT JOIN stkdata s ON s.symbol = i.symbol
+        LEFT JOIN mktcap m ON m.symbol = i.symbol
+        LEFT JOIN temp.latest_pledge pl ON pl.symbol = i.symbol
+        WHERE 1 = 1
+    """
+    params = []
+    for clause, value in (
+        ("i.intimDt >= ?", start_date),
+        ("i.personCategory = ?", person_category),
+        ("s.sector = ?", sector),
+        ("m.market_cap >= ?", min_market_cap),
+        ("m.market_cap <= ?", max_market_cap),
+    ):
+        if value is not None:
+            query += f" AND {clause}"
+            params.append(value)
+    if rising_pledge_only:
+        query += " AND pl.pledge_pct > COALESCE(pl.previous_pledge_pct, 0)"
+    query += " ORDER BY i.intimDt DESC, i.pid DESC"
+
+    conn = connect(db_file)
+    try:
+        conn.execute("""
+            CREATE TEMP TABLE latest_pledge (
+                symbol TEXT PRIMARY KEY, pledge_pct REAL, previous_pledge_pct REAL, pledge_date TEXT
+            )
+        """)
+        latest = latest_pledges(conn, index_file)
+        latest = latest.astype(object).where(latest.notna(), None)
+        conn.executemany("INSERT INTO temp.latest_pledge VALUES (?, ?, ?, ?)", latest.itertuples(index=False, name=None))
+        return pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
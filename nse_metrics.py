@@ -0,0 +1,172 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+from nse_config import DATA_DIR
+
+# Instrumentation for every NSE request made through nse_client.
+#
+# Requests are grouped by endpoint class. For each class we keep a latency
+# histogram, status-code counts, retries, 429s and response bytes; time spent
+# sleeping (rate limiting, warm-up pauses, fixed pacing) is tracked
+# separately. At process exit one JSON line per script is appended to
+# nse_metrics.jsonl, and auto_run.py folds the lines of a run into
+# nse_metrics_report.json, so network time and self-imposed sleep can be
+# told apart.
+
+METRICS_FILE = os.path.join(DATA_DIR, "nse_metrics.jsonl")
+REPORT_FILE = os.path.join(DATA_DIR, "nse_metrics_report.json")
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0]
+
+_lock = threading.Lock()
+_endpoints = {}
+_sleeps = {}
+_started = time.time()
+
+def endpoint_class(url):
+    parsed = urlparse(url)
+    path = parsed.path
+    if "sec_bhavdata_full" in path:
+        return "bhavcopy"
+    if parsed.netloc.startswith("nsearchives") or path.startswith("/products/"):
+        return "archives"
+    if path.startswith("/api/quote-equity"):
+        return "quote-equity"
+    if path.startswith("/api/corporates-pit"):
+        return "corporates-pit"
+    if path.startswith("/api/corporate-pledgedata"):
+        return "corporate-pledgedata"
+    if path.startswith("/api/"):
+        return "api-other"
+    if path in ("", "/"):
+        return "homepage"
+    return "landing-page"
+
+def _new_endpoint():
+    return {
+        'requests': 0,
+        'errors': 0,
+        'retries': 0,
+        'rate_limited': 0,
+        'bytes': 0,
+        'latency_total': 0.0,
+        'latency_max': 0.0,
+        'latency_histogram': [0] * (len(LATENCY_BUCKETS) + 1),
+        'status_codes': {},
+    }
+
+def record_request(url, latency, status_code=None, size=0, retry=False):
+    """Record one HTTP request; status_code is None when it raised before a response."""
+    name = endpoint_class(url)
+    with _lock:
+        stats = _endpoints.setdefault(name, _new_endpoint())
+        stats['requests'] += 1
+        stats['latency_total'] += latency
+        stats['latency_max'] = max(stats['latency_max'], latency)
+        stats['latency_histogram'][bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        stats['bytes'] += size
+        if retry:
+            stats['retries'] += 1
+        if status_code is None:
+            stats['errors'] += 1
+        else:
+            key = str(status_code)
+            stats['status_codes'][key] = stats['status_codes'].get(key, 0) + 1
+            if status_code == 429:
+                stats['rate_limited'] += 1
+
+def record_sleep(seconds, reason):
+    if seconds <= 0:
+        return
+    with _lock:
+        entry = _sleeps.setdefault(reason, {'count': 0, 'seconds': 0.0})
+        entry['count'] += 1
+        entry['seconds'] += seconds
+
+def sleep(seconds, reason):
+    """time.sleep that is counted in the report."""
+    record_sleep(seconds, reason)
+    time.sleep(seconds)
+
+def snapshot(label=None):
+    with _lock:
+        endpoints = json.loads(json.dumps(_endpoints))
+        sleeps = json.loads(json.dumps(_sleeps))
+    ended = time.time()
+    return {
+        'script': label or os.path.basename(sys.argv[0]),
+        'pid': os.getpid(),
+        'started': datetime.fromtimestamp(_started).isoformat(timespec='seconds'),
+        'ended': datetime.fromtimestamp(ended).isoformat(timespec='seconds'),
+        'wall_seconds': round(ended - _started, 3),
+        'network_seconds': round(sum(e['latency_total'] for e in endpoints.values()), 3),
+        'sleep_seconds': round(sum(s['seconds'] for s in sleeps.values()), 3),
+        'latency_buckets': LATENCY_BUCKETS,
+        'endpoints': endpoints,
+        'sleeps': sleeps,
+    }
+
+def reset():
+    global _started
+    with _lock:
+        _endpoints.clear()
+        _sleeps.clear()
+        _started = time.time()
+
+def flush(label=None, metrics_file=METRICS_FILE):
+    """Append this process's metrics as one JSON line and start counting afresh."""
+    if not _endpoints and not _sleeps:
+        return
+    record = snapshot(label)
+    try:
+        with open(metrics_file, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        pass
+    reset()
+
+def summarize(since, metrics_file=METRICS_FILE, report_file=REPORT_FILE):
+    """Fold every metrics line written since `since` (a datetime) into one run report."""
+    scripts = []
+    totals = {}
+    try:
+        with open(metrics_file) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if datetime.fromisoformat(record['started']) < since.replace(microsecond=0):
+                    continue
+                scripts.append({key: record[key] for key in ('script', 'wall_seconds', 'network_seconds', 'sleep_seconds')})
+                for name, stats in record['endpoints'].items():
+                    total = totals.setdefault(name, _new_endpoint())
+                    for key in ('requests', 'errors', 'retries', 'rate_limited', 'bytes', 'latency_total'):
+                        total[key] += stats[key]
+                    total['latency_max'] = max(total['latency_max'], stats['latency_max'])
+                    total['latency_histogram'] = [a + b for a, b in zip(total['latency_histogram'], stats['latency_histogram'])]
+                    for code, count in stats['status_codes'].items():
+                        total['status_codes'][code] = total['status_codes'].get(code, 0) + count
+    except FileNotFoundError:
+        return None
+
+    report = {
+        'generated': datetime.now().isoformat(timespec='seconds'),
+        'since': since.isoformat(timespec='seconds'),
+        'latency_buckets': LATENCY_BUCKETS,
+        'scripts': scripts,
+        'network_seconds': round(sum(s['network_seconds'] for s in scripts), 3),
+        'sleep_seconds': round(sum(s['sleep_seconds'] for s in scripts), 3),
+        'endpoints': totals,
+    }
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+atexit.register(flush)
@@ -0,0 +1,127 @@
+import os
+import argparse
+import pandas as pd
+from datetime import datetime
+
+import storage
+from ingest import PLEDGE_CHANGES_SCHEMA
+import company_index
+from pledge_store import VALUE_COLUMNS, ROW_HASH_VERSION, company_keys, row_hashes
+from nse_config import DATA_DIR
+
+# Keyed diff between consecutive pledge snapshots.
+#
+# pledge_latest.csv holds the most recent figures per company (keyed by the
+# normalised name from company_index.py) together with their row hash. Each
+# new snapshot is hashed and compared against the stored hashes in one merge,
+# so the stored figures are never rehashed; only companies
+# that are new, changed or dropped out are emitted, tagged with their symbol,
+# and appended to the pledge_changes dataset. Downstream consumers read the
+# changes instead of scanning and matching the whole pledge history.
+
+LATEST_FILE = os.path.join(DATA_DIR, "pledge_latest.csv")
+LATEST_COLUMNS = ['name_key'] + VALUE_COLUMNS + ['row_hash', 'snapshot_date']
+# First line of pledge_latest.csv; the stored hashes are only trusted below a matching header
+LATEST_HEADER = f"# row hashes v{ROW_HASH_VERSION}"
+FIGURE_COLUMNS = VALUE_COLUMNS[1:]
+CHANGE_COLUMNS = PLEDGE_CHANGES_SCHEMA['columns']
+
+def keyed(df):
+    keyed_df = df[VALUE_COLUMNS].copy()
+    keyed_df['name_key'] = company_keys(keyed_df).values
+    keyed_df['row_hash'] = row_hashes(keyed_df)
+    return keyed_df.drop_duplicates('name_key', keep='last')
+
+def load_latest(snapshot_date, latest_file=LATEST_FILE):
+    """(latest figures, whether latest_file already holds them as they are)."""
+    if os.path.exists(latest_file):
+        with open(latest_file) as f:
+            current = f.readline().rstrip("\n") == LATEST_HEADER
+            if not current:
+                f.seek(0)
+            latest = pd.read_csv(f, dtype={'name_key': str, 'company_name': str, 'row_hash': str,
+                                           'snapshot_date': str})
+        for column in FIGURE_COLUMNS:
+            latest[column] = pd.to_numeric(latest[column], errors='coerce')
+        if not current:
+            # Written before the current row_hashes() and key; rehashed once, then saved with the header
+            latest['name_key'] = company_keys(latest).values
+            latest['row_hash'] = row_hashes(latest)
+            latest = latest.drop_duplicates('name_key', keep='last')
+        return latest, current
+    if storage.dataset_exists('pledge'):
+        # First run: seed from the newest stored row of every company. promoter_pledge.py has
+        # already appended today's snapshot, so leave it out or nothing would differ.
+        history = storage.read_dataset('pledge', columns=VALUE_COLUMNS + ['snapshot_date'])
+        history = history[history['snapshot_date'] != snapshot_date]
+        history = history.sort_values('snapshot_date', kind='stable', na_position='first')
+        latest = keyed(history)
+        latest['snapshot_date'] = history.loc[latest.index, 'snapshot_date'].values
+        return latest[LATEST_COLUMNS], False
+    return pd.DataFrame(columns=LATEST_COLUMNS), False
+
+def save_latest(latest, latest_file=LATEST_FILE):
+    tmp_file = f"{latest_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w", newline="") as f:
+        f.write(LATEST_HEADER + "\n")
+        latest[LATEST_COLUMNS].to_csv(f, index=False)
+    os.replace(tmp_file, latest_file)
+
+def diff_snapshot(day_df, snapshot_date=None, latest_file=LATEST_FILE):
+    """Compare a pledge snapshot with the latest stored figures and record what changed.
+
+    Returns the change rows (change is 'new', 'changed' or 'removed').
+    """
+    snapshot_date = (snapshot_date or datetime.now().date()).strftime('%Y-%m-%d')
+    today = keyed(day_df)
+    today['snapshot_date'] = snapshot_date
+    latest, stored = load_latest(snapshot_date, latest_file)
+
+    merged = today.merge(latest, on='name_key', how='outer', suffixes=('', '_previous'), indicator=True)
+    merged['change'] = None
+    merged.loc[merged['_merge'] == 'left_only', 'change'] = 'new'
+    merged.loc[merged['_merge'] == 'right_only', 'change'] = 'removed'
+    merged.loc[(merged['_merge'] == 'both') & (merged['row_hash'] != merged['row_hash_previous']), 'change'] = 'changed'
+    changed = merged[merged['change'].notna()].copy()
+    if changed.empty:
+        if not stored:
+            save_latest(latest, latest_file)
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+
+    # Removed companies are reported under their last known name
+    changed['company_name'] = changed['company_name'].fillna(changed['company_name_previous'])
+    changed['snapshot_date'] = snapshot_date
+    company_index.refresh()
+    changed['symbol'] = company_index.lookup(changed['company_name']).values
+    for column in FIGURE_COLUMNS:
+        changed[f"previous_{column}"] = changed[f"{column}_previous"]
+    changed['encumbered_pct_change'] = (changed['promoter_shares_encumbered_pct'].fillna(0)
+                                       - changed['previous_promoter_shares_encumbered_pct'].fillna(0))
+    changes = changed[CHANGE_COLUMNS].reset_index(drop=True)
+    storage.append_dataset(changes, 'pledge_changes')
+
+    # Only the changed keys are replaced in the latest-figures state
+    keep = latest[~latest['name_key'].isin(changed['name_key'])]
+    current = today[today['name_key'].isin(changed.loc[changed['change'] != 'removed', 'name_key'])]
+    save_latest(pd.concat([keep, current[LATEST_COLUMNS]], ignore_index=True), latest_file)
+    return changes
+
+def changes_since(start_date, symbol=None):
+    """Stored pledge changes with snapshot_date >= start_date ('YYYY-MM-DD')."""
+    filters = [('snapshot_date', '>=', start_date)]
+    if symbol:
+        filters.append(('symbol', '=', symbol))
+    return storage.read_dataset('pledge_changes', filters=filters)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Show companies whose pledge figures changed")
+    parser.add_argument('--since', default=datetime.now().strftime('%Y-%m-%d'), help="first snapshot date (YYYY-MM-DD)")
+    parser.add_argument('--symbol', help="only this symbol")
+    parser.add_argument('--rebuild-index', action='store_true', help="rebuild the company-name -> symbol index first")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.rebuild_index:
+        print(f"Indexed {company_index.rebuild()} company names")
+    print(changes_since(args.since, args.symbol).to_string(index=False))
@@ -0,0 +1,122 @@
+import os
+import pandas as pd
+from datetime import datetime
+
+from ingest import PLEDGE_SCHEMA, PLEDGE_HISTORY_SCHEMA
+import storage
+import company_index
+from nse_config import DATA_DIR
+
+# Append-only pledge history.
+#
+# pledge.csv holds a company's pledge row whenever its figures differ from the
+# company's previous stored row, tagged with the date of that snapshot, so a
+# company going A -> B -> A records all three. Companies are keyed by
+# company_index.normalize_names(), the key pledge_diff.py uses too, so
+# "Foo Ltd." and "FOO LIMITED" are one company in both. pledge_hashes.idx
+# keeps one "<row hash>\t<name key>" line per company, the hash of its latest
+# stored row, below a format header. A new snapshot is compared against those
+# hashes and only the companies whose figures moved are appended (through
+# storage, so the Parquet copy grows by one part file); the history is never
+# re-read or rewritten, and the index is rewritten in place, so it stays the
+# size of one snapshot however long the history grows.
+
+INDEX_FILE = os.path.join(DATA_DIR, "pledge_hashes.idx")
+# Bumped whenever row_hashes() changes, so files holding older hashes are rebuilt
+ROW_HASH_VERSION = 2
+# First line of the index; an index without it was keyed differently and is rebuilt
+INDEX_HEADER = f"# pledge row hashes v{ROW_HASH_VERSION}: <hash>\t<name key>"
+
+VALUE_COLUMNS = PLEDGE_SCHEMA['columns']
+HISTORY_COLUMNS = PLEDGE_HISTORY_SCHEMA['columns']
+
+def company_keys(df):
+    return company_index.normalize_names(df['company_name'])
+
+def row_hashes(df):
+    """Stable 64-bit hash of each row's pledge values, as 16-char hex strings.
+
+    The figures are hashed as float64 whatever their dtype, so a null in one
+    row (which turns an int64 column into float64) leaves the other rows'
+    hashes alone.
+    """
+    values = pd.DataFrame({'company_name': company_keys(df).values})
+    for column in VALUE_COLUMNS[1:]:
+        values[column] = pd.to_numeric(df[column], errors='coerce').astype('float64').values
+    hashes = pd.util.hash_pandas_object(values, index=False)
+    return [format(h, '016x') for h in hashes]
+
+def migrate_legacy_file(data_dir=DATA_DIR):
+    """Add an empty snapshot_date column to a pledge.csv written before snapshots were dated."""
+    pledge_file = storage.dataset_path('pledge', 'csv', data_dir)
+    if not os.path.exists(pledge_file):
+        return
+    with open(pledge_file) as f:
+        header = f.readline().strip().split(',')
+    if 'snapshot_date' in header:
+        return
+    legacy_df = pd.read_csv(pledge_file, dtype=str, low_memory=False)
+    legacy_df['snapshot_date'] = None
+    legacy_df.to_csv(pledge_file, index=False)
+
+def save_index(latest, index_file=INDEX_FILE):
+    """Atomically write {company: hash of its latest stored row} as the index."""
+    tmp_file = f"{index_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as f:
+        f.write(INDEX_HEADER + "\n")
+        f.writelines(f"{h}\t{name}\n" for name, h in latest.items())
+    os.replace(tmp_file, index_file)
+
+def rebuild_index(data_dir=DATA_DIR, index_file=INDEX_FILE):
+    """Recreate the index from each company's newest stored row; only needed once or after the index is lost."""
+    history_df = storage.read_dataset('pledge', columns=HISTORY_COLUMNS, data_dir=data_dir)
+    history_df = history_df.sort_values('snapshot_date', kind='stable', na_position='first')
+    latest = dict(zip(company_keys(history_df), row_hashes(history_df)))
+    save_index(latest, index_file)
+    return latest
+
+def load_index(data_dir=DATA_DIR, index_file=INDEX_FILE):
+    """{company: hash of its latest stored row}."""
+    migrate_legacy_file(data_dir)
+    if os.path.exists(index_file):
+        latest = {}
+        lines = 0
+        with open(index_file) as f:
+            # Older indexes (hash sets, stripped-name keys) hold hashes that no longer match
+            current = f.readline().rstrip("\n") == INDEX_HEADER
+            if current:
+                for line in f:
+                    line = line.rstrip("\n")
+                    if line:
+                        h, name = line.split("\t", 1)
+                        latest[name] = h
+                        lines += 1
+        if current:
+            # Indexes written before compaction hold a line per stored row; the last one per company wins
+            if lines > len(latest):
+                save_index(latest, index_file)
+            return latest
+    if storage.dataset_exists('pledge', data_dir):
+        return rebuild_index(data_dir, index_file)
+    return {}
+
+def append_snapshot(day_df, snapshot_date=None, data_dir=DATA_DIR, index_file=INDEX_FILE):
+    """Append the rows of day_df whose figures differ from their company's latest stored row; returns them."""
+    latest = load_index(data_dir, index_file)
+    names = company_keys(day_df).tolist()
+    hashes = row_hashes(day_df)
+
+    # Dedupe within today's batch as well as against the history
+    keep = []
+    for name, h in zip(names, hashes):
+        keep.append(latest.get(name) != h)
+        latest[name] = h
+    new_df = day_df.loc[keep, VALUE_COLUMNS].copy()
+    new_df['snapshot_date'] = (snapshot_date or datetime.now().date()).strftime('%Y-%m-%d')
+
+    if new_df.empty:
+        return new_df
+
+    storage.append_dataset(new_df[HISTORY_COLUMNS], 'pledge', data_dir=data_dir)
+    save_index(latest, index_file)
+    return new_df
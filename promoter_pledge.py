@@ -1,142 +1,104 @@
 import requests
-import pandas as pd
 import logging
-import os
-import time
+import argparse
 from datetime import datetime
-from fake_useragent import UserAgent
 
-# Initialize fake user agent
-ua = UserAgent()
+from nse_client import NseClient, configure_logging
+from nse_config import BASE_URL
+from ingest import PLEDGE_SCHEMA, build_frames, concat_frames
+import json_stream
+from pledge_store import append_snapshot
+from pledge_diff import diff_snapshot
+import storage
 
-# Initialize logging
-log_directory = "/home/nikunj/NseInsiderTrading"
-os.makedirs(log_directory, exist_ok=True)
-log_file_path = os.path.join(log_directory, "log.txt")
-
-logging.basicConfig(filename=log_file_path, format='%(asctime)s %(message)s')
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-# Fields to track
-columns = ['company_name', 'total_promoter_holding_pct', 'promoter_shares_encumbered', 'promoter_shares_encumbered_pct']
-
-output_directory = "/home/nikunj/NseInsiderTrading"
-os.makedirs(output_directory, exist_ok=True)
-pledge_file_path = os.path.join(output_directory, "pledge.csv")
-
-# Step 1: Load the existing CSV or create a blank DataFrame if it doesn't exist
-try:
-    print("Loading existing pledge.csv file...")
-    pledge_df = pd.read_csv(pledge_file_path, dtype=str, low_memory=False)
-    print("Loaded existing pledge.csv file.")
-    logger.info("Loaded existing pledge.csv file.")
-except FileNotFoundError:
-    print("pledge.csv not found. Creating a new file.")
-    pledge_df = pd.DataFrame(columns=columns)
-    logger.info("pledge.csv not found. Creating a new file.")
-except Exception as e:
-    print(f"Error reading pledge.csv: {str(e)}")
-    logger.error(f"Error reading pledge.csv: {str(e)}")
-    pledge_df = pd.DataFrame(columns=columns)
-
-# Function to fetch data from the API
-def get_data():
-    base_url = "https://www.nseindia.com"
-    pledge_page_url = "https://www.nseindia.com/companies-listing/corporate-filings-pledged-data"
-    api_url = "https://www.nseindia.com/api/corporate-pledgedata?index=equities"
-
-    user_agent = ua.random
-    common_headers = {
-        'User-Agent': user_agent,
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept': 'application/json, text/plain, */*',
-        'Connection': 'keep-alive',
-    }
-
-    with requests.Session() as session:
-        try:
-            # Step 1: Visit NSE homepage
-            print("Navigating to NSE homepage...")
-            logger.info("Navigating to NSE homepage...")
-            session.headers.update(common_headers)
-            home_resp = session.get(base_url, timeout=10)
-            home_resp.raise_for_status()
 
-            time.sleep(2)
+# Records decoded from the streamed response per typed frame batch
+BATCH_SIZE = 5000
 
-            # Step 2: Visit pledge filings page
-            print("Navigating to pledge filings page...")
-            logger.info("Navigating to pledge filings page...")
-            pledge_resp = session.get(pledge_page_url, timeout=10)
-            pledge_resp.raise_for_status()
+# Function to fetch data from the API; the `data` array is decoded from the
+# streamed body in batches, so the full response never exists as Python dicts.
+# Returns (day_df, response); day_df is None when NSE answered 304 Not Modified
+# and there is nothing to redo
+def get_data(batch_size=BATCH_SIZE):
+    pledge_page_url = f"{BASE_URL}/companies-listing/corporate-filings-pledged-data"
+    api_url = f"{BASE_URL}/api/corporate-pledgedata?index=equities"
 
-            time.sleep(2)
-
-            # Step 3: Call API with full headers
+    # The shared client visits the homepage and pledge filings page only if no warmed cookies are on disk
+    with NseClient(landing_page=pledge_page_url) as client:
+        try:
             print("Fetching pledged data from API...")
             logger.info("Fetching pledged data from API...")
 
             api_headers = {
-                'User-Agent': user_agent,
-                'Accept': 'application/json, text/plain, */*',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Referer': pledge_page_url,
-                'Origin': base_url,
+                'Origin': BASE_URL,
                 'X-Requested-With': 'XMLHttpRequest',
-                'Connection': 'keep-alive',
                 'Sec-Fetch-Site': 'same-origin',
                 'Sec-Fetch-Mode': 'cors',
             }
 
-            response = session.get(api_url, headers=api_headers, timeout=10)
+            response = client.get_cached(api_url, referer=pledge_page_url, headers=api_headers, timeout=10)
             response.raise_for_status()
+            # 304: skip parsing unless pledge.csv is missing and must be rebuilt from the cached body
+            if response.not_modified and storage.dataset_exists('pledge'):
+                response.close()
+                return None, response
+            day_df = concat_frames(build_frames(json_stream.iter_records(response), PLEDGE_SCHEMA, batch_size),
+                                   PLEDGE_SCHEMA)
 
             print("Data fetched successfully.")
             logger.info("Data fetched successfully.")
-            return response.json()
+            return day_df, response
 
         except requests.exceptions.HTTPError as e:
             logger.error(f"HTTP error: {e} | Status code: {e.response.status_code}")
             print(f"HTTP error: {e}")
-            return None
+            return None, None
         except Exception as e:
             print(f"An error occurred while fetching data: {str(e)}")
             logger.error(f"An error occurred while fetching data: {str(e)}")
-            return None
-
-# Step 2: Fetch data from the API
-data = get_data()
-
-if isinstance(data, str) or data is None:
-    print("Error fetching data. Exiting script.")
-    logger.error(f"Error fetching data: {data}")
-else:
-    print("Processing fetched data...")
-    logger.info("Processing fetched data...")
-
-    pledge_data = data.get('data', [])
-    day_df = pd.DataFrame(columns=columns)
-
-    for trade_data in pledge_data:
-        company_name = trade_data.get('comName', None)
-        total_promoter_holding_pct = trade_data.get('percPromoterHolding', None)
-        promoter_shares_encumbered = trade_data.get('totPromoterShares', None)
-        promoter_shares_encumbered_pct = trade_data.get('percPromoterShares', None)
-
-        row = [
-            company_name, total_promoter_holding_pct,
-            promoter_shares_encumbered, promoter_shares_encumbered_pct
-        ]
-        day_df.loc[len(day_df)] = row
-
-    combined_df = pd.concat([pledge_df, day_df], ignore_index=True)
-    combined_df.drop_duplicates(subset=columns, keep='first', inplace=True)
-
-    entries_added = len(combined_df) - len(pledge_df)
-    print(f"Entries added today: {entries_added}")
-    logger.info(f"Entries added today: {entries_added}")
-
-    combined_df.to_csv(pledge_file_path, index=False)
-    print(f"pledge.csv updated successfully with {len(combined_df)} total entries.")
-    logger.info(f"pledge.csv updated successfully with {len(combined_df)} total entries.")
+            return None, None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Append today's NSE pledged-data snapshot to pledge.csv")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help="records decoded per frame batch from the streamed response")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    configure_logging(format='%(asctime)s %(message)s', level=logging.DEBUG)
+
+    # Step 2: Fetch data from the API
+    day_df, response = get_data(args.batch_size)
+
+    if response is None:
+        print("Error fetching data. Exiting script.")
+        logger.error("Error fetching data.")
+    elif response.unchanged and storage.dataset_exists('pledge'):
+        # Same list as last run: nothing to append and no figures can have moved
+        response.commit()
+        print("Pledged data unchanged since the last run, nothing to do.")
+        logger.info("Pledged data unchanged since the last run, nothing to do.")
+    else:
+        print("Processing fetched data...")
+        logger.info("Processing fetched data...")
+
+        # Only companies whose figures moved since their last stored row are appended, tagged with today's date
+        added_df = append_snapshot(day_df)
+
+        entries_added = len(added_df)
+        print(f"Entries added today: {entries_added}")
+        logger.info(f"Entries added today: {entries_added}")
+        print(f"pledge.csv updated successfully ({len(day_df)} rows in today's snapshot).")
+        logger.info(f"pledge.csv updated successfully ({len(day_df)} rows in today's snapshot).")
+
+        # Companies whose figures moved since the previous snapshot go to pledge_changes
+        changes_df = diff_snapshot(day_df)
+        print(f"Companies with changed pledge figures: {len(changes_df)}")
+        logger.info(f"Companies with changed pledge figures: {len(changes_df)}")
+
+        response.commit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import time
+import argparse
+
+from nse_client import NseClient, configure_logging, limit_rate, log_and_print, quote_referer
+from nse_config import BASE_URL, DATA_DIR
+import classification_cache
+import index_constituents
+import bulk_mktcap
+from crawl_journal import CrawlJournal, crawl, DEFAULT_RETRY_ROUNDS, DEFAULT_BACKOFF
+from ingest import MKTCAP_SCHEMA, STKDATA_SCHEMA, build_frame
+import storage
+import shard_crawl
+
+# Single pass over Symbols.csv that fills both stkdata.csv and mktcap.csv.
+# quote-equity only returns industryInfo without a section and only returns
+# marketDeptOrderBook with section=trade_info, so two API calls per symbol is
+# the minimum; the session is warmed once for the whole run. Symbols whose
+# classification is still fresh in the cache only need the trade_info call.
+# In the default bulk mode market cap is computed from bhavcopy closes and
+# cached issued shares (bulk_mktcap.py), so only symbols with a stale
+# classification or share count are requested at all. With --shards the
+# requests are spread over several processes and sessions (shard_crawl.py).
+
+LANDING_PAGE = f"{BASE_URL}/market-data/live-equity-market"
+QUOTE_URL = BASE_URL + "/api/quote-equity?symbol={symbol}"
+TRADE_INFO_URL = BASE_URL + "/api/quote-equity?symbol={symbol}&section=trade_info"
+
+def fetch_quote_data(symbol, client, need_quote=True, need_trade_info=True):
+    """Return (industry_row, mktcap_row, issued_shares); parts that were not requested or failed are None."""
+    try:
+        log_and_print(f"Fetching quote data for symbol: {symbol}")
+        industry_row = None
+        mktcap_row = None
+        issued_shares = None
+
+        data = client.get_json(QUOTE_URL.format(symbol=symbol), referer=quote_referer(symbol)) if need_quote else None
+        if data:
+            industry_info = data.get('industryInfo', {})
+            industry_row = {
+                'symbol': symbol,
+                'basic_industry': industry_info.get('basicIndustry'),
+                'industry': industry_info.get('industry'),
+                'macro': industry_info.get('macro'),
+                'sector': industry_info.get('sector'),
+            }
+            issued_shares = data.get('securityInfo', {}).get('issuedSize')
+
+        trade_data = client.get_json(TRADE_INFO_URL.format(symbol=symbol), referer=quote_referer(symbol)) if need_trade_info else None
+        if trade_data:
+            market_cap = trade_data.get("marketDeptOrderBook", {}).get("tradeInfo", {}).get("totalMarketCap", None)
+            if market_cap:
+                mktcap_row = {'symbol': symbol, 'market_cap': market_cap}
+
+        return industry_row, mktcap_row, issued_shares
+    except Exception as e:
+        log_and_print(f"Exception occurred while fetching quote data for symbol: {symbol}: {str(e)}", level="error")
+        return None, None, None
+
+# Parts already fetched for symbols whose other part failed, so a retry only
+# requests what is still missing; per process, so each shard keeps its own
+_partial = {}
+
+def fetch_row(symbol, client, pending=(), refresh=(), bulk=True):
+    """Journal row for one symbol, or None if a part it needs could not be fetched.
+
+    pending and refresh are the symbols needing a classification and an
+    issued-share count; outside bulk mode every symbol needs its market cap.
+    """
+    done = _partial.setdefault(symbol, {})
+    need_industry = symbol in pending and 'industry' not in done
+    need_shares = symbol in refresh and 'issued_shares' not in done
+    need_mktcap = not bulk and 'mktcap' not in done
+    industry_row, mktcap_row, issued_shares = fetch_quote_data(
+        symbol, client, need_quote=need_industry or need_shares, need_trade_info=need_mktcap)
+    if industry_row:
+        done['industry'] = industry_row
+    elif need_industry:
+        log_and_print(f"No industry data found for symbol: {symbol}", level="warning")
+    if issued_shares:
+        done['issued_shares'] = issued_shares
+    if mktcap_row:
+        done['mktcap'] = mktcap_row
+    elif need_mktcap:
+        log_and_print(f"Failed to fetch market cap for {symbol}", level="warning")
+    if ((symbol in pending and 'industry' not in done) or (symbol in refresh and 'issued_shares' not in done)
+            or (not bulk and 'mktcap' not in done)):
+        return None
+    del _partial[symbol]
+    return {'industry': done.get('industry'), 'mktcap': done.get('mktcap'), 'issued_shares': done.get('issued_shares')}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Fetch industry classification and market cap in one pass")
+    parser.add_argument('--workers', type=int, default=4, help="quote-equity requests kept in flight")
+    parser.add_argument('--rps', type=float, default=6.0, help="ceiling for the adaptive requests-per-second rate")
+    parser.add_argument('--ttl-days', type=float, default=classification_cache.DEFAULT_TTL_DAYS,
+                        help="refetch cached classifications older than this many days")
+    parser.add_argument('--full-refresh', action='store_true', help="ignore the cache and refetch every symbol")
+    parser.add_argument('--no-index-files', action='store_true',
+                        help="classify every symbol through quote-equity, ignoring the index constituent files")
+    parser.add_argument('--mktcap-mode', choices=['bulk', 'crawl'], default='bulk',
+                        help="bulk computes market cap from bhavcopy closes and cached issued shares; "
+                             "crawl reads totalMarketCap with one trade_info call per symbol")
+    parser.add_argument('--shares-ttl-days', type=float, default=bulk_mktcap.DEFAULT_TTL_DAYS,
+                        help="refetch cached issued-share counts older than this many days")
+    parser.add_argument('--retry-rounds', type=int, default=DEFAULT_RETRY_ROUNDS,
+                        help="extra passes over failed symbols before giving up")
+    parser.add_argument('--retry-backoff', type=float, default=DEFAULT_BACKOFF,
+                        help="seconds before the first retry pass, doubled for each later pass")
+    shard_crawl.add_shard_arguments(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    configure_logging()
+    shard_crawl.check_shard_arguments(args)
+    input_file = os.path.join(DATA_DIR, 'Symbols.csv')
+    output_directory = DATA_DIR
+    stkdata_file = os.path.join(output_directory, "stkdata.csv")
+    mktcap_file = os.path.join(output_directory, "mktcap.csv")
+
+    if not os.path.exists(input_file):
+        raise FileNotFoundError(f"{input_file} not found!")
+
+    log_and_print(f"Reading symbols from {input_file}")
+    symbols = storage.read_dataset('Symbols').iloc[:, 0].tolist()
+    os.makedirs(output_directory, exist_ok=True)
+
+    bulk = args.mktcap_mode == 'bulk'
+    if bulk and not os.path.exists(bulk_mktcap.CLOSES_FILE):
+        log_and_print(f"{bulk_mktcap.CLOSES_FILE} not found, falling back to per-symbol market cap", level="warning")
+        bulk = False
+
+    cache = {} if args.full_refresh else classification_cache.load_cache()
+
+    # Symbols finished by an interrupted run are taken from its journal
+    # (from every shard's journal when the crawl is sharded)
+    sharded = args.shards > 1
+    journal = shard_crawl.ShardSet('quote_data', args.shards) if sharded else CrawlJournal('quote_data')
+    for symbol, row in journal.rows.items():
+        if row['industry']:
+            classification_cache.record_result(cache, symbol, row['industry'])
+    # Symbols covered by the local index constituent files are classified without a request
+    if not args.no_index_files:
+        for row in index_constituents.classify(classification_cache.symbols_to_fetch(symbols, cache, args.ttl_days)):
+            classification_cache.record_result(cache, row['symbol'], row, source=row['source'])
+    pending = set(classification_cache.symbols_to_fetch(symbols, cache, args.ttl_days))
+    log_and_print(f"{len(symbols) - len(pending)} classifications served from cache or index files, {len(pending)} to fetch")
+
+    refresh = set()
+    if bulk:
+        closes = bulk_mktcap.load_closes()
+        shares = bulk_mktcap.load_shares()
+        refresh = set(bulk_mktcap.symbols_to_refresh(symbols, closes, shares, args.shares_ttl_days))
+        log_and_print(f"{len(refresh)} issued-share counts to refresh")
+        targets = [symbol for symbol in symbols if symbol in pending or symbol in refresh]
+    else:
+        targets = symbols
+
+    fetch_args = (pending, refresh, bulk)
+    if sharded and args.shard is not None:
+        # One shard of a crawl spread over machines; --merge-shards writes the output
+        shard_crawl.run_shard('quote_data', 'quote_data:fetch_row', targets, args.shard, args.shards, LANDING_PAGE,
+                              args.workers, args.rps, shard_crawl.proxy_for(args.shard, args.proxies),
+                              args.retry_rounds, args.retry_backoff, fetch_args)
+        return
+
+    if targets and sharded:
+        if not args.merge_shards:
+            start_time = time.time()
+            journal.run('quote_data:fetch_row', targets, LANDING_PAGE, args.workers, args.rps, args.proxies,
+                        args.retry_rounds, args.retry_backoff, fetch_args)
+            log_and_print(f"Processed {len(targets)} symbols in {args.shards} shards in {time.time() - start_time:.2f} seconds")
+    elif targets:
+        limit_rate(args.rps)
+        with NseClient(landing_page=LANDING_PAGE, pool_size=args.workers) as client:
+            log_and_print(f"Using User-Agent: {client.user_agent}")
+            if not client.warm_up():
+                log_and_print("Session warm-up failed, aborting", level="error")
+                return
+
+            start_time = time.time()
+            crawl(targets, lambda symbol: fetch_row(symbol, client, *fetch_args), journal, args.workers,
+                  args.retry_rounds, args.retry_backoff)
+            log_and_print(f"Processed {len(targets)} symbols in {time.time() - start_time:.2f} seconds")
+
+    # Any quote-equity answer also refreshes the classification, not only the pending ones
+    classified = set()
+    issued = {}
+    for symbol, row in journal.rows.items():
+        if row['industry']:
+            classification_cache.record_result(cache, symbol, row['industry'])
+            classified.add(symbol)
+        if row.get('issued_shares'):
+            issued[symbol] = row['issued_shares']
+
+    for symbol in pending - classified:
+        classification_cache.record_result(cache, symbol, None)
+    classification_cache.save_cache(cache)
+    stkdata_df = build_frame(classification_cache.cached_rows(symbols, cache), STKDATA_SCHEMA)
+
+    if bulk:
+        shares = bulk_mktcap.update_shares(shares, {symbol: issued.get(symbol) for symbol in refresh})
+        mktcap, shares = bulk_mktcap.compute_market_caps(symbols, closes, shares)
+        bulk_mktcap.save_shares(shares)
+        mktcap_df = build_frame(mktcap.to_dict('records'), MKTCAP_SCHEMA)
+    else:
+        mktcap_df = build_frame([journal.rows[s]['mktcap'] for s in symbols
+                                 if s in journal.rows and journal.rows[s]['mktcap']], MKTCAP_SCHEMA)
+
+    storage.write_dataset(stkdata_df, 'stkdata')
+    log_and_print(f"Data saved successfully to {stkdata_file}")
+    storage.write_dataset(mktcap_df, 'mktcap')
+    log_and_print(f"Saved market cap data to {mktcap_file}")
+    journal.finish(targets)
+
+if __name__ == "__main__":
+    main()
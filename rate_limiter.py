@@ -0,0 +1,93 @@
+import time
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import nse_metrics
+
+# Adaptive (AIMD) pacing for NSE requests.
+#
+# Requests are spaced at the current rate. Every healthy response nudges the
+# rate up additively (roughly +increase requests/second for each second of
+# successful traffic); a 429/403 cuts it multiplicatively and, if NSE sent
+# Retry-After, holds every caller until then. The collectors therefore run
+# at the fastest rate NSE tolerates instead of a fixed worst-case sleep.
+
+DEFAULT_INITIAL_RPS = 1.0
+DEFAULT_MIN_RPS = 0.2
+DEFAULT_MAX_RPS = 8.0
+
+# Slot indexes into the limiter state
+NEXT_SLOT, RATE, LAST_DECREASE = 0, 1, 2
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        # "-0000" dates come back naive; HTTP dates are UTC
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class AdaptiveRateLimiter:
+    """Thread-safe AIMD limiter.
+
+    state may be a multiprocessing Array('d', 3) with a multiprocessing lock
+    so that forked workers (auto_run.py --in-process) share one rate.
+    """
+
+    def __init__(self, max_rps=DEFAULT_MAX_RPS, initial_rps=DEFAULT_INITIAL_RPS, min_rps=DEFAULT_MIN_RPS,
+                 increase=0.1, decrease=0.5, lock=None, state=None):
+        self.max_rps = max_rps
+        self.min_rps = min(min_rps, max_rps)
+        self.increase = increase
+        self.decrease = decrease
+        self.lock = lock or threading.Lock()
+        self.state = state if state is not None else [0.0, 0.0, 0.0]
+        with self.lock:
+            if self.state[RATE] == 0.0:
+                self.state[NEXT_SLOT] = time.monotonic()
+                self.state[RATE] = min(initial_rps, max_rps)
+
+    @property
+    def rate(self):
+        return self.state[RATE]
+
+    def cap(self, max_rps):
+        """Lower the ceiling (e.g. to a script's --rps or auto_run's share of the budget)."""
+        with self.lock:
+            self.max_rps = min(self.max_rps, max_rps)
+            self.min_rps = min(self.min_rps, self.max_rps)
+            self.state[RATE] = min(self.state[RATE], self.max_rps)
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.state[NEXT_SLOT])
+            self.state[NEXT_SLOT] = slot + 1.0 / self.state[RATE]
+        delay = slot - now
+        if delay > 0:
+            nse_metrics.sleep(delay, "rate-limiter")
+
+    def on_success(self):
+        with self.lock:
+            rate = self.state[RATE]
+            self.state[RATE] = min(self.max_rps, rate + self.increase / rate)
+
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            # Several in-flight requests usually get throttled together; back off once per burst
+            if now - self.state[LAST_DECREASE] > 1.0 / self.state[RATE]:
+                self.state[RATE] = max(self.min_rps, self.state[RATE] * self.decrease)
+                self.state[LAST_DECREASE] = now
+            hold_until = now + (retry_after if retry_after is not None else 1.0 / self.state[RATE])
+            self.state[NEXT_SLOT] = max(self.state[NEXT_SLOT], hold_until)
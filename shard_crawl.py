@@ -0,0 +1,149 @@
+import os
+import hashlib
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import nse_metrics
+import rate_limiter
+from nse_client import NseClient, USER_AGENTS, global_limiter, set_global_limiter, log_and_print
+from nse_config import DATA_DIR
+from crawl_journal import CrawlJournal, crawl, DEFAULT_RETRY_ROUNDS, DEFAULT_BACKOFF
+
+# Sharded per-symbol crawl for quote_data.py, StkData.py and Updated_Mktcap.py.
+#
+# Symbols are assigned to one of N shards by a jump consistent hash of the
+# symbol, so the assignment never depends on the order of Symbols.csv and
+# changing N only moves about 1/N of the symbols. Each shard is crawled in
+# its own process with its own NseClient (cookie jar nse_cookies_shard<k>.json,
+# its own User-Agent and optionally its own proxy) and journals its rows to
+# <name>_shard<k>of<N>_journal.jsonl. The parent merges the shard journals
+# and the crawler writes its usual output in Symbols.csv order.
+#
+# Shards can also run on different machines sharing the data directory:
+# run each with --shard K, then once with --merge-shards to write the output.
+# NSE_SHARDS sets the default shard count, so auto_run.py's quote_data.py
+# step can be sharded without passing it arguments.
+
+def shard_of(symbol, shards):
+    """Jump consistent hash (Lamping & Veach) of the symbol's SHA-1 into [0, shards)."""
+    key = int.from_bytes(hashlib.sha1(symbol.encode()).digest()[:8], 'big')
+    bucket, candidate = -1, 0
+    while candidate < shards:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+def split(symbols, shards):
+    """{shard: [symbols]} keeping the input order within each shard."""
+    assignment = {shard: [] for shard in range(shards)}
+    for symbol in symbols:
+        assignment[shard_of(symbol, shards)].append(symbol)
+    return assignment
+
+def shard_name(name, shard, shards):
+    return f"{name}_shard{shard}of{shards}"
+
+def resolve(fetch_ref):
+    """'module:function' -> function; passed by name so it survives the process boundary."""
+    module_name, function_name = fetch_ref.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+def open_journal(name, shard, shards):
+    # Only read here; the shard's worker is the one appending to it
+    journal = CrawlJournal(shard_name(name, shard, shards))
+    journal.handle.close()
+    return journal
+
+def proxy_for(shard, proxies):
+    return proxies[shard % len(proxies)] if proxies else None
+
+def shard_rps(rps, shards, proxies=None):
+    """Request-rate ceiling of each of `shards` shard processes.
+
+    This process's limiter ceiling (auto_run.py's NSE_MAX_RPS share, or a
+    lower --rps cap) is the budget of the whole fleet, so it is always
+    split; rps is split too unless the shards have their own proxies.
+    """
+    return min(rps if proxies else rps / shards, global_limiter().max_rps / shards)
+
+def run_shard(name, fetch_ref, symbols, shard, shards, landing_page=None, workers=4, rps=1.0, proxy=None,
+              retry_rounds=DEFAULT_RETRY_ROUNDS, backoff=DEFAULT_BACKOFF, fetch_args=()):
+    """Crawl the symbols of one shard in this process; returns how many still failed.
+
+    fetch_ref names a fetch(symbol, client, *fetch_args) function returning a
+    JSON row or None; fetch_args must be picklable.
+    """
+    mine = [symbol for symbol in symbols if shard_of(symbol, shards) == shard]
+    fetch = resolve(fetch_ref)
+    # A limiter of its own with the shard's share as the ceiling; one inherited from the
+    # parent (or built from NSE_MAX_RPS) would let every shard use the whole budget
+    set_global_limiter(rate_limiter.AdaptiveRateLimiter(max_rps=min(rps, global_limiter().max_rps)))
+    journal = CrawlJournal(shard_name(name, shard, shards))
+    client = NseClient(landing_page=landing_page, pool_size=workers,
+                       cookie_file=os.path.join(DATA_DIR, f"nse_cookies_shard{shard}.json"),
+                       user_agent=USER_AGENTS[shard % len(USER_AGENTS)], proxy=proxy)
+    try:
+        log_and_print(f"Shard {shard + 1}/{shards}: {len(mine)} symbols"
+                      + (f" through {proxy}" if proxy else ""))
+        failed = crawl(mine, lambda symbol: fetch(symbol, client, *fetch_args), journal, workers, retry_rounds, backoff)
+    finally:
+        client.close()
+        journal.handle.close()
+        nse_metrics.flush(shard_name(name, shard, shards))
+    return len(failed)
+
+class ShardSet:
+    """The shard journals of one crawl, read back as a single journal."""
+
+    def __init__(self, name, shards):
+        self.name = name
+        self.shards = shards
+        self.reload()
+
+    def reload(self):
+        self.journals = [open_journal(self.name, shard, self.shards) for shard in range(self.shards)]
+        self.rows = {}
+        for journal in self.journals:
+            self.rows.update(journal.rows)
+
+    def run(self, fetch_ref, symbols, landing_page=None, workers=4, rps=1.0, proxies=None,
+            retry_rounds=DEFAULT_RETRY_ROUNDS, backoff=DEFAULT_BACKOFF, fetch_args=()):
+        """Crawl every shard in its own process, then reload the merged rows.
+
+        Each shard gets shard_rps() as its ceiling.
+        """
+        per_shard_rps = shard_rps(rps, self.shards, proxies)
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=self.shards, mp_context=context) as executor:
+            futures = [executor.submit(run_shard, self.name, fetch_ref, symbols, shard, self.shards, landing_page,
+                                       workers, per_shard_rps, proxy_for(shard, proxies), retry_rounds, backoff,
+                                       fetch_args)
+                       for shard in range(self.shards)]
+            failed = sum(future.result() for future in futures)
+        self.reload()
+        return failed
+
+    def finish(self, symbols):
+        """Retry queue and journal cleanup per shard, as CrawlJournal.finish does for one."""
+        for shard, shard_symbols in split(symbols, self.shards).items():
+            self.journals[shard].finish(shard_symbols)
+
+def add_shard_arguments(parser):
+    group = parser.add_argument_group("sharding")
+    group.add_argument('--shards', type=int, default=int(os.environ.get("NSE_SHARDS", 1)),
+                       help="split the crawl into this many shards, each in its own process and session "
+                            "(default: NSE_SHARDS or 1)")
+    group.add_argument('--shard', type=int,
+                       help="crawl only this shard (0-based) and exit; for shards run on separate machines")
+    group.add_argument('--merge-shards', action='store_true',
+                       help="write the output from the shard journals without crawling")
+    group.add_argument('--proxies', type=lambda s: [p.strip() for p in s.split(',') if p.strip()],
+                       help="comma-separated proxy URLs assigned to the shards round-robin")
+
+def check_shard_arguments(args):
+    if args.shards < 1:
+        raise SystemExit("--shards must be at least 1")
+    if args.shard is not None and not 0 <= args.shard < args.shards:
+        raise SystemExit(f"--shard must be between 0 and {args.shards - 1} (set --shards too)")
@@ -0,0 +1,215 @@
+import os
+import glob
+from datetime import datetime
+import pandas as pd
+
+from ingest import (INSIDER_SCHEMA, INSIDER_XBRL_SCHEMA, PLEDGE_HISTORY_SCHEMA, PLEDGE_CHANGES_SCHEMA,
+                    STKDATA_SCHEMA, MKTCAP_SCHEMA, apply_schema, read_csv, write_csv)
+import nse_db
+from nse_config import DATA_DIR
+
+# Pluggable storage for the collector outputs.
+#
+# Every dataset can be written as CSV (for spreadsheet users), typed and
+# compressed Parquet, Feather (Arrow IPC) and/or a table in the indexed SQLite
+# store (nse_db.py). NSE_STORAGE_FORMATS picks the formats, e.g.
+# "csv,parquet"; the default is CSV plus SQLite. Reads prefer the binary
+# formats and support column projection and row filters, which Parquet and
+# SQLite push down into the scan/query.
+#
+# Datasets listed in SCHEMAS are cast to their declared schema before every
+# Parquet/Feather write, so each Parquet part file has the same column types
+# whatever pandas inferred for that batch (an all-empty column would otherwise
+# be written as double or null and clash with the next part's strings).
+
+FORMATS = ('csv', 'parquet', 'feather', 'sqlite')
+EXTENSIONS = {'csv': '.csv', 'parquet': '.parquet', 'feather': '.feather'}
+COMPRESSION = 'zstd'
+
+SCHEMAS = {
+    'insider': INSIDER_SCHEMA,
+    'insider_xbrl': INSIDER_XBRL_SCHEMA,
+    'pledge': PLEDGE_HISTORY_SCHEMA,
+    'pledge_changes': PLEDGE_CHANGES_SCHEMA,
+    'stkdata': STKDATA_SCHEMA,
+    'mktcap': MKTCAP_SCHEMA,
+}
+
+def configured_formats():
+    formats = [f.strip().lower() for f in os.environ.get('NSE_STORAGE_FORMATS', 'csv,sqlite').split(',') if f.strip()]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown storage format(s) in NSE_STORAGE_FORMATS: {', '.join(sorted(unknown))}")
+    return formats
+
+def binary_formats():
+    return [f for f in configured_formats() if f != 'csv']
+
+def dataset_path(name, fmt, data_dir=DATA_DIR):
+    if fmt == 'sqlite':
+        return os.path.join(data_dir, os.path.basename(nse_db.DB_FILE))
+    return os.path.join(data_dir, name + EXTENSIONS[fmt])
+
+def copy_exists(name, fmt, data_dir=DATA_DIR):
+    if fmt == 'sqlite':
+        return nse_db.has_table(name, dataset_path(name, fmt, data_dir))
+    return os.path.exists(dataset_path(name, fmt, data_dir))
+
+def arrow_schema(schema):
+    """pyarrow schema for a dataset schema; categorical and text columns are stored as strings."""
+    import pyarrow as pa
+    types = dict.fromkeys(schema['columns'], pa.string())
+    types.update(dict.fromkeys(schema['integer'], pa.int64()))
+    types.update(dict.fromkeys(schema['numeric'], pa.float64()))
+    types.update(dict.fromkeys(schema['dates'], pa.timestamp('ns')))
+    return pa.schema([(column, types[column]) for column in schema['columns']])
+
+def typed_frame(df, name):
+    """df cast to the declared schema of dataset name, with its columns in schema order."""
+    if name not in SCHEMAS:
+        return df
+    schema = SCHEMAS[name]
+    df = apply_schema(df.reindex(columns=schema['columns']), schema)
+    for column in schema['categorical']:
+        df[column] = df[column].astype(object).where(df[column].notna(), None)
+    return df
+
+def write_parquet(df, path, name):
+    df = typed_frame(df, name)
+    schema = arrow_schema(SCHEMAS[name]) if name in SCHEMAS else None
+    df.to_parquet(path, index=False, compression=COMPRESSION, schema=schema)
+
+def write_dataset(df, name, formats=None, data_dir=DATA_DIR):
+    """Write the full dataset in each configured format, replacing previous copies."""
+    for fmt in configured_formats() if formats is None else formats:
+        path = dataset_path(name, fmt, data_dir)
+        if fmt == 'sqlite':
+            nse_db.write_table(df, name, path)
+            continue
+        tmp_path = path + ".tmp"
+        if fmt == 'csv':
+            write_csv(df, tmp_path)
+        elif fmt == 'parquet':
+            write_parquet(df, tmp_path, name)
+        else:
+            typed_frame(df, name).reset_index(drop=True).to_feather(tmp_path, compression=COMPRESSION)
+        if fmt == 'parquet' and os.path.isdir(path):
+            for part in glob.glob(os.path.join(path, "*.parquet")):
+                os.remove(part)
+            os.rmdir(path)
+        os.replace(tmp_path, path)
+
+def append_dataset(df, name, formats=None, data_dir=DATA_DIR):
+    """Append rows to an existing dataset.
+
+    CSV is appended in place and Parquet gets a new part file inside a
+    <name>.parquet directory, so neither rewrites the history. SQLite
+    inserts into the existing table. Feather has no append, so it is
+    rewritten.
+    """
+    if df.empty:
+        return
+    formats = configured_formats() if formats is None else formats
+
+    # A newly enabled binary format starts from the existing CSV history
+    csv_path = dataset_path(name, 'csv', data_dir)
+    for fmt in formats:
+        if fmt != 'csv' and not copy_exists(name, fmt, data_dir) and os.path.exists(csv_path):
+            write_dataset(read_dataset(name, fmt='csv', data_dir=data_dir), name, formats=[fmt], data_dir=data_dir)
+
+    for fmt in formats:
+        path = dataset_path(name, fmt, data_dir)
+        if fmt == 'csv':
+            write_csv(df, path, mode='a', header=not os.path.exists(path))
+        elif fmt == 'sqlite':
+            nse_db.append_table(df, name, path)
+        elif fmt == 'parquet':
+            if os.path.isfile(path):
+                # A single-file dataset becomes the first part of the directory
+                os.replace(path, path + ".first")
+                os.makedirs(path)
+                os.replace(path + ".first", os.path.join(path, "part-00000000T000000.parquet"))
+            os.makedirs(path, exist_ok=True)
+            part = os.path.join(path, f"part-{datetime.now():%Y%m%dT%H%M%S%f}.parquet")
+            write_parquet(df, part, name)
+        else:
+            existing = pd.read_feather(path) if os.path.exists(path) else df.iloc[0:0]
+            write_dataset(pd.concat([existing, df], ignore_index=True), name, formats=['feather'], data_dir=data_dir)
+
+def apply_filters(df, filters):
+    """Apply pyarrow-style [(column, op, value), ...] filters (ANDed) to a DataFrame."""
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters or []:
+        series = df[column]
+        if op in ('=', '=='):
+            mask &= series == value
+        elif op == '!=':
+            mask &= series != value
+        elif op == '<':
+            mask &= series < value
+        elif op == '<=':
+            mask &= series <= value
+        elif op == '>':
+            mask &= series > value
+        elif op == '>=':
+            mask &= series >= value
+        elif op == 'in':
+            mask &= series.isin(value)
+        elif op == 'not in':
+            mask &= ~series.isin(value)
+        else:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return df[mask].reset_index(drop=True)
+
+def dataset_exists(name, data_dir=DATA_DIR):
+    return any(copy_exists(name, fmt, data_dir) for fmt in FORMATS)
+
+def read_dataset(name, columns=None, filters=None, fmt=None, data_dir=DATA_DIR):
+    """Read a dataset, preferring the configured binary formats over CSV.
+
+    columns limits the columns read; filters is a list of
+    (column, op, value) tuples that are all required to match.
+    """
+    if fmt:
+        candidates = [fmt]
+    else:
+        # Copies in formats that are no longer configured may be stale, so they come last
+        candidates = binary_formats() + ['csv']
+        candidates += [f for f in ('parquet', 'feather', 'sqlite') if f not in candidates]
+    for candidate in candidates:
+        path = dataset_path(name, candidate, data_dir)
+        if not copy_exists(name, candidate, data_dir):
+            continue
+
+        if candidate == 'sqlite':
+            df = nse_db.read_table(name, columns=columns, filters=filters, db_file=path)
+            # Dates are stored as ISO text in SQLite
+            return apply_schema(df, SCHEMAS[name], date_format='%Y-%m-%d') if name in SCHEMAS else df
+
+        if candidate == 'parquet':
+            if name not in SCHEMAS:
+                return pd.read_parquet(path, columns=columns, filters=filters or None)
+            # Reading through the declared schema also casts parts written before it was pinned
+            df = pd.read_parquet(path, columns=columns, filters=filters or None, schema=arrow_schema(SCHEMAS[name]))
+            return apply_schema(df, SCHEMAS[name])
+
+        # Filter columns must be loaded even if they are not projected
+        load_columns = None
+        if columns is not None:
+            load_columns = list(dict.fromkeys(list(columns) + [f[0] for f in filters or []]))
+
+        if candidate == 'feather':
+            df = pd.read_feather(path, columns=load_columns)
+            if name in SCHEMAS:
+                df = apply_schema(df, SCHEMAS[name])
+        elif name in SCHEMAS:
+            df = read_csv(path, SCHEMAS[name], low_memory=False)
+            if load_columns is not None:
+                df = df[load_columns]
+        else:
+            df = pd.read_csv(path, usecols=load_columns)
+
+        df = apply_filters(df, filters)
+        return df[list(columns)] if columns is not None else df
+
+    raise FileNotFoundError(f"No stored copy of dataset '{name}' in {data_dir}")
@@ -0,0 +1,113 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import auto_run
+
+
+def graph(**deps):
+    return {name: {"deps": list(step_deps), "nse": False, "outputs": []} for name, step_deps in deps.items()}
+
+
+def test_nightly_steps_form_a_dag():
+    auto_run.check_dag(auto_run.steps)
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError, match="a.py depends on unknown step missing.py"):
+        auto_run.check_dag(graph(**{"a.py": ["missing.py"]}))
+
+
+@pytest.mark.parametrize("deps", [
+    {"a.py": ["a.py"]},
+    {"a.py": ["b.py"], "b.py": ["a.py"]},
+    {"a.py": [], "b.py": ["a.py", "d.py"], "c.py": ["b.py"], "d.py": ["c.py"]},
+])
+def test_cycles(deps):
+    with pytest.raises(ValueError, match="Dependency cycle"):
+        auto_run.check_dag(graph(**deps))
+
+
+def test_diamond_is_not_a_cycle():
+    auto_run.check_dag(graph(**{"a.py": [], "b.py": ["a.py"], "c.py": ["a.py"], "d.py": ["b.py", "c.py"]}))
+
+
+@pytest.fixture
+def run_dir(tmp_path, monkeypatch):
+    """Scripts and data directory for a scheduler run; returns a function writing one step script."""
+    monkeypatch.setattr(auto_run, "scripts_dir", str(tmp_path))
+    monkeypatch.setattr(auto_run, "data_dir", str(tmp_path))
+    monkeypatch.setattr(auto_run, "log_file", str(tmp_path / "log.txt"))
+    monkeypatch.setattr(auto_run, "history_file", str(tmp_path / "run_history.jsonl"))
+    monkeypatch.setattr(auto_run, "summarize_metrics", lambda since: None)
+
+    def script(name, body="", exit_code=0):
+        (tmp_path / name).write_text(
+            "import time\n"
+            f"with open('events', 'a') as f: f.write('start {name}\\n')\n"
+            f"{body}\n"
+            f"with open('events', 'a') as f: f.write('end {name}\\n')\n"
+            f"raise SystemExit({exit_code})\n")
+
+    monkeypatch.chdir(tmp_path)
+    return script
+
+
+def events(tmp_path):
+    return (tmp_path / "events").read_text().splitlines()
+
+
+def test_steps_start_after_their_dependencies(run_dir, tmp_path, monkeypatch):
+    run_dir("a.py", "time.sleep(0.3)")
+    run_dir("b.py")
+    run_dir("c.py", "time.sleep(0.3)")
+    monkeypatch.setattr(auto_run, "steps", graph(**{"a.py": [], "b.py": ["a.py", "c.py"], "c.py": []}))
+
+    auto_run.run_scripts(workers=2)
+    order = events(tmp_path)
+    # a and c run side by side, b only once both are done
+    assert set(order[:2]) == {"start a.py", "start c.py"}
+    assert order[-2:] == ["start b.py", "end b.py"]
+    history = [record["step"] for record in auto_run.load_history()]
+    assert sorted(history) == ["a.py", "b.py", "c.py"] and history[-1] == "b.py"
+
+
+def test_both_pipes_are_drained(run_dir, tmp_path, monkeypatch):
+    # Far more than a pipe buffer on each stream; reading only stdout would stall the step
+    run_dir("noisy.py", "import sys\n"
+                        "for i in range(5000):\n"
+                        "    print(f'out {i:060d}')\n"
+                        "    print(f'err {i:060d}', file=sys.stderr)\n"
+                        "sys.stderr.write('unterminated')")
+    monkeypatch.setattr(auto_run, "steps", graph(**{"noisy.py": []}))
+
+    auto_run.run_scripts(workers=1)
+    log = (tmp_path / "log.txt").read_text()
+    assert log.count("noisy.py output: out ") == 5000
+    assert log.count("noisy.py error: err ") == 5000
+    assert "noisy.py error: unterminated" in log
+    assert auto_run.load_history()[0]["exit_code"] == 0
+
+
+def test_dependents_of_a_failed_step_are_skipped(run_dir, tmp_path, monkeypatch):
+    run_dir("fails.py", exit_code=2)
+    run_dir("needs_it.py")
+    run_dir("needs_that.py")
+    run_dir("independent.py")
+    run_dir("commit.py")
+    steps = graph(**{"fails.py": [], "needs_it.py": ["fails.py"], "needs_that.py": ["needs_it.py"],
+                     "independent.py": [], "commit.py": ["needs_that.py", "independent.py"]})
+    steps["commit.py"]["after_failure"] = True
+    monkeypatch.setattr(auto_run, "steps", steps)
+
+    auto_run.run_scripts(workers=2)
+    ran = {event.split()[1] for event in events(tmp_path)}
+    assert ran == {"fails.py", "independent.py", "commit.py"}
+    exit_codes = {record["step"]: record["exit_code"] for record in auto_run.load_history()}
+    assert exit_codes == {"fails.py": 2, "independent.py": 0, "commit.py": 0}
+    log = (tmp_path / "log.txt").read_text()
+    assert "Skipping needs_it.py: fails.py failed" in log
+    assert "Skipping needs_that.py: needs_it.py failed" in log
@@ -0,0 +1,71 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bulk_mktcap
+
+NOW = datetime(2026, 10, 18, 20, 0)
+
+
+def closes_frame(rows):
+    return pd.DataFrame(rows, columns=bulk_mktcap.CLOSES_COLUMNS)
+
+
+def shares_frame(rows):
+    return pd.DataFrame(rows, columns=bulk_mktcap.SHARES_COLUMNS)
+
+
+def test_refresh_new_stale_failed_and_adjusted_symbols():
+    fresh = (NOW - timedelta(days=1)).isoformat()
+    closes = closes_frame([
+        ('FRESH', 100.0, 101.0), ('OLD', 100.0, 101.0), ('FAILED', 100.0, 101.0),
+        ('SPLIT', 50.0, 51.0), ('NEW', 10.0, 11.0), ('DRIFT', 100.3, 99.0),
+    ])
+    shares = shares_frame([
+        ('FRESH', 1e6, 100.0, fresh, 'ok'),
+        ('OLD', 1e6, 100.0, (NOW - timedelta(days=8)).isoformat(), 'ok'),
+        ('FAILED', 1e6, 100.0, fresh, 'failed'),
+        # PREV_CLOSE halved against the close stored last run: a 1:2 split
+        ('SPLIT', 1e6, 100.0, fresh, 'ok'),
+        # Within ADJUSTMENT_TOLERANCE
+        ('DRIFT', 1e6, 100.0, fresh, 'ok'),
+    ])
+    symbols = ['NEW', 'FRESH', 'OLD', 'FAILED', 'SPLIT', 'DRIFT']
+    assert bulk_mktcap.symbols_to_refresh(symbols, closes, shares, ttl_days=7, now=NOW) == ['NEW', 'OLD', 'FAILED', 'SPLIT']
+
+
+def test_failed_refresh_keeps_a_known_count():
+    shares = shares_frame([('KNOWN', 2e6, 100.0, '2026-10-01T00:00:00', 'ok')])
+    updated = bulk_mktcap.update_shares(shares, {'KNOWN': None, 'NEW': None, 'GOOD': '3000000'}, now=NOW).set_index('symbol')
+    assert updated.at['KNOWN', 'issued_shares'] == 2e6
+    assert updated.at['KNOWN', 'status'] == 'failed'
+    assert pd.isna(updated.at['NEW', 'issued_shares'])
+    assert updated.at['NEW', 'status'] == 'failed'
+    assert updated.at['GOOD', 'issued_shares'] == 3e6
+    assert updated.at['GOOD', 'fetched_at'] == NOW.isoformat(timespec='seconds')
+
+
+def test_market_cap_in_crore_and_last_close_carried():
+    closes = closes_frame([('INFY', 1490.0, 1500.5), ('NOSHARES', 10.0, 10.0)])
+    shares = shares_frame([
+        ('INFY', 4_150_000_000, 1490.0, '2026-10-17T00:00:00', 'ok'),
+        ('DELISTED', 1e6, 55.0, '2026-10-17T00:00:00', 'ok'),
+        ('NOSHARES', None, None, '2026-10-17T00:00:00', 'failed'),
+    ])
+    mktcap, shares = bulk_mktcap.compute_market_caps(['INFY', 'NOSHARES', 'DELISTED'], closes, shares)
+    assert mktcap.to_dict('records') == [{'symbol': 'INFY', 'market_cap': 622707.5}]
+    assert shares.set_index('symbol')['last_close'].to_dict() == {'INFY': 1500.5, 'DELISTED': 55.0, 'NOSHARES': 10.0}
+
+
+def test_shares_round_trip(tmp_path):
+    shares_file = str(tmp_path / "issued_shares.csv")
+    assert bulk_mktcap.load_shares(shares_file).empty
+    shares = bulk_mktcap.update_shares(bulk_mktcap.load_shares(shares_file), {'INFY': 4.15e9}, now=NOW)
+    bulk_mktcap.save_shares(shares, shares_file)
+    loaded = bulk_mktcap.load_shares(shares_file)
+    assert loaded['symbol'].tolist() == ['INFY']
+    assert loaded['issued_shares'].tolist() == [4.15e9]
@@ -0,0 +1,38 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import classification_cache
+
+NOW = datetime(2026, 10, 18)
+FULL = {'basic_industry': 'Private Sector Bank', 'industry': 'Banks', 'macro': 'Financial Services',
+        'sector': 'Financial Services'}
+
+
+def test_poorer_row_keeps_the_richer_entry():
+    cache = {}
+    classification_cache.record_result(cache, 'HDFCBANK', FULL, now=datetime(2026, 8, 1))
+    classification_cache.record_result(cache, 'HDFCBANK', {'sector': 'Financial Services'}, now=NOW,
+                                       source='index:ind_nifty500list')
+    assert cache['HDFCBANK']['basic_industry'] == 'Private Sector Bank'
+    assert cache['HDFCBANK']['source'] == 'quote-equity'
+    # Left expired, so quote-equity is asked again
+    assert classification_cache.symbols_to_fetch(['HDFCBANK'], cache, now=NOW) == ['HDFCBANK']
+
+
+def test_refresh_with_as_many_levels_replaces_the_entry():
+    cache = {}
+    classification_cache.record_result(cache, 'HDFCBANK', {'sector': 'Financial Services'}, now=datetime(2026, 8, 1))
+    classification_cache.record_result(cache, 'HDFCBANK', FULL, now=NOW)
+    assert cache['HDFCBANK']['industry'] == 'Banks'
+    assert classification_cache.symbols_to_fetch(['HDFCBANK'], cache, now=NOW) == []
+
+
+def test_failed_refresh_keeps_the_entry():
+    cache = {}
+    classification_cache.record_result(cache, 'HDFCBANK', FULL, now=datetime(2026, 8, 1))
+    classification_cache.record_result(cache, 'HDFCBANK', None, now=NOW)
+    assert cache['HDFCBANK']['status'] == 'ok'
+    assert cache['HDFCBANK']['fetched_at'] == '2026-08-01T00:00:00'
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import company_index
+
+
+@pytest.fixture
+def sources(monkeypatch):
+    """Stored insider history and constituent pairs that rebuild()/refresh() read."""
+    history = pd.DataFrame({'company': ['Tata Motors Limited', 'Infosys Limited'], 'symbol': ['TATAMOTORS', 'INFY']})
+    constituents = pd.DataFrame({'company_name': ['Infosys Ltd.', 'HDFC Bank Ltd.'], 'symbol': ['INFY', 'HDFCBANK']})
+    monkeypatch.setattr(company_index.storage, "dataset_exists", lambda name: name == 'insider')
+    monkeypatch.setattr(company_index.storage, "read_dataset", lambda name, columns=None: history)
+    monkeypatch.setattr(company_index.index_constituents, "company_pairs", lambda: constituents)
+    return history, constituents
+
+
+def test_missing_index_is_built_from_history_and_constituents(tmp_path, sources):
+    index_file = str(tmp_path / "company_symbols.csv")
+    company_index.refresh(pd.DataFrame({'company': ['Ravindra Energy Limited'], 'symbol': ['RELTD']}), index_file)
+
+    symbols = company_index.lookup(['TATA MOTORS LTD', 'HDFC Bank Limited', 'Infosys', 'Unknown Ltd'], index_file)
+    assert symbols.tolist() == ['TATAMOTORS', 'HDFCBANK', 'INFY', None]
+
+
+def test_existing_index_gets_new_filings_and_constituent_files(tmp_path, sources):
+    _, constituents = sources
+    index_file = str(tmp_path / "company_symbols.csv")
+    company_index.refresh(index_file=index_file)
+    constituents.loc[len(constituents)] = ['20 Microns Limited', '20MICRONS']
+
+    added = company_index.refresh(pd.DataFrame({'company': ['Ravindra Energy Limited'], 'symbol': ['RELTD']}), index_file)
+    assert added == 2
+    assert company_index.lookup(['Ravindra Energy Ltd.', '20 Microns Ltd'], index_file).tolist() == ['RELTD', '20MICRONS']
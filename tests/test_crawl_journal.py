@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawl_journal
+from crawl_journal import CrawlJournal, crawl
+
+
+def fetch_from(results, calls):
+    """fetch() answering from {symbol: [row or None per attempt]}, recording each call."""
+    def fetch(symbol):
+        calls.append(symbol)
+        return results[symbol].pop(0)
+    return fetch
+
+
+def test_resume_skips_journaled_symbols(tmp_path):
+    journal = CrawlJournal('test', data_dir=str(tmp_path))
+    crawl(['A', 'B'], fetch_from({'A': [{'v': 1}], 'B': [{'v': 2}]}, []), journal, retry_rounds=0)
+    journal.handle.close()
+
+    # Killed before finish(): the next run only fetches what is missing
+    calls = []
+    resumed = CrawlJournal('test', data_dir=str(tmp_path))
+    assert resumed.rows == {'A': {'v': 1}, 'B': {'v': 2}}
+    crawl(['A', 'B', 'C'], fetch_from({'C': [{'v': 3}]}, calls), resumed, retry_rounds=0)
+    assert calls == ['C']
+    resumed.finish(['A', 'B', 'C'])
+    assert not os.path.exists(resumed.journal_file)
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    journal = CrawlJournal('test', data_dir=str(tmp_path))
+    journal.record('A', {'v': 1})
+    journal.handle.write('{"symbol": "B", "sta')
+    journal.handle.close()
+    assert CrawlJournal('test', data_dir=str(tmp_path)).rows == {'A': {'v': 1}}
+
+
+def test_old_journal_is_discarded(tmp_path):
+    journal_file = tmp_path / "test_journal.jsonl"
+    started = datetime.now() - crawl_journal.JOURNAL_MAX_AGE - timedelta(hours=1)
+    with open(journal_file, "w") as f:
+        f.write(json.dumps({'started': started.isoformat(timespec='seconds')}) + "\n")
+        f.write(json.dumps({'symbol': 'A', 'status': 'ok', 'attempts': 1, 'row': {'v': 1}}) + "\n")
+    assert CrawlJournal('test', data_dir=str(tmp_path)).rows == {}
+
+
+def test_failures_are_retried_with_backoff(tmp_path, monkeypatch):
+    delays = []
+    monkeypatch.setattr(crawl_journal.nse_metrics, "sleep", lambda seconds, reason: delays.append(seconds))
+    journal = CrawlJournal('test', data_dir=str(tmp_path))
+    results = {'A': [None, None, {'v': 1}], 'B': [{'v': 2}]}
+    failed = crawl(['A', 'B'], fetch_from(results, []), journal, retry_rounds=3, backoff=10)
+    assert failed == []
+    assert delays == [10, 20]
+    assert journal.attempts == {'A': 3, 'B': 1}
+
+
+def test_exceptions_count_as_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr(crawl_journal.nse_metrics, "sleep", lambda seconds, reason: None)
+
+    def fetch(symbol):
+        raise ValueError("bad json")
+
+    journal = CrawlJournal('test', data_dir=str(tmp_path))
+    assert crawl(['A'], fetch, journal, retry_rounds=1) == ['A']
+    assert journal.errors['A'] == "ValueError: bad json"
+
+
+def test_still_failing_symbols_go_first_next_run(tmp_path):
+    journal = CrawlJournal('test', data_dir=str(tmp_path))
+    crawl(['A', 'B', 'C'], fetch_from({'A': [{'v': 1}], 'B': [{'v': 2}], 'C': [None]}, []), journal, retry_rounds=0)
+    journal.finish(['A', 'B', 'C'])
+    with open(journal.retry_file) as f:
+        assert json.load(f) == {'C': {'attempts': 1, 'error': None}}
+
+    calls = []
+    next_run = CrawlJournal('test', data_dir=str(tmp_path))
+    crawl(['A', 'B', 'C'], fetch_from({'A': [{'v': 1}], 'B': [{'v': 2}], 'C': [{'v': 3}]}, calls), next_run,
+          retry_rounds=0)
+    assert calls == ['C', 'A', 'B']
+    next_run.finish(['A', 'B', 'C'])
+    assert not os.path.exists(next_run.retry_file)
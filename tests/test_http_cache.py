@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_cache
+from http_cache import CachedResponse
+
+URL = "https://nsearchives.nseindia.com/products/content/sec_bhavdata_full_16102026.csv"
+BODY = b"SYMBOL, SERIES, CLOSE_PRICE\r\nINFY, EQ, 1500.5\r\nTCS, EQ, 3900"
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=b"", headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.encoding = None
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 8):
+            yield self.body[i:i + 8]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def close(self):
+        self.closed = True
+
+
+def fetch(cache_dir, response):
+    """What NseClient.get_cached() does, with the server's answer given."""
+    entry = http_cache.load_entry(URL, cache_dir)
+    return CachedResponse(URL, response, entry, cache_dir), http_cache.conditional_headers(entry)
+
+
+@pytest.fixture
+def cached(tmp_path):
+    response, _ = fetch(str(tmp_path), FakeResponse(200, BODY, {'ETag': '"v1"', 'Last-Modified': 'Fri, 16 Oct 2026 18:00:00 GMT'}))
+    assert response.content == BODY
+    response.commit()
+    return str(tmp_path)
+
+
+def test_first_fetch_stores_validators(cached):
+    _, headers = fetch(cached, FakeResponse())
+    assert headers['If-None-Match'] == '"v1"'
+    assert headers['If-Modified-Since'] == 'Fri, 16 Oct 2026 18:00:00 GMT'
+    assert 'gzip' in headers['Accept-Encoding']
+
+
+def test_not_modified_serves_the_cached_body(cached):
+    response, _ = fetch(cached, FakeResponse(304))
+    assert response.not_modified and response.unchanged
+    assert response.status_code == 200
+    assert list(response.iter_lines(decode_unicode=True)) == [
+        "SYMBOL, SERIES, CLOSE_PRICE", "INFY, EQ, 1500.5", "TCS, EQ, 3900"]
+    response.raise_for_status()
+
+
+def test_same_body_without_validators_is_unchanged_once_read(cached):
+    response, _ = fetch(cached, FakeResponse(200, BODY))
+    assert not response.unchanged
+    response.content
+    assert response.unchanged and not response.not_modified
+
+
+def test_changed_body_replaces_the_entry_on_commit(cached):
+    response, _ = fetch(cached, FakeResponse(200, BODY + b"\nSBIN, EQ, 800", {'ETag': '"v2"'}))
+    response.content
+    assert not response.unchanged
+    response.commit()
+    assert http_cache.load_entry(URL, cached)['etag'] == '"v2"'
+    assert fetch(cached, FakeResponse(304))[0].content == BODY + b"\nSBIN, EQ, 800"
+
+
+def test_discarded_response_leaves_the_entry_alone(cached):
+    response, _ = fetch(cached, FakeResponse(200, b"partial", {'ETag': '"v3"'}))
+    response.content
+    response.discard()
+    assert http_cache.load_entry(URL, cached)['etag'] == '"v1"'
+    assert not [name for name in os.listdir(cached) if name.endswith(".tmp")]
+
+
+def test_304_without_an_entry_is_not_served_from_cache(tmp_path):
+    response, headers = fetch(str(tmp_path), FakeResponse(304))
+    assert 'If-None-Match' not in headers
+    assert not response.not_modified and response.status_code == 304
+
+
+def test_prune_removes_stale_entries(cached):
+    old = time.time() - (http_cache.MAX_AGE_DAYS + 1) * 86400
+    meta_path, body_path = http_cache.entry_paths(URL, cached)
+    assert http_cache.prune(cache_dir=cached) == 0
+    os.utime(meta_path, (old, old))
+    assert http_cache.prune(cache_dir=cached) == 1
+    assert not os.path.exists(meta_path) and not os.path.exists(body_path)
+    assert http_cache.load_entry(URL, cached) is None
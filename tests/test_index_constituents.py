@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import index_constituents
+
+
+def write_nifty500(constituents_dir):
+    with open(os.path.join(constituents_dir, "ind_nifty500list.csv"), "w") as f:
+        f.write("Company Name,Industry,Symbol,Series,ISIN Code\n")
+        f.write("Infosys Ltd.,Information Technology,INFY,EQ,INE009A01021\n")
+
+
+def test_classify_no_symbols(tmp_path):
+    # Warm classification cache: nothing stale, so nothing to classify
+    write_nifty500(tmp_path)
+    assert index_constituents.classify([], str(tmp_path)) == []
+
+
+def test_classify_no_constituent_files(tmp_path):
+    assert index_constituents.classify(['INFY', 'TCS'], str(tmp_path)) == []
+    assert index_constituents.classify([], str(tmp_path)) == []
+
+
+def write_full_levels(constituents_dir):
+    with open(os.path.join(constituents_dir, "nifty_classified.csv"), "w") as f:
+        f.write("Symbol,Macro,Sector,Industry,Basic Industry\n")
+        f.write("TCS,Information Technology,Information Technology,IT - Software,Computers - Software & Consulting\n")
+        f.write("HDFCBANK,Financial Services,Financial Services,Banks,\n")
+
+
+def test_classify_matches_in_input_order(tmp_path):
+    write_full_levels(tmp_path)
+    rows = index_constituents.classify(['WIPRO', 'TCS'], str(tmp_path))
+    assert rows == [{'symbol': 'TCS', 'basic_industry': 'Computers - Software & Consulting', 'industry': 'IT - Software',
+                     'macro': 'Information Technology', 'sector': 'Information Technology',
+                     'source': 'index:nifty_classified'}]
+
+
+def test_classify_skips_partial_rows(tmp_path):
+    # Sector-only (standard NSE layout) and rows missing a level are left to quote-equity
+    write_nifty500(tmp_path)
+    write_full_levels(tmp_path)
+    assert index_constituents.classify(['INFY', 'HDFCBANK'], str(tmp_path)) == []
+    assert index_constituents.load_constituents(str(tmp_path)).set_index('symbol').loc['INFY', 'sector'] == 'Information Technology'
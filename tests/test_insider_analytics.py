@@ -0,0 +1,87 @@
+import os
+import sqlite3
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import insider_analytics
+from ingest import INSIDER_SCHEMA, build_frame
+
+AS_OF = date(2026, 5, 4)
+
+
+def row(pid, side, quantity, value, category='Promoters', mode='Market Purchase', symbol='MWL', day='30-Apr-2026'):
+    # Shaped like corporates-pit: the buy/sell fields are 0 and the figures are in secAcq/secVal
+    return {'symbol': symbol, 'pid': pid, 'buyValue': '0', 'sellValue': '0', 'buyQuantity': '0', 'sellquantity': '0',
+            'secAcq': str(quantity), 'secVal': str(value), 'tdpTransactionType': side, 'personCategory': category,
+            'acqMode': mode, 'acqfromDt': day, 'acqtoDt': day, 'intimDt': day}
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / "nse.db")
+
+
+def test_zero_buy_sell_fields_fall_back_to_secval():
+    facts = insider_analytics.to_facts(build_frame([
+        row(1, 'Buy', 100, 1000.0),
+        row(2, 'Sell', 50, 700.0),
+        row(3, 'Pledge', 2212300, 682347220.0, mode='Pledge Creation'),
+    ], INSIDER_SCHEMA))
+    assert facts['buy_value'].tolist() == [1000.0, 0.0, 0.0]
+    assert facts['sell_value'].tolist() == [0.0, 700.0, 0.0]
+    assert facts['buy_quantity'].tolist() == [100.0, 0.0, 0.0]
+    assert facts['sell_quantity'].tolist() == [0.0, 50.0, 0.0]
+    assert facts['pledge_created'].tolist() == [0, 0, 1]
+
+
+def test_reported_buy_value_wins_over_secval():
+    record = row(1, 'Buy', 100, 1000.0)
+    record.update(buyValue='1200', buyQuantity='120')
+    facts = insider_analytics.to_facts(build_frame([record], INSIDER_SCHEMA))
+    assert facts[['buy_value', 'buy_quantity']].values.tolist() == [[1200.0, 120.0]]
+
+
+def test_every_transaction_of_a_filing_is_counted(db_file):
+    insider_df = build_frame([
+        row(7, 'Buy', 4204, 5315538.0),
+        row(7, 'Buy', 3651, 4616324.0),
+        row(7, 'Sell', 70395, 89007438.0),
+        row(8, 'Buy', 100, 1000.0, category='Director'),
+    ], INSIDER_SCHEMA)
+    assert insider_analytics.rebuild(insider_df, db_file) == 4
+
+    summary = insider_analytics.window_summary(30, 'promoter', as_of=AS_OF, db_file=db_file)
+    assert summary[['symbol', 'filings', 'buy_value', 'sell_value', 'net_quantity']].values.tolist() == [
+        ['MWL', 1, 5315538.0 + 4616324.0, 89007438.0, 4204 + 3651 - 70395]]
+
+
+def test_revised_filing_replaces_all_of_its_transactions(db_file):
+    insider_analytics.update(build_frame([row(7, 'Buy', 10, 100.0), row(7, 'Buy', 20, 200.0),
+                                          row(7, 'Buy', 30, 300.0)], INSIDER_SCHEMA), db_file)
+    insider_analytics.update(build_frame([row(7, 'Buy', 15, 150.0)], INSIDER_SCHEMA), db_file)
+
+    summary = insider_analytics.window_summary(30, as_of=AS_OF, db_file=db_file)
+    assert summary[['filings', 'buy_value', 'net_quantity']].values.tolist() == [[1, 150.0, 15.0]]
+
+
+def test_facts_keyed_by_pid_alone_are_rebuilt(db_file, monkeypatch):
+    conn = sqlite3.connect(db_file)
+    conn.executescript("""
+        CREATE TABLE insider_facts (pid INTEGER PRIMARY KEY, symbol TEXT, day TEXT, person_group TEXT,
+            buy_value REAL, sell_value REAL, buy_quantity REAL, sell_quantity REAL,
+            pledge_created INTEGER, pledge_revoked INTEGER, pledge_invoked INTEGER);
+    """)
+    conn.close()
+    stored = build_frame([row(1, 'Buy', 10, 100.0), row(1, 'Buy', 20, 200.0), row(2, 'Sell', 5, 50.0)],
+                         INSIDER_SCHEMA)
+    monkeypatch.setattr(insider_analytics.storage, "read_dataset", lambda name: stored)
+
+    assert insider_analytics.facts_outdated(db_file)
+    assert insider_analytics.update(stored.iloc[2:], db_file) == 3
+    assert not insider_analytics.facts_outdated(db_file)
+    summary = insider_analytics.window_summary(30, as_of=AS_OF, db_file=db_file)
+    assert summary[['buy_value', 'sell_value']].values.tolist() == [[300.0, 50.0]]
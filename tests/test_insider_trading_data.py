@@ -0,0 +1,76 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("requests")
+
+import insider_trading_data
+from ingest import INSIDER_SCHEMA, build_frame
+
+
+def filing(pid, sec_type, acq_mode):
+    return {'pid': pid, 'symbol': 'INFY', 'secType': sec_type, 'acqMode': acq_mode, 'buyValue': '100'}
+
+
+def test_merge_keeps_categoricals():
+    existing = build_frame([filing(1, 'Equity Shares', 'Market Purchase'), filing(2, 'Equity Shares', 'ESOP')],
+                           INSIDER_SCHEMA)
+    new = build_frame([filing(2, 'Warrants', 'Market Sale'), filing(3, 'Equity Shares', 'Market Purchase')],
+                      INSIDER_SCHEMA)
+
+    merged = insider_trading_data.merge_by_pid(existing, new)
+    assert merged['pid'].tolist() == [3, 2, 1]
+    assert merged['secType'].tolist() == ['Equity Shares', 'Warrants', 'Equity Shares']
+    for column in INSIDER_SCHEMA['categorical']:
+        assert merged[column].dtype == 'category', column
+
+
+def test_disclosures_with_several_transactions_keep_every_row():
+    existing = build_frame([filing(1, 'Equity Shares', 'ESOP'),
+                            filing(2, 'Equity Shares', 'Market Purchase'),
+                            filing(2, 'Equity Shares', 'Market Sale')], INSIDER_SCHEMA)
+    # pid 2 re-fetched with a revised set of rows, pid 3 new with three transactions
+    new = build_frame([filing(3, 'Equity Shares', 'Market Purchase'),
+                       filing(3, 'Equity Shares', 'Market Purchase'),
+                       filing(3, 'Equity Shares', 'Market Sale'),
+                       filing(2, 'Warrants', 'Market Sale')], INSIDER_SCHEMA)
+
+    merged = insider_trading_data.merge_by_pid(existing, new)
+    assert merged['pid'].tolist() == [3, 3, 3, 2, 1]
+    assert merged['acqMode'].tolist() == ['Market Purchase', 'Market Purchase', 'Market Sale', 'Market Sale', 'ESOP']
+    assert merged.loc[merged['pid'] == 2, 'secType'].tolist() == ['Warrants']
+
+    first_run = insider_trading_data.merge_by_pid(new.iloc[0:0], new)
+    assert len(first_run) == len(new)
+
+
+def test_cache_entry_survives_the_window_end_moving():
+    class NotModified:
+        not_modified = True
+
+        def raise_for_status(self):
+            pass
+
+        def close(self):
+            pass
+
+    class Client:
+        def __init__(self):
+            self.cache_urls = []
+
+        def get_cached(self, url, referer=None, timeout=10, cache_url=None):
+            assert url.endswith(f"to_date={end:%d-%m-%Y}")
+            self.cache_urls.append(cache_url)
+            return NotModified()
+
+    client = Client()
+    start = date(2026, 10, 14)
+    for end in (date(2026, 10, 16), date(2026, 10, 19)):
+        frame, _ = insider_trading_data.get_data(client, start, end, batch_size=100, cached=True)
+        assert frame.empty
+    assert client.cache_urls[0] == client.cache_urls[1]
+    assert "to_date" not in client.cache_urls[0]
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_stream
+
+DOCUMENT = {
+    'meta': {'count': 3, 'note': 'ignored [not the array]'},
+    'data': [
+        {'comName': 'Ålpha Limited', 'percPromoterShares': 12.5, 'totPromoterShares': 1234567890},
+        {'comName': 'Beta "Quoted" Ltd', 'percPromoterShares': None, 'flags': [1, 2, {'x': True}]},
+        {'comName': 'Gamma', 'percPromoterShares': -0.25e2},
+    ],
+    'after': 'also ignored',
+}
+
+DECODERS = ['fallback'] + (['ijson'] if json_stream.ijson is not None else [])
+
+
+@pytest.fixture(params=DECODERS)
+def decoder(request, monkeypatch):
+    if request.param == 'fallback':
+        monkeypatch.setattr(json_stream, "ijson", None)
+    return request.param
+
+
+def chunked(document, size):
+    body = json.dumps(document, ensure_ascii=False).encode()
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 1 << 20])
+def test_records_survive_any_chunking(decoder, size):
+    # Size 1 splits numbers, literals and multi-byte UTF-8 characters across chunks
+    assert list(json_stream.iter_array_items(chunked(DOCUMENT, size))) == DOCUMENT['data']
+
+
+def test_empty_chunks_are_not_end_of_input(decoder):
+    chunks = [b'', *(c for chunk in chunked(DOCUMENT, 16) for c in (chunk, b''))]
+    assert list(json_stream.iter_array_items(chunks)) == DOCUMENT['data']
+
+
+def test_other_key(decoder):
+    document = {'data': [1], 'acqNameList': [{'a': 1}, {'a': 2}]}
+    assert list(json_stream.iter_array_items(chunked(document, 5), key='acqNameList')) == [{'a': 1}, {'a': 2}]
+
+
+@pytest.mark.parametrize("document", [{}, {'meta': 1}, {'data': []}])
+def test_missing_or_empty_array(decoder, document):
+    assert list(json_stream.iter_array_items(chunked(document, 3))) == []
+
+
+def test_records_are_yielded_before_the_body_ends(decoder):
+    def chunks():
+        yield b'{"data": [{"a": 1}, '
+        raise AssertionError("read past the first record")
+
+    assert next(json_stream.iter_array_items(chunks())) == {'a': 1}
+
+
+def test_fallback_rejects_malformed_input(monkeypatch):
+    monkeypatch.setattr(json_stream, "ijson", None)
+    with pytest.raises(ValueError):
+        list(json_stream.iter_array_items([b'{"data": [{"a": 1} {"a": 2}]}']))
+
+
+def test_iter_records_drains_and_closes_the_response():
+    class Response:
+        closed = False
+        read = []
+
+        def iter_content(self, size):
+            for chunk in chunked(DOCUMENT, 16):
+                self.read.append(chunk)
+                yield chunk
+
+        def close(self):
+            self.closed = True
+
+    response = Response()
+    assert list(json_stream.iter_records(response)) == DOCUMENT['data']
+    assert b''.join(response.read) == b''.join(chunked(DOCUMENT, 16))
+    assert response.closed
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("requests")
+
+import nse_client
+from rate_limiter import AdaptiveRateLimiter
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = AdaptiveRateLimiter(max_rps=8.0, initial_rps=1.0)
+    monkeypatch.setattr(nse_client, "_global_limiter", limiter)
+    return limiter
+
+
+def client_answering(tmp_path, statuses, rewarm_ok=True):
+    client = nse_client.NseClient(cookie_file=str(tmp_path / "cookies.json"))
+    client.expires_at = time.time() + 3600
+    answers = iter(statuses)
+    client.send = lambda url, headers, timeout, retry=False, **kwargs: FakeResponse(next(answers))
+    client.warm_up = lambda force=False, seen_generation=None: rewarm_ok or not force
+    return client
+
+
+@pytest.mark.parametrize("status", [200, 304])
+def test_success_speeds_the_limiter_up(tmp_path, limiter, status):
+    assert client_answering(tmp_path, [status]).get("https://example.test/api").status_code == status
+    assert limiter.rate > 1.0
+
+
+@pytest.mark.parametrize("status", [401, 404])
+def test_failed_rewarm_does_not_speed_the_limiter_up(tmp_path, limiter, status):
+    client = client_answering(tmp_path, [status, status], rewarm_ok=False)
+    assert client.get("https://example.test/api").status_code == status
+    assert limiter.rate == 1.0
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import company_index
+import nse_db
+
+
+def test_pledge_join_uses_the_normalised_name(tmp_path):
+    db_file = str(tmp_path / "nse.db")
+    index_file = str(tmp_path / "company_symbols.csv")
+    company_index.update(pd.DataFrame({'company_name': ['Tata Motors Limited'], 'symbol': ['TATAMOTORS']}),
+                         'insider', index_file)
+    nse_db.write_table(pd.DataFrame({
+        'symbol': ['TATAMOTORS', 'INFY'], 'company': ['Tata Motors Limited', 'Infosys Limited'],
+        'pid': [2, 1], 'intimDt': ['2026-10-17', '2026-10-16'], 'personCategory': ['Promoters', 'Director'],
+    }), 'insider', db_file)
+    for table in ('stkdata', 'mktcap'):
+        nse_db.write_table(pd.DataFrame({'symbol': ['TATAMOTORS'], 'sector': ['Automobile'], 'industry': ['Cars'],
+                                         'market_cap': [1.0]}), table, db_file)
+    # Spelled three ways across snapshots, none of them like the insider filing
+    nse_db.write_table(pd.DataFrame({
+        'company_name': ['TATA MOTORS LTD', 'Tata Motors Ltd.', 'Tata  Motors Limited', 'Unlisted Limited'],
+        'total_promoter_holding_pct': [46.0, 46.0, 46.0, 50.0],
+        'promoter_shares_encumbered': [10.0, 20.0, 30.0, 1.0],
+        'promoter_shares_encumbered_pct': [1.0, 2.0, 3.0, 5.0],
+        'snapshot_date': ['2026-10-15', '2026-10-17', '2026-10-16', '2026-10-17'],
+    }), 'pledge', db_file)
+
+    trades = nse_db.insider_trades_with_pledge(db_file=db_file, index_file=index_file)
+    assert trades['symbol'].tolist() == ['TATAMOTORS', 'INFY']
+    assert trades.loc[0, ['pledge_pct', 'previous_pledge_pct', 'pledge_date']].tolist() == [2.0, 3.0, '2026-10-17']
+    assert trades.loc[1, ['pledge_pct', 'previous_pledge_pct', 'pledge_date']].isna().all()
+
+    rising = nse_db.insider_trades_with_pledge(rising_pledge_only=True, db_file=db_file, index_file=index_file)
+    assert rising.empty
@@ -0,0 +1,94 @@
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pledge_diff
+import pledge_store
+
+
+@pytest.fixture(autouse=True)
+def csv_only(monkeypatch):
+    monkeypatch.setenv("NSE_STORAGE_FORMATS", "csv")
+
+
+def pledge_day(name, encumbered_pct):
+    return pd.DataFrame({
+        'company_name': [name],
+        'total_promoter_holding_pct': [50.0],
+        'promoter_shares_encumbered': [100.0],
+        'promoter_shares_encumbered_pct': [encumbered_pct],
+    })
+
+
+def test_name_spellings_are_one_company(tmp_path):
+    index_file = str(tmp_path / "pledge_hashes.idx")
+    assert len(pledge_store.append_snapshot(pledge_day('Tata Motors Ltd.', 1.0), date(2026, 10, 16), str(tmp_path), index_file)) == 1
+    assert len(pledge_store.append_snapshot(pledge_day('TATA MOTORS LIMITED', 1.0), date(2026, 10, 17), str(tmp_path), index_file)) == 0
+    assert len(pledge_store.append_snapshot(pledge_day('TATA MOTORS LIMITED', 2.0), date(2026, 10, 18), str(tmp_path), index_file)) == 1
+
+
+def test_store_and_diff_share_the_key():
+    day = pd.concat([pledge_day('Tata Motors Ltd.', 1.0), pledge_day('M&M Financial Services Limited', 0.0)])
+    assert pledge_diff.keyed(day)['name_key'].tolist() == pledge_store.company_keys(day).tolist()
+
+
+def test_index_in_an_older_format_is_rebuilt(tmp_path):
+    index_file = str(tmp_path / "pledge_hashes.idx")
+    pledge_store.append_snapshot(pledge_day('Tata Motors Ltd.', 1.0), date(2026, 10, 16), str(tmp_path), index_file)
+    latest = pledge_store.load_index(str(tmp_path), index_file)
+
+    with open(index_file, "w") as f:
+        f.write("0123456789abcdef\tTata Motors Ltd.\n")
+    assert pledge_store.load_index(str(tmp_path), index_file) == latest
+    with open(index_file) as f:
+        assert f.readline().rstrip("\n") == pledge_store.INDEX_HEADER
+
+
+def test_diff_compares_against_the_stored_hashes(tmp_path):
+    latest_file = str(tmp_path / "pledge_latest.csv")
+    latest = pledge_diff.keyed(pledge_day('Tata Motors Ltd.', 1.0))
+    latest['snapshot_date'] = '2026-10-17'
+    # The stored hash is trusted, so figures that no longer match it go unnoticed
+    latest['promoter_shares_encumbered_pct'] = 9.0
+    pledge_diff.save_latest(latest, latest_file)
+
+    assert pledge_diff.diff_snapshot(pledge_day('Tata Motors Ltd.', 1.0), date(2026, 10, 18), latest_file).empty
+
+
+def test_latest_in_an_older_format_is_rehashed_once(tmp_path):
+    latest_file = str(tmp_path / "pledge_latest.csv")
+    latest = pledge_diff.keyed(pledge_day('Tata Motors Ltd.', 1.0))
+    latest['row_hash'] = '0123456789abcdef'
+    latest['snapshot_date'] = '2026-10-17'
+    latest[pledge_diff.LATEST_COLUMNS].to_csv(latest_file, index=False)
+
+    assert pledge_diff.diff_snapshot(pledge_day('Tata Motors Ltd.', 1.0), date(2026, 10, 18), latest_file).empty
+    with open(latest_file) as f:
+        assert f.readline().rstrip("\n") == pledge_diff.LATEST_HEADER
+    latest, stored = pledge_diff.load_latest('2026-10-19', latest_file)
+    assert stored
+    assert latest['row_hash'].tolist() == pledge_diff.keyed(pledge_day('Tata Motors Ltd.', 1.0))['row_hash'].tolist()
+
+
+def test_index_keeps_one_line_per_company(tmp_path):
+    index_file = str(tmp_path / "pledge_hashes.idx")
+    for day, pct in enumerate([1.0, 2.0, 3.0, 1.0], start=15):
+        pledge_store.append_snapshot(pledge_day('Tata Motors Ltd.', pct), date(2026, 10, day), str(tmp_path), index_file)
+    with open(index_file) as f:
+        lines = f.read().splitlines()
+    assert lines == [pledge_store.INDEX_HEADER, f"{pledge_store.row_hashes(pledge_day('Tata Motors Ltd.', 1.0))[0]}\ttata motors"]
+
+
+def test_index_with_a_line_per_row_is_compacted(tmp_path):
+    index_file = str(tmp_path / "pledge_hashes.idx")
+    with open(index_file, "w") as f:
+        f.write(pledge_store.INDEX_HEADER + "\n")
+        f.write("0000000000000001\ttata motors\n0000000000000002\ttata motors\n")
+    assert pledge_store.load_index(str(tmp_path), index_file) == {'tata motors': '0000000000000002'}
+    with open(index_file) as f:
+        assert f.read().splitlines()[1:] == ["0000000000000002\ttata motors"]
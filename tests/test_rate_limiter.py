@@ -0,0 +1,90 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nse_metrics
+import rate_limiter
+from rate_limiter import AdaptiveRateLimiter, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock that advances only when the limiter sleeps."""
+    now = [1000.0]
+    sleeps = []
+
+    def sleep(seconds, reason):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(rate_limiter.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(nse_metrics, "sleep", sleep)
+    return now, sleeps
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("-5") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("soon") is None
+
+
+def test_parse_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=60)
+    assert 55 <= parse_retry_after(format_datetime(retry_at, usegmt=True)) <= 60
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    # RFC 2822 "-0000" dates parse to a naive datetime
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 -0000") == 0.0
+
+
+def test_wait_spaces_requests_at_the_rate(clock):
+    now, sleeps = clock
+    limiter = AdaptiveRateLimiter(max_rps=4.0, initial_rps=2.0)
+    for _ in range(3):
+        limiter.wait()
+    assert sleeps == [0.5, 0.5]
+
+
+def test_additive_increase_up_to_the_ceiling(clock):
+    limiter = AdaptiveRateLimiter(max_rps=2.0, initial_rps=1.0, increase=0.5)
+    limiter.on_success()
+    assert limiter.rate == pytest.approx(1.5)
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.rate == 2.0
+
+
+def test_throttle_halves_once_per_burst_with_a_floor(clock):
+    now, _ = clock
+    limiter = AdaptiveRateLimiter(max_rps=8.0, initial_rps=4.0, min_rps=0.5)
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 2.0
+    for _ in range(5):
+        now[0] += 10
+        limiter.on_throttle()
+    assert limiter.rate == 0.5
+
+
+def test_retry_after_holds_the_next_request(clock):
+    now, sleeps = clock
+    limiter = AdaptiveRateLimiter(max_rps=8.0, initial_rps=4.0)
+    limiter.wait()
+    limiter.on_throttle(retry_after=30)
+    limiter.wait()
+    assert sleeps == [30.0]
+
+
+def test_cap_lowers_rate_and_ceiling(clock):
+    limiter = AdaptiveRateLimiter(max_rps=8.0, initial_rps=4.0, min_rps=2.0)
+    limiter.cap(1.0)
+    assert limiter.rate == 1.0
+    assert limiter.min_rps == 1.0
+    limiter.on_success()
+    assert limiter.rate == 1.0
@@ -0,0 +1,87 @@
+import os
+import sys
+import functools
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crawl_journal
+import nse_client
+import shard_crawl
+from rate_limiter import AdaptiveRateLimiter
+
+SYMBOLS = [f"SYM{i}" for i in range(2000)]
+
+
+class FakeClient:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+    def close(self):
+        pass
+
+
+def fetch_with_suffix(symbol, client, suffix=""):
+    return {'symbol': symbol + suffix}
+
+
+@pytest.fixture
+def shard_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(shard_crawl, "CrawlJournal", functools.partial(crawl_journal.CrawlJournal, data_dir=str(tmp_path)))
+    monkeypatch.setattr(shard_crawl, "NseClient", FakeClient)
+    monkeypatch.setattr(nse_client, "_global_limiter", AdaptiveRateLimiter(max_rps=8.0))
+    monkeypatch.setattr(shard_crawl.nse_metrics, "flush", lambda label=None: None)
+    return tmp_path
+
+
+def test_shard_of_is_stable():
+    # Pinned: the assignment must not change between runs, processes or machines
+    assert [shard_crawl.shard_of(s, 4) for s in ['INFY', 'TCS', 'RELIANCE', 'HDFCBANK', 'SBIN', 'ITC']] == [3, 2, 1, 1, 0, 1]
+    assert all(shard_crawl.shard_of(s, 1) == 0 for s in SYMBOLS[:50])
+
+
+def test_adding_a_shard_only_moves_symbols_to_it():
+    moved = 0
+    for symbol in SYMBOLS:
+        before, after = shard_crawl.shard_of(symbol, 4), shard_crawl.shard_of(symbol, 5)
+        assert after in (before, 4)
+        moved += after != before
+    assert 0.15 < moved / len(SYMBOLS) < 0.25
+
+
+def test_split_partitions_in_input_order():
+    assignment = shard_crawl.split(SYMBOLS[:100], 3)
+    assert sorted(s for shard in assignment.values() for s in shard) == sorted(SYMBOLS[:100])
+    for shard, symbols in assignment.items():
+        assert symbols == [s for s in SYMBOLS[:100] if shard_crawl.shard_of(s, 3) == shard]
+
+
+def test_shards_merge_into_one_journal(shard_dir):
+    symbols = SYMBOLS[:30]
+    for shard in range(3):
+        failed = shard_crawl.run_shard('test', 'test_shard_crawl:fetch_with_suffix', symbols, shard, 3,
+                                       retry_rounds=0, fetch_args=('-x',))
+        assert failed == 0
+
+    merged = shard_crawl.ShardSet('test', 3)
+    assert merged.rows == {symbol: {'symbol': symbol + '-x'} for symbol in symbols}
+    merged.finish(symbols)
+    assert not any(name.endswith("_journal.jsonl") for name in os.listdir(shard_dir))
+
+
+@pytest.mark.parametrize("rps, ceiling, proxies, expected", [
+    (3.0, 8.0, None, 1.0),          # --rps split over the shards
+    (3.0, 1.5, None, 0.5),          # auto_run's share of the budget is lower than --rps
+    (4.0, 8.0, ['http://p1', 'http://p2', 'http://p3'], 8.0 / 3),
+    (4.0, 1.5, ['http://p1', 'http://p2', 'http://p3'], 0.5),
+])
+def test_shards_split_the_process_budget(monkeypatch, rps, ceiling, proxies, expected):
+    monkeypatch.setattr(nse_client, "_global_limiter", AdaptiveRateLimiter(max_rps=ceiling))
+    assert shard_crawl.shard_rps(rps, 3, proxies) == pytest.approx(expected)
+
+
+def test_shard_limiter_is_capped_at_its_share(shard_dir):
+    shard_crawl.run_shard('test', 'test_shard_crawl:fetch_with_suffix', SYMBOLS[:5], 0, 3, rps=0.5, retry_rounds=0)
+    assert nse_client.global_limiter().max_rps == 0.5
+    assert nse_client.global_limiter().rate <= 0.5
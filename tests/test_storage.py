@@ -0,0 +1,85 @@
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("pyarrow")
+
+import storage
+import pledge_store
+from ingest import INSIDER_XBRL_SCHEMA, PLEDGE_CHANGES_SCHEMA
+
+
+@pytest.fixture
+def parquet_formats(monkeypatch):
+    monkeypatch.setenv("NSE_STORAGE_FORMATS", "csv,parquet")
+
+
+def pledge_day(encumbered_pct):
+    return pd.DataFrame({
+        'company_name': ['Alpha Limited', 'Beta Limited'],
+        'total_promoter_holding_pct': [50.0, 60.0],
+        'promoter_shares_encumbered': [0.0, 100.0],
+        'promoter_shares_encumbered_pct': [0.0, encumbered_pct],
+    })
+
+
+def test_pledge_appends_on_legacy_history(tmp_path, parquet_formats):
+    # pledge.csv written before snapshots were dated
+    pledge_day(1.0).to_csv(tmp_path / "pledge.csv", index=False)
+    index_file = str(tmp_path / "pledge_hashes.idx")
+
+    pledge_store.append_snapshot(pledge_day(2.0), date(2026, 10, 17), str(tmp_path), index_file)
+    pledge_store.append_snapshot(pledge_day(3.0), date(2026, 10, 18), str(tmp_path), index_file)
+
+    assert len(os.listdir(tmp_path / "pledge.parquet")) == 3
+    history = storage.read_dataset('pledge', data_dir=str(tmp_path))
+    assert history['snapshot_date'].tolist() == [None, None, '2026-10-17', '2026-10-18']
+    assert history['promoter_shares_encumbered_pct'].tolist() == [0.0, 1.0, 2.0, 3.0]
+
+    recent = storage.read_dataset('pledge', filters=[('snapshot_date', '>=', '2026-10-18')], data_dir=str(tmp_path))
+    assert recent['company_name'].tolist() == ['Beta Limited']
+
+
+def test_empty_column_then_strings(tmp_path, parquet_formats):
+    columns = INSIDER_XBRL_SCHEMA['columns']
+    first = pd.DataFrame([{'pid': 1}], columns=columns)
+    second = pd.DataFrame([{'pid': 2, 'xbrl_isin': 'INE009A01021', 'xbrl_value': '7000000'}], columns=columns)
+    storage.append_dataset(first, 'insider_xbrl', data_dir=str(tmp_path))
+    storage.append_dataset(second, 'insider_xbrl', data_dir=str(tmp_path))
+
+    df = storage.read_dataset('insider_xbrl', columns=['pid', 'xbrl_isin'], fmt='parquet', data_dir=str(tmp_path))
+    assert df['pid'].tolist() == [1, 2]
+    assert df['xbrl_isin'].tolist() == [None, 'INE009A01021']
+
+
+def test_parquet_round_trip_keeps_declared_types(tmp_path, parquet_formats):
+    row = dict.fromkeys(PLEDGE_CHANGES_SCHEMA['columns'])
+    row.update(snapshot_date='2026-10-18', change='new', company_name='Alpha Limited',
+               promoter_shares_encumbered_pct=2.0)
+    storage.append_dataset(pd.DataFrame([row]), 'pledge_changes', data_dir=str(tmp_path))
+    row.update(change='changed', symbol='ALPHA', promoter_shares_encumbered_pct=3)
+    storage.append_dataset(pd.DataFrame([row]), 'pledge_changes', data_dir=str(tmp_path))
+
+    parquet_df = storage.read_dataset('pledge_changes', fmt='parquet', data_dir=str(tmp_path))
+    csv_df = storage.read_dataset('pledge_changes', fmt='csv', data_dir=str(tmp_path))
+    assert parquet_df['symbol'].tolist() == [None, 'ALPHA']
+    assert parquet_df['promoter_shares_encumbered_pct'].dtype == 'float64'
+    pd.testing.assert_frame_equal(parquet_df, csv_df, check_dtype=False)
+
+
+def test_parts_written_before_schema_was_pinned(tmp_path, parquet_formats):
+    os.makedirs(tmp_path / "pledge.parquet")
+    legacy = pledge_day(1.0)
+    legacy['snapshot_date'] = float('nan')
+    legacy.to_parquet(tmp_path / "pledge.parquet" / "part-00000000T000000.parquet", index=False)
+    dated = pledge_day(2.0)
+    dated['snapshot_date'] = '2026-10-18'
+    storage.append_dataset(dated, 'pledge', formats=['parquet'], data_dir=str(tmp_path))
+
+    history = storage.read_dataset('pledge', fmt='parquet', data_dir=str(tmp_path))
+    assert history['snapshot_date'].tolist() == [None, None, '2026-10-18', '2026-10-18']
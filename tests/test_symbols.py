@@ -0,0 +1,27 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("requests")
+
+import Symbols
+
+
+def test_candidate_dates_skip_weekends_and_holidays(tmp_path, monkeypatch):
+    holidays_file = tmp_path / os.path.basename(Symbols.HOLIDAYS_FILE)
+    holidays_file.write_text("15-10-2026\n2026-10-13\n\n")
+    holidays = Symbols.load_holidays(str(holidays_file))
+    assert holidays == {date(2026, 10, 15), date(2026, 10, 13)}
+
+    monkeypatch.setattr(Symbols, "load_holidays", lambda: holidays)
+    # 2026-10-18 is a Sunday
+    assert Symbols.candidate_dates(date(2026, 10, 18), lookback_days=6) == [
+        date(2026, 10, 16), date(2026, 10, 14), date(2026, 10, 12)]
+
+
+def test_holidays_file_survives_the_auto_run_cleanup():
+    assert not Symbols.HOLIDAYS_FILE.endswith((".txt", ".log"))
@@ -0,0 +1,184 @@
+import os
+import csv
+import gzip
+import hashlib
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+
+from nse_client import NseClient, configure_logging, limit_rate, log_and_print
+from nse_config import ARCHIVES_URL, DATA_DIR
+import storage
+from ingest import INSIDER_XBRL_SCHEMA
+
+# XBRL enrichment of insider filings.
+#
+# Every insider.csv row links to the full disclosure as an XBRL document on
+# nsearchives. Filings are downloaded concurrently (paced by the shared
+# limiter) into a content-addressed cache: the gzipped body is stored once
+# under its SHA-256 in xbrl_cache/objects/, and xbrl_cache/index.csv maps
+# each pid to its hash, so a filing is downloaded only once and re-runs only
+# fetch new pids. Cached filings are parsed with iterparse, keeping just the
+# XBRL_FIELDS values, and written to the insider_xbrl dataset keyed by pid
+# (join it to insider on pid).
+#
+# The fields are kept out of insider.csv on purpose: insider_trading_data.py
+# rewrites that file from the corporates-pit columns on every run, and most
+# filings are only parsed on a later run (downloads are capped per night), so
+# merged columns would either be dropped or sit empty for recent rows. A
+# pid-keyed side dataset can only grow and leaves the insider.csv layout
+# unchanged for the spreadsheet users.
+
+CACHE_DIR = os.path.join(DATA_DIR, "xbrl_cache")
+OBJECTS_DIR = os.path.join(CACHE_DIR, "objects")
+INDEX_FILE = os.path.join(CACHE_DIR, "index.csv")
+INDEX_COLUMNS = ['pid', 'sha256', 'url', 'fetched_at']
+
+# New filings downloaded per run unless --limit or --backfill says otherwise.
+# The nightly run picks up the day's newest filings; the rest of an uncached
+# history is worked through a capped batch per night, or at once with --backfill.
+DEFAULT_LIMIT = 200
+
+# XBRL element local name -> insider_xbrl column; the first occurrence in a filing wins
+XBRL_FIELDS = {element: column for column, element in INSIDER_XBRL_SCHEMA['source'].items()}
+XBRL_COLUMNS = INSIDER_XBRL_SCHEMA['columns']
+
+def filing_url(xbrl):
+    """Absolute URL of a filing; archive links are pointed at ARCHIVES_URL."""
+    xbrl = xbrl.strip()
+    if xbrl.startswith("http"):
+        path = xbrl.split("://", 1)[1]
+        path = path[path.find("/"):] if "/" in path else "/"
+        return ARCHIVES_URL + path
+    return ARCHIVES_URL + ("" if xbrl.startswith("/") else "/") + xbrl
+
+def object_path(sha256):
+    return os.path.join(OBJECTS_DIR, sha256[:2], sha256 + ".xml.gz")
+
+def load_index(index_file=INDEX_FILE):
+    if not os.path.exists(index_file):
+        return {}
+    index = pd.read_csv(index_file, dtype=str)
+    return dict(zip(index['pid'].astype('int64'), index['sha256']))
+
+class FilingCache:
+    """pid -> SHA-256 index over the content-addressed object store."""
+
+    def __init__(self, index_file=INDEX_FILE):
+        self.index_file = index_file
+        self.index = load_index(index_file)
+        self.lock = threading.Lock()
+        os.makedirs(OBJECTS_DIR, exist_ok=True)
+
+    def store(self, pid, url, body):
+        sha256 = hashlib.sha256(body).hexdigest()
+        path = object_path(sha256)
+        # Identical filings share one object
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        with self.lock:
+            new_file = not os.path.exists(self.index_file)
+            with open(self.index_file, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(INDEX_COLUMNS)
+                writer.writerow([pid, sha256, url, datetime.now().isoformat(timespec='seconds')])
+            self.index[pid] = sha256
+        return sha256
+
+def download(client, cache, pid, url):
+    try:
+        response = client.get(url, timeout=20)
+        if response.status_code != 200:
+            log_and_print(f"XBRL for pid {pid} failed with status {response.status_code}", level="warning")
+            return False
+        cache.store(pid, url, response.content)
+        return True
+    except Exception as e:
+        log_and_print(f"XBRL for pid {pid} failed: {e}", level="error")
+        return False
+
+def parse_filing(path):
+    """Stream a cached filing and return {column: value} for the XBRL_FIELDS it contains."""
+    values = {}
+    with gzip.open(path, "rb") as f:
+        for _, element in ET.iterparse(f, events=("end",)):
+            name = element.tag.rsplit("}", 1)[-1]
+            column = XBRL_FIELDS.get(name)
+            if column and column not in values and element.text and element.text.strip():
+                values[column] = element.text.strip()
+            # Drop parsed elements so memory stays flat however large the filing is
+            element.clear()
+    return values
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download, cache and parse the XBRL of every insider filing")
+    parser.add_argument('--workers', type=int, default=4, help="downloads kept in flight")
+    parser.add_argument('--rps', type=float, default=4.0, help="ceiling for the adaptive requests-per-second rate")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help=f"download at most this many new filings, newest first (default {DEFAULT_LIMIT})")
+    parser.add_argument('--backfill', action='store_true', help="download every uncached filing, ignoring --limit")
+    parser.add_argument('--reparse', action='store_true', help="re-extract fields from every cached filing")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    configure_logging()
+    if not storage.dataset_exists('insider'):
+        log_and_print("No insider dataset yet, nothing to enrich", level="warning")
+        return
+
+    filings = storage.read_dataset('insider', columns=['pid', 'xbrl'])
+    filings = filings[filings['pid'].notna() & filings['xbrl'].notna()].drop_duplicates('pid')
+    filings = filings.sort_values('pid', ascending=False)
+    cache = FilingCache()
+
+    missing = filings[~filings['pid'].astype('int64').isin(cache.index.keys())]
+    cached = len(filings) - len(missing)
+    deferred = 0
+    if not args.backfill:
+        deferred = max(0, len(missing) - args.limit)
+        missing = missing.head(args.limit)
+    log_and_print(f"{cached} filings cached, {len(missing)} to download")
+    if deferred:
+        log_and_print(f"{deferred} older filings left for later runs (--backfill downloads them all)")
+
+    if not missing.empty:
+        limit_rate(args.rps)
+        with NseClient(pool_size=args.workers) as client:
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                futures = [executor.submit(download, client, cache, int(pid), filing_url(xbrl))
+                           for pid, xbrl in zip(missing['pid'], missing['xbrl'])]
+                downloaded = sum(1 for future in as_completed(futures) if future.result())
+        log_and_print(f"Downloaded {downloaded} of {len(missing)} filings")
+
+    # Only filings not parsed before are read, unless --reparse
+    parsed = set()
+    if storage.dataset_exists('insider_xbrl') and not args.reparse:
+        parsed = set(storage.read_dataset('insider_xbrl', columns=['pid'])['pid'].astype('int64'))
+    rows = []
+    for pid, sha256 in cache.index.items():
+        if pid in parsed:
+            continue
+        try:
+            rows.append(dict(parse_filing(object_path(sha256)), pid=pid))
+        except (ET.ParseError, OSError, EOFError) as e:
+            log_and_print(f"Could not parse XBRL for pid {pid}: {e}", level="warning")
+
+    enriched_df = pd.DataFrame(rows, columns=XBRL_COLUMNS)
+    enriched_df['pid'] = enriched_df['pid'].astype('Int64')
+    if args.reparse:
+        storage.write_dataset(enriched_df, 'insider_xbrl')
+    else:
+        storage.append_dataset(enriched_df, 'insider_xbrl')
+    log_and_print(f"Parsed {len(enriched_df)} filings into insider_xbrl")
+
+if __name__ == "__main__":
+    main()